@@ -0,0 +1,129 @@
+"""Benchmark endpoint throughput against a slow database: sync Session versus AsyncSession.
+
+Both endpoints are `async def` handlers running the same slow query. The sync
+one uses a synchronous Session, as the read endpoints did before, so every
+query blocks the event loop; the async one uses the async engine.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_async_db --requests 100 --concurrency 20
+
+Queries go to a temporary SQLite file, where a sleep_ms() SQL function stands
+in for database latency, or to the PostgreSQL database given by --url (a sync
+URL; the async driver is derived from it), using pg_sleep().
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+import httpx
+from fastapi import Depends, FastAPI
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session, sessionmaker
+
+from database import to_async_url
+
+
+def slow_query(dialect_name: str, delay_ms: int):
+    """A query that takes `delay_ms` to answer, like a distant or loaded database"""
+    if dialect_name == "postgresql":
+        return text("SELECT pg_sleep(:seconds)").bindparams(seconds=delay_ms / 1000)
+    return text("SELECT sleep_ms(:ms)").bindparams(ms=delay_ms)
+
+
+def add_sqlite_sleep(engine):
+    """Register sleep_ms() on SQLite connections; it sleeps in the driver's thread"""
+    def sleep_ms(ms):
+        time.sleep(ms / 1000)
+        return ms
+
+    @event.listens_for(engine, "connect")
+    def register(dbapi_connection, connection_record):
+        dbapi_connection.create_function("sleep_ms", 1, sleep_ms)
+
+
+def build_app(url: str, delay_ms: int) -> FastAPI:
+    engine = create_engine(url, pool_size=20, max_overflow=0)
+    SessionLocal = sessionmaker(bind=engine)
+    async_engine = create_async_engine(to_async_url(url), pool_size=20, max_overflow=0)
+    AsyncSessionLocal = async_sessionmaker(async_engine)
+    if engine.dialect.name == "sqlite":
+        add_sqlite_sleep(engine)
+        add_sqlite_sleep(async_engine.sync_engine)
+    query = slow_query(engine.dialect.name, delay_ms)
+
+    def get_db():
+        db = SessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    async def get_async_db():
+        async with AsyncSessionLocal() as db:
+            yield db
+
+    app = FastAPI()
+
+    @app.get("/sync")
+    async def sync_endpoint(db: Session = Depends(get_db)):
+        return {"count": db.execute(query).scalar()}
+
+    @app.get("/async")
+    async def async_endpoint(db: AsyncSession = Depends(get_async_db)):
+        return {"count": (await db.execute(query)).scalar()}
+
+    app.state.engines = (engine, async_engine)
+    return app
+
+
+async def hammer(app: FastAPI, path: str, requests: int, concurrency: int) -> float:
+    semaphore = asyncio.Semaphore(concurrency)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test", timeout=None) as client:
+        async def one():
+            async with semaphore:
+                response = await client.get(path)
+                response.raise_for_status()
+
+        await client.get(path)  # warm the connection pool
+        start = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(requests)))
+        return time.perf_counter() - start
+
+
+async def run(url: str, requests: int, concurrency: int, delay_ms: int):
+    app = build_app(url, delay_ms)
+    results = {}
+    for name, path in (("sync Session", "/sync"), ("AsyncSession", "/async")):
+        elapsed = await hammer(app, path, requests, concurrency)
+        results[name] = requests / elapsed
+        print(f"{name:>13}: {elapsed:7.2f} s  {requests / elapsed:8.1f} req/sec")
+    print(f"{'speedup':>13}: {results['AsyncSession'] / results['sync Session']:7.1f}x")
+
+    engine, async_engine = app.state.engines
+    engine.dispose()
+    await async_engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--delay-ms", type=int, default=20, help="duration of each query")
+    parser.add_argument("--url", help="SQLAlchemy database URL (default: temporary SQLite file)")
+    args = parser.parse_args()
+
+    print(f"{args.requests} requests, {args.concurrency} concurrent, ~{args.delay_ms} ms per query")
+    if args.url:
+        asyncio.run(run(args.url, args.requests, args.concurrency, args.delay_ms))
+        return
+    with tempfile.TemporaryDirectory() as tmp:
+        asyncio.run(run(f"sqlite:///{os.path.join(tmp, 'bench.db')}", args.requests, args.concurrency, args.delay_ms))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""Benchmark workload cost ranking: per-pair Python loop versus the price matrix.
+
+The loop costs every workload on every price and sorts, as a client working
+from /prices would; the matrix path is the one behind /cost/estimate, timed
+for the ranking alone and with the result dicts built.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_cost_estimate --workloads 1000 --entries 1000 --top-k 10
+"""
+
+import argparse
+import random
+import time
+
+import numpy as np
+
+from services.cost_estimator import PriceMatrix, estimate_costs, rank_costs
+
+
+def make_entries(count: int):
+    rng = random.Random(0)
+    return [{
+        "model": f"Model {i}",
+        "provider": f"Provider {i % 20}",
+        "input_price_per_1m": rng.uniform(0.05, 30.0),
+        "output_price_per_1m": rng.uniform(0.1, 120.0),
+    } for i in range(count)]
+
+
+def make_workloads(count: int):
+    rng = random.Random(1)
+    return [{
+        "input_tokens": rng.randint(100, 100_000),
+        "output_tokens": rng.randint(10, 10_000),
+        "requests_per_day": rng.uniform(1, 100_000),
+    } for _ in range(count)]
+
+
+def python_loop(entries, workloads, top_k: int):
+    results = []
+    for workload in workloads:
+        costs = sorted(
+            ((workload["input_tokens"] * entry["input_price_per_1m"]
+              + workload["output_tokens"] * entry["output_price_per_1m"]) / 1_000_000, index)
+            for index, entry in enumerate(entries)
+        )
+        results.append(costs[:top_k])
+    return results
+
+
+def best_of(repeat: int, func, *args) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workloads", type=int, default=1000)
+    parser.add_argument("--entries", type=int, default=1000)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    entries = make_entries(args.entries)
+    workloads = make_workloads(args.workloads)
+    tokens = np.array([[w["input_tokens"], w["output_tokens"]] for w in workloads], dtype=np.float64)
+    start = time.perf_counter()
+    matrix = PriceMatrix.from_entries(0, entries)
+    build = time.perf_counter() - start
+
+    print(f"{args.workloads} workloads x {args.entries} prices, top {args.top_k}")
+    print(f"{'matrix build':>16}: {build * 1000:9.2f} ms (once per refresh)")
+    loop = best_of(args.repeat, python_loop, entries, workloads, args.top_k)
+    print(f"{'python loop':>16}: {loop * 1000:9.2f} ms")
+    ranking = best_of(args.repeat, rank_costs, matrix, tokens, args.top_k)
+    print(f"{'matrix ranking':>16}: {ranking * 1000:9.2f} ms")
+    full = best_of(args.repeat, estimate_costs, matrix, workloads, args.top_k)
+    print(f"{'matrix + results':>16}: {full * 1000:9.2f} ms")
+    print(f"{'speedup':>16}: {loop / full:9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
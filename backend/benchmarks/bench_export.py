@@ -0,0 +1,107 @@
+"""Benchmark price history export: peak memory of loading every row versus streaming.
+
+The loaded export fetches all matching rows and serializes them in one go, as
+the per-model history endpoint does; the streamed export is the one behind
+/prices/export. Peak Python memory is measured with tracemalloc for each row
+count, so the streamed export should stay flat as the row count grows.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_export --rows 10000 100000
+
+Rows go to a temporary SQLite file, or to the database given by --url (a sync
+URL; the async driver is derived from it).
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+from sqlalchemy import create_engine, insert, text
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from database import to_async_url
+from models.price_data import Base, PriceData
+from services.price_export import encode_export, encode_ndjson, export_statement
+from services.price_service import PriceService
+
+
+def fill(engine, rows: int):
+    start = datetime(2024, 1, 1)
+    with engine.begin() as conn:
+        conn.execute(text("DELETE FROM price_data"))
+        for offset in range(0, rows, 10000):
+            conn.execute(insert(PriceData), [{
+                "id": f"row-{i}",
+                "normalized_id": f"model-{i % 500}",
+                "display_name": f"Model {i % 500}",
+                "provider": f"Provider {i % 7}",
+                "input_price_per_1m": float(i % 100),
+                "output_price_per_1m": float(i % 100) * 2,
+                "timestamp": start + timedelta(minutes=i),
+                "valid_from": start + timedelta(minutes=i),
+                "valid_to": start + timedelta(minutes=i),
+            } for i in range(offset, min(offset + 10000, rows))])
+
+
+async def loaded_export(service, SessionLocal) -> int:
+    async with SessionLocal() as db:
+        rows = (await db.execute(export_statement())).all()
+    return len(encode_ndjson(rows))
+
+
+async def streamed_export(service, SessionLocal) -> int:
+    size = 0
+    with patch('services.price_service.AsyncSessionLocal', SessionLocal):
+        async for chunk in encode_export(service.iter_price_data(), "ndjson"):
+            size += len(chunk)
+    return size
+
+
+async def measure(export, service, SessionLocal):
+    tracemalloc.start()
+    start = time.perf_counter()
+    size = await export(service, SessionLocal)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return size, elapsed, peak
+
+
+async def run(url: str, row_counts):
+    engine = create_engine(url)
+    Base.metadata.create_all(bind=engine)
+    async_engine = create_async_engine(to_async_url(url))
+    SessionLocal = async_sessionmaker(async_engine)
+    service = PriceService()
+
+    for rows in row_counts:
+        fill(engine, rows)
+        print(f"{rows:,} rows")
+        for name, export in (("loaded", loaded_export), ("streamed", streamed_export)):
+            size, elapsed, peak = await measure(export, service, SessionLocal)
+            print(f"{name:>10}: {elapsed:7.2f} s  {size / 1e6:8.1f} MB output  {peak / 1e6:8.1f} MB peak memory")
+
+    engine.dispose()
+    await async_engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--url", help="SQLAlchemy database URL (default: temporary SQLite file)")
+    args = parser.parse_args()
+
+    if args.url:
+        asyncio.run(run(args.url, args.rows))
+        return
+    with tempfile.TemporaryDirectory() as tmp:
+        asyncio.run(run(f"sqlite:///{os.path.join(tmp, 'bench.db')}", args.rows))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""Benchmark historical price writes: per-row ORM path versus the bulk path.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_history_writes --rows 10000
+
+Writes go to a temporary SQLite file, or to the database given by --url.
+"""
+
+import argparse
+import logging
+import os
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import List
+from unittest.mock import patch
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+from models.price_data import Base, PriceData
+
+logger = logging.getLogger("services.price_service")
+
+
+def make_prices(count: int) -> List[PriceData]:
+    return [
+        PriceData(f"Model {i}", f"Provider {i % 7}", float(i % 100), float(i % 100) * 2)
+        for i in range(count)
+    ]
+
+
+def per_row_write(SessionLocal, prices: List[PriceData]):
+    """The original write path: one ORM object, log line and db.add per row."""
+    db = SessionLocal()
+    try:
+        for price in prices:
+            new_price = PriceData(
+                model=price.display_name,
+                provider=price.provider,
+                input_price_per_1m=price.input_price_per_1m,
+                output_price_per_1m=price.output_price_per_1m
+            )
+            logger.info(f"Storing historical price for {new_price.display_name} (normalized: {new_price.normalized_id})")
+            db.add(new_price)
+        db.commit()
+    finally:
+        db.close()
+
+
+def bulk_write(SessionLocal, prices: List[PriceData]):
+    """The bulk path used by PriceService in snapshot mode."""
+    from services.price_service import PriceService
+
+    def get_db():
+        db = SessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    service = PriceService()
+    service.history_mode = "snapshot"
+    with patch('services.price_service.get_db', get_db):
+        service._write_historical_prices(prices)
+
+
+def run(url: str, rows: int, repeat: int):
+    engine = create_engine(url)
+    Base.metadata.create_all(bind=engine)
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    prices = make_prices(rows)
+
+    results = {}
+    for name, write in (("per-row ORM", per_row_write), ("bulk", bulk_write)):
+        timings = []
+        for _ in range(repeat):
+            with engine.begin() as conn:
+                conn.execute(text("DELETE FROM price_data"))
+            start = time.perf_counter()
+            write(SessionLocal, prices)
+            timings.append(time.perf_counter() - start)
+        best = min(timings)
+        results[name] = rows / best
+        print(f"{name:>12}: {best * 1000:9.1f} ms  {rows / best:12,.0f} rows/sec")
+
+    print(f"{'speedup':>12}: {results['bulk'] / results['per-row ORM']:9.1f}x")
+    engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--url", help="SQLAlchemy database URL (default: temporary SQLite file)")
+    args = parser.parse_args()
+
+    # Keep INFO records being created, as in the service, but don't time terminal output
+    logging.getLogger().handlers = [logging.NullHandler()]
+    logging.getLogger().setLevel(logging.INFO)
+    print(f"Writing {args.rows} rows at {datetime.now(timezone.utc).isoformat()}")
+    if args.url:
+        run(args.url, args.rows, args.repeat)
+        return
+    with tempfile.TemporaryDirectory() as tmp:
+        run(f"sqlite:///{os.path.join(tmp, 'bench.db')}", args.rows, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""Benchmark model resolution and search: linear scans versus the model index.
+
+The scans compare every stored model name with the query, as a lookup over the
+price store would without an index; the index path is the one behind model
+lookups and /models/search. Index build time is paid once per refresh.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_model_index --models 10000 --queries 1000
+"""
+
+import argparse
+import random
+import time
+
+from services.model_index import ModelIndex, canonical_model_id
+
+FAMILIES = ("gpt", "claude", "gemini", "llama", "mistral", "command", "titan", "jamba")
+SIZES = ("mini", "small", "medium", "large", "pro", "ultra", "turbo", "opus", "sonnet", "haiku")
+
+
+def make_models(count: int):
+    rng = random.Random(0)
+    models = {}
+    for i in range(count):
+        name = f"{rng.choice(FAMILIES)} {i // 50}.{i % 5} {rng.choice(SIZES)} {i}"
+        models[name.lower().replace(" ", "_")] = [{"model": name, "provider": f"Provider {i % 20}"}]
+    return models
+
+
+def scan_resolve(models, name: str):
+    key = canonical_model_id(name)
+    return [model_id for model_id, entries in models.items() if canonical_model_id(entries[0]["model"]) == key]
+
+
+def scan_search(models, query: str, limit: int):
+    key = canonical_model_id(query)
+    return [model_id for model_id, entries in models.items() if key in canonical_model_id(entries[0]["model"])][:limit]
+
+
+def per_call(func, queries) -> float:
+    start = time.perf_counter()
+    for query in queries:
+        func(query)
+    return (time.perf_counter() - start) / len(queries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--models", type=int, default=10000)
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--limit", type=int, default=10)
+    args = parser.parse_args()
+
+    models = make_models(args.models)
+    names = [entries[0]["model"] for entries in models.values()]
+    rng = random.Random(1)
+    lookups = [rng.choice(names).replace(" ", "-").upper() for _ in range(args.queries)]
+    prefixes = [rng.choice(names)[:rng.randint(3, 12)] for _ in range(args.queries)]
+    scan_queries = lookups[:max(1, args.queries // 20)]
+
+    start = time.perf_counter()
+    index = ModelIndex(models, aliases={})
+    build = time.perf_counter() - start
+
+    print(f"{args.models} models, {args.queries} queries")
+    print(f"{'index build':>14}: {build * 1000:9.2f} ms (once per refresh)")
+    print(f"{'scan resolve':>14}: {per_call(lambda q: scan_resolve(models, q), scan_queries) * 1e6:9.1f} us")
+    print(f"{'index resolve':>14}: {per_call(index.resolve, lookups) * 1e6:9.1f} us")
+    print(f"{'scan search':>14}: {per_call(lambda q: scan_search(models, q, args.limit), scan_queries) * 1e6:9.1f} us")
+    print(f"{'index search':>14}: {per_call(lambda q: index.search(q, args.limit), prefixes) * 1e6:9.1f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""Benchmark current-price lookups: linear cache scans versus PriceStore indexes.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_price_store --entries 10000
+"""
+
+import argparse
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, List
+
+from models.price_data import PriceData
+from services.price_store import PriceStore
+from utils import normalize_model_name
+
+
+def make_prices(count: int, providers: int) -> List[PriceData]:
+    return [
+        PriceData(f"Model {i // providers}", f"Provider {i % providers}", float(i % 100), float(i % 100) * 2)
+        for i in range(count)
+    ]
+
+
+def build_cache(prices: List[PriceData]) -> Dict[tuple, dict]:
+    """The original layout: a flat mapping scanned on every lookup (keyed per provider so sizes match)."""
+    return {
+        (price.normalized_id, price.provider): {
+            "model": price.display_name,
+            "provider": price.provider,
+            "input_price_per_1m": price.input_price_per_1m,
+            "output_price_per_1m": price.output_price_per_1m,
+            "last_updated": datetime.now(timezone.utc),
+        }
+        for price in prices
+    }
+
+
+def scan_by_model(cache: Dict[tuple, dict], model_name: str) -> List[dict]:
+    normalized_name = normalize_model_name(model_name)
+    return [price for price in cache.values() if normalize_model_name(price["model"]) == normalized_name]
+
+
+def scan_by_provider(cache: Dict[tuple, dict], provider: str) -> List[dict]:
+    return [price for price in cache.values() if price["provider"].lower() == provider.lower()]
+
+
+def time_lookups(lookup: Callable[[str], List[dict]], keys: List[str]) -> float:
+    start = time.perf_counter()
+    for key in keys:
+        lookup(key)
+    return (time.perf_counter() - start) / len(keys)
+
+
+def run(entries: int, providers: int, lookups: int):
+    prices = make_prices(entries, providers)
+    cache = build_cache(prices)
+    store = PriceStore()
+    store.upsert(prices)
+
+    models = [f"Model {i % (entries // providers)}" for i in range(lookups)]
+    provider_names = [f"provider {i % providers}" for i in range(lookups)]
+
+    rows = [
+        ("by model", lambda m: scan_by_model(cache, m), store.by_model, models),
+        ("by provider", lambda p: scan_by_provider(cache, p), store.by_provider, provider_names),
+    ]
+    for name, scan, indexed, keys in rows:
+        scan_time = time_lookups(scan, keys)
+        indexed_time = time_lookups(indexed, keys)
+        print(f"{name:>12}: scan {scan_time * 1e6:10.1f} us  store {indexed_time * 1e6:8.1f} us  "
+              f"{scan_time / indexed_time:8.0f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--entries", type=int, default=10000)
+    parser.add_argument("--providers", type=int, default=10)
+    parser.add_argument("--lookups", type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"{args.entries} entries across {args.providers} providers, {args.lookups} lookups each")
+    run(args.entries, args.providers, args.lookups)
+
+
+if __name__ == "__main__":
+    main()
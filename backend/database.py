@@ -1,6 +1,10 @@
-from sqlalchemy import create_engine, text
+from sqlalchemy import and_, create_engine, func, inspect, select, text, true
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
-from models.price_data import Base
+from models.price_data import Base, ModelCatalog, PriceData
 import os
 from dotenv import load_dotenv
 import logging
@@ -23,10 +27,10 @@ if not SQLALCHEMY_DATABASE_URL:
     DB_PASSWORD = os.getenv("DB_PASSWORD", "")
     SQLALCHEMY_DATABASE_URL = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}?sslmode=disable"
 
-# Log database configuration
-logger.info(f"Using database URL: {SQLALCHEMY_DATABASE_URL}")
+# Log every SQL statement
+SQLALCHEMY_ECHO = os.getenv("SQLALCHEMY_ECHO", "false").lower() in ("1", "true", "yes")
 
-# Configure engine based on database type
+# Configure engine based on database type; engines connect on first use, not here
 if SQLALCHEMY_DATABASE_URL.startswith("postgresql"):
     engine = create_engine(
         SQLALCHEMY_DATABASE_URL,
@@ -34,23 +38,59 @@ if SQLALCHEMY_DATABASE_URL.startswith("postgresql"):
         max_overflow=10,
         pool_timeout=30,
         pool_recycle=1800,
-        echo=True  # Enable SQL query logging
+        echo=SQLALCHEMY_ECHO
     )
-    logger.info("PostgreSQL engine configured")
 else:
     # SQLite configuration
     engine = create_engine(
         SQLALCHEMY_DATABASE_URL,
-        connect_args={"check_same_thread": False}
+        connect_args={"check_same_thread": False},
+        echo=SQLALCHEMY_ECHO
     )
-    logger.info("Using SQLite database")
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+def to_async_url(url: str) -> str:
+    """
+    Map a synchronous database URL to its async driver: asyncpg for PostgreSQL, aiosqlite for SQLite.
+
+    asyncpg takes `ssl` instead of libpq's `sslmode` query parameter.
+
+    Examples:
+        >>> to_async_url("postgresql://mouse:@localhost:5432/mouse?sslmode=disable")
+        'postgresql+asyncpg://mouse:@localhost:5432/mouse?ssl=disable'
+        >>> to_async_url("sqlite:///./prices.db")
+        'sqlite+aiosqlite:///./prices.db'
+    """
+    parsed = make_url(url)
+    if parsed.get_backend_name() == "postgresql":
+        query = dict(parsed.query)
+        if "sslmode" in query:
+            query["ssl"] = query.pop("sslmode")
+        parsed = parsed.set(drivername="postgresql+asyncpg", query=query)
+    elif parsed.get_backend_name() == "sqlite":
+        parsed = parsed.set(drivername="sqlite+aiosqlite")
+    return parsed.render_as_string(hide_password=False)
+
+# Async engine for request handlers, so database round trips don't block the event loop
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or to_async_url(SQLALCHEMY_DATABASE_URL)
+if ASYNC_DATABASE_URL.startswith("postgresql"):
+    async_engine = create_async_engine(
+        ASYNC_DATABASE_URL,
+        pool_size=5,
+        max_overflow=10,
+        pool_timeout=30,
+        pool_recycle=1800,
+    )
+else:
+    async_engine = create_async_engine(ASYNC_DATABASE_URL)
+
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
 def init_db():
     """Initialize the database by creating all tables if they don't exist"""
     try:
-        logger.info("Starting database initialization...")
+        logger.info(f"Starting database initialization, using database URL: {engine.url!r}")
         # Test the connection first for PostgreSQL
         if SQLALCHEMY_DATABASE_URL and SQLALCHEMY_DATABASE_URL.startswith("postgresql"):
             try:
@@ -68,6 +108,11 @@ def init_db():
         # Create all tables
         Base.metadata.create_all(bind=engine)
         logger.info("Database tables created successfully")
+
+        migrate_price_data_columns()
+        migrate_model_catalog_columns()
+        create_missing_indexes()
+        populate_model_catalog()
         
         # Verify tables were created
         with engine.connect() as conn:
@@ -83,9 +128,95 @@ def init_db():
         logger.error(f"Failed to create database tables: {str(e)}")
         raise
 
+def migrate_price_data_columns(bind=None):
+    """Add the validity interval columns to a price_data table created before they existed.
+
+    Existing rows are point-in-time snapshots, so each one becomes a closed
+    interval starting and ending at its own timestamp.
+    """
+    bind = bind or engine
+    columns = {column["name"] for column in inspect(bind).get_columns("price_data")}
+    missing = [name for name in ("valid_from", "valid_to") if name not in columns]
+    if not missing:
+        return
+
+    with bind.begin() as conn:
+        for name in missing:
+            logger.info(f"Adding column price_data.{name}")
+            conn.execute(text(f"ALTER TABLE price_data ADD COLUMN {name} TIMESTAMP"))
+        conn.execute(text(
+            "UPDATE price_data SET valid_from = timestamp, valid_to = timestamp WHERE valid_from IS NULL"
+        ))
+    logger.info("Backfilled price_data validity intervals")
+
+def migrate_model_catalog_columns(bind=None):
+    """Add the generation column to a model_catalog table created before it existed.
+
+    Existing rows get generation 0, so they count as already seen by every process.
+    """
+    bind = bind or engine
+    columns = {column["name"] for column in inspect(bind).get_columns("model_catalog")}
+    if "generation" in columns:
+        return
+
+    with bind.begin() as conn:
+        logger.info("Adding column model_catalog.generation")
+        conn.execute(text("ALTER TABLE model_catalog ADD COLUMN generation INTEGER NOT NULL DEFAULT 0"))
+
+def create_missing_indexes(bind=None):
+    """Create indexes declared on the models that an existing database does not have yet"""
+    bind = bind or engine
+    existing_tables = set(inspect(bind).get_table_names())
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        for index in table.indexes:
+            index.create(bind=bind, checkfirst=True)
+
+def populate_model_catalog(bind=None):
+    """Seed an empty model_catalog with the latest row of every (model, provider) in price_data.
+
+    Refreshes keep the catalog current; this covers databases whose history
+    predates the catalog table.
+    """
+    bind = bind or engine
+    with bind.begin() as conn:
+        if conn.execute(select(ModelCatalog.normalized_id).limit(1)).first() is not None:
+            return
+        series = select(
+            PriceData.normalized_id,
+            PriceData.provider,
+            func.min(func.coalesce(PriceData.valid_from, PriceData.timestamp)).label("first_seen"),
+            func.max(PriceData.timestamp).label("last_updated"),
+        ).group_by(PriceData.normalized_id, PriceData.provider).subquery()
+        latest = select(
+            PriceData.normalized_id,
+            PriceData.provider,
+            PriceData.display_name,
+            PriceData.input_price_per_1m,
+            PriceData.output_price_per_1m,
+            series.c.first_seen,
+            series.c.last_updated,
+        ).join(series, and_(
+            PriceData.normalized_id == series.c.normalized_id,
+            PriceData.provider == series.c.provider,
+            PriceData.timestamp == series.c.last_updated,
+        # WHERE true keeps SQLite from reading ON CONFLICT as part of the join
+        )).where(true())
+        dialect_insert = pg_insert if bind.dialect.name == "postgresql" else sqlite_insert
+        columns = [column.name for column in latest.selected_columns]
+        # Two rows of a pair observed at the same instant: keep either
+        result = conn.execute(dialect_insert(ModelCatalog).from_select(columns, latest).on_conflict_do_nothing())
+    if result.rowcount:
+        logger.info(f"Populated model_catalog with {result.rowcount} rows from price_data")
+
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()  
\ No newline at end of file
+        db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db  
\ No newline at end of file
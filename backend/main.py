@@ -1,17 +1,30 @@
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Header, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response, StreamingResponse
+from contextlib import asynccontextmanager
 from datetime import datetime
-from typing import List, Optional, Dict
-from pydantic import BaseModel
+from typing import List, Literal, Optional, Dict
+from pydantic import BaseModel, Field, TypeAdapter
 from urllib.parse import unquote
-from sqlalchemy.orm import Session
-from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func, select, text
 
-from services.price_service import PriceService
-from models.price_data import PriceData
-from database import get_db
+from services.cost_estimator import COST_ESTIMATE_MAX_TOP_K
+from services.price_service import HISTORY_BATCH_MAX_POINTS, PriceService, choose_resolution
+from services.price_export import MEDIA_TYPES, encode_export, parquet_available
+from services.refresh_jobs import enqueue_refresh, get_job
+from services.response_cache import ResponseCache
+from models.price_data import ModelCatalog
+from database import get_async_db
 
-app = FastAPI(title="AI Model Pricing API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Database setup and refreshes start with the server rather than at import
+    await price_service.start()
+    yield
+    await price_service.shutdown()
+
+app = FastAPI(title="AI Model Pricing API", lifespan=lifespan)
 
 # Add CORS middleware
 app.add_middleware(
@@ -23,6 +36,7 @@ app.add_middleware(
 )
 
 price_service = PriceService()
+response_cache = ResponseCache()
 
 class PriceResponse(BaseModel):
     model: str
@@ -37,12 +51,60 @@ class HistoricalPriceResponse(BaseModel):
     prices: List[dict]
     time_range: dict
 
+class HistorySeriesRequest(BaseModel):
+    model: str
+    provider: Optional[str] = None
+
+class BatchHistoryRequest(BaseModel):
+    series: List[HistorySeriesRequest] = Field(..., min_length=1, max_length=200)
+    days: int = Field(30, ge=1)
+    resolution: Optional[Literal["hour", "day", "week", "month"]] = None
+    max_points: Optional[int] = Field(None, ge=1, le=10000)
+
+class Workload(BaseModel):
+    name: Optional[str] = None
+    input_tokens: int = Field(..., ge=0)  # Per request
+    output_tokens: int = Field(..., ge=0)  # Per request
+    requests_per_day: Optional[float] = Field(None, ge=0)
+
+class CostEstimateRequest(BaseModel):
+    workloads: List[Workload] = Field(..., min_length=1, max_length=10000)
+    top_k: int = Field(10, ge=1, le=COST_ESTIMATE_MAX_TOP_K)
+
+class CostEstimate(BaseModel):
+    rank: int
+    model: str
+    provider: str
+    cost_per_request: float
+    daily_cost: Optional[float] = None
+    monthly_cost: Optional[float] = None
+
+class WorkloadCostEstimate(BaseModel):
+    workload: Workload
+    estimates: List[CostEstimate]
+
 class ModelInfo(BaseModel):
     normalized_id: str
     display_name: str
     provider: str
     last_updated: datetime
 
+class ModelSearchResult(BaseModel):
+    normalized_id: str
+    display_name: str
+    providers: List[str]
+
+class RefreshJobResponse(BaseModel):
+    id: int
+    status: str
+    requested_by: str
+    requested_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    worker: Optional[str] = None
+    price_count: Optional[int] = None
+    error: Optional[str] = None
+
 class HealthResponse(BaseModel):
     status: str
     version: str
@@ -54,45 +116,104 @@ class ProviderInfo(BaseModel):
     model_count: int
     last_updated: datetime
 
+# Serializers for the responses kept in response_cache
+MODELS_ADAPTER = TypeAdapter(List[ModelInfo])
+PROVIDERS_ADAPTER = TypeAdapter(List[ProviderInfo])
+PRICES_ADAPTER = TypeAdapter(List[PriceResponse])
+COST_ESTIMATES_ADAPTER = TypeAdapter(List[WorkloadCostEstimate])
+
 @app.get("/")
 async def root():
     return {"message": "AI Model Pricing API"}
 
 @app.get("/models", response_model=List[ModelInfo])
-async def get_all_models(db: Session = Depends(get_db)):
+async def get_all_models(request: Request, db: AsyncSession = Depends(get_async_db)):
     """Get all known models with their normalized IDs and display names"""
-    # Get unique models from the database
-    models = db.query(PriceData.normalized_id, PriceData.display_name, PriceData.provider, PriceData.timestamp).distinct().all()
-    
-    # Convert to ModelInfo objects
-    return [{
-        "normalized_id": model.normalized_id,
-        "display_name": model.display_name,
-        "provider": model.provider,
-        "last_updated": model.timestamp
-    } for model in models]
+    generation = price_service.generation
+    cached = response_cache.get("/models", generation)
+    if cached is None:
+        # One catalog row per (model, provider), independent of history size
+        result = await db.execute(
+            select(ModelCatalog.normalized_id, ModelCatalog.display_name, ModelCatalog.provider, ModelCatalog.last_updated)
+        )
+        models = result.all()
+
+        # Convert to ModelInfo objects
+        cached = response_cache.put("/models", generation, MODELS_ADAPTER, [{
+            "normalized_id": model.normalized_id,
+            "display_name": model.display_name,
+            "provider": model.provider,
+            "last_updated": model.last_updated
+        } for model in models])
+    return response_cache.respond(request, cached)
+
+@app.get("/models/search", response_model=List[ModelSearchResult])
+async def search_models(q: str = Query(..., min_length=1, max_length=200), limit: int = Query(10, ge=1, le=50)):
+    """Autocomplete model names: exact identities, then name and word prefixes, then fuzzy matches"""
+    return price_service.search_models(q, limit)
 
 @app.get("/providers", response_model=List[ProviderInfo])
-async def get_all_providers(db: Session = Depends(get_db)):
+async def get_all_providers(request: Request, db: AsyncSession = Depends(get_async_db)):
     """Get all available providers with their model counts"""
-    # Get provider statistics from the database
-    providers_data = db.query(
-        PriceData.provider,
-        text("COUNT(DISTINCT normalized_id) as model_count"),
-        text("MAX(timestamp) as last_updated")
-    ).group_by(PriceData.provider).all()
-    
-    # Convert to ProviderInfo objects
-    return [{
-        "name": provider,
-        "model_count": count,
-        "last_updated": last_updated
-    } for provider, count, last_updated in providers_data]
+    generation = price_service.generation
+    cached = response_cache.get("/providers", generation)
+    if cached is None:
+        # Get provider statistics from the model catalog
+        result = await db.execute(
+            select(
+                ModelCatalog.provider,
+                func.count(ModelCatalog.normalized_id).label("model_count"),
+                func.max(ModelCatalog.last_updated).label("last_updated")
+            ).group_by(ModelCatalog.provider)
+        )
+        providers_data = result.all()
+
+        # Convert to ProviderInfo objects
+        cached = response_cache.put("/providers", generation, PROVIDERS_ADAPTER, [{
+            "name": provider,
+            "model_count": count,
+            "last_updated": last_updated
+        } for provider, count, last_updated in providers_data])
+    return response_cache.respond(request, cached)
+
+def _cached_prices():
+    generation = price_service.generation
+    cached = response_cache.get("/prices", generation)
+    if cached is None:
+        cached = response_cache.put("/prices", generation, PRICES_ADAPTER, price_service.get_all_prices())
+    return cached
 
 @app.get("/prices", response_model=List[PriceResponse])
-async def get_all_prices():
+async def get_all_prices(request: Request):
     """Get all current prices"""
-    return price_service.get_all_prices()
+    return response_cache.respond(request, _cached_prices())
+
+# Declared before /prices/{provider}, which would otherwise match it
+@app.get("/prices/stream")
+async def stream_prices(last_event_id: Optional[str] = Header(None)):
+    """Stream all current prices, then the changed prices after every refresh, as Server-Sent Events"""
+    return StreamingResponse(
+        price_service.updates.subscribe(lambda: _cached_prices().body, last_event_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.get("/prices/export")
+async def export_prices(
+    export_format: Literal["ndjson", "csv", "parquet"] = Query("ndjson", alias="format"),
+    model: Optional[str] = None,
+    provider: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+):
+    """Stream stored price history as NDJSON, CSV or Parquet, optionally filtered by model, provider and time range"""
+    if export_format == "parquet" and not parquet_available():
+        raise HTTPException(status_code=501, detail="Parquet export requires the pyarrow package")
+    return StreamingResponse(
+        encode_export(price_service.iter_price_data(model, provider, start, end), export_format),
+        media_type=MEDIA_TYPES[export_format],
+        headers={"Content-Disposition": f'attachment; filename="price_history.{export_format}"'},
+    )
 
 @app.get("/prices/{provider}", response_model=List[PriceResponse])
 async def get_prices_by_provider(provider: str):
@@ -107,29 +228,117 @@ async def get_price_by_model(model_name: str):
         raise HTTPException(status_code=404, detail="Model not found")
     return prices
 
+def _check_max_points(days: int, resolution: Optional[str], max_points: Optional[int]):
+    """Reject a window that even monthly buckets can't fit in max_points"""
+    try:
+        choose_resolution(days, resolution, max_points)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"{e}; request a shorter window or more points")
+
+@app.post("/prices/history/batch", response_model=Dict[str, List[HistoricalPriceResponse]])
+async def get_price_history_batch(request: BatchHistoryRequest):
+    """Get the price history of several models in one request, keyed by model.
+
+    Each entry of `series` names a model and optionally a provider; all of
+    them share the window, `resolution` and per-series `max_points`.
+    """
+    _check_max_points(request.days, request.resolution, request.max_points)
+    series = [(item.model, item.provider) for item in request.series]
+    # Rejected from row counts before any history is fetched or serialized
+    estimated_points = await price_service.estimate_history_points(
+        series, request.days, resolution=request.resolution, max_points=request.max_points,
+    )
+    if estimated_points > HISTORY_BATCH_MAX_POINTS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Request covers up to {estimated_points} price points, more than the limit of "
+                   f"{HISTORY_BATCH_MAX_POINTS}; request fewer series, a shorter window or set resolution or max_points",
+        )
+    return await price_service.get_price_history_batch(
+        series, request.days, resolution=request.resolution, max_points=request.max_points,
+    )
+
 @app.get("/prices/history/{model_name}", response_model=List[HistoricalPriceResponse])
-async def get_price_history(model_name: str, provider: Optional[str] = None, days: Optional[int] = 30):
-    """Get historical price data for a specific model, optionally filtered by provider"""
+async def get_price_history(
+    model_name: str,
+    provider: Optional[str] = None,
+    days: Optional[int] = 30,
+    resolution: Optional[Literal["hour", "day", "week", "month"]] = None,
+    max_points: Optional[int] = Query(None, ge=1, le=10000),
+):
+    """Get historical price data for a specific model, optionally filtered by provider.
+
+    Pass `resolution` and/or `max_points` to get one min/max/last point per
+    time bucket instead of every stored point. No series gets more than
+    `max_points` points; a window too long for that even by month is a 400.
+    """
+    _check_max_points(days or 30, resolution, max_points)
     # Decode the URL-encoded model name
     decoded_model_name = unquote(model_name)
-    return price_service.get_price_history(decoded_model_name, provider, days or 30)
+    return await price_service.get_price_history(
+        decoded_model_name, provider, days or 30, resolution=resolution, max_points=max_points
+    )
+
+@app.post("/cost/estimate", response_model=List[WorkloadCostEstimate])
+async def estimate_cost(request: CostEstimateRequest):
+    """Rank the cheapest models and providers for each workload at current prices"""
+    estimates = price_service.get_cost_estimates([workload.model_dump() for workload in request.workloads], request.top_k)
+    # Serialized with pydantic-core directly; FastAPI's response_model encoding is much slower for large batches
+    return Response(
+        COST_ESTIMATES_ADAPTER.dump_json(COST_ESTIMATES_ADAPTER.validate_python(estimates)),
+        media_type="application/json",
+    )
 
 @app.post("/refresh")
-async def refresh_prices():
-    """Force refresh of all pricing data"""
+async def refresh_prices(response: Response, db: AsyncSession = Depends(get_async_db)):
+    """Force refresh of all pricing data, or queue it for a refresh worker in worker mode"""
+    if price_service.refresh_mode == "worker":
+        job_id = await enqueue_refresh(db)
+        response.status_code = 202
+        return {"message": "Price refresh queued", "job_id": job_id}
     await price_service.refresh_prices()
     return {"message": "Prices refreshed successfully"}
 
+@app.get("/refresh/jobs/{job_id}", response_model=RefreshJobResponse)
+async def get_refresh_job(job_id: int, db: AsyncSession = Depends(get_async_db)):
+    """Get the status of a queued refresh job"""
+    job = await get_job(db, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"No refresh job {job_id}")
+    return job
+
+@app.get("/metrics")
+async def get_metrics():
+    """Get refresh pipeline metrics, such as which extraction path handled each provider"""
+    return {**price_service.get_metrics(), "response_cache": response_cache.stats()}
+
+@app.get("/ready")
+async def readiness_check(db: AsyncSession = Depends(get_async_db)):
+    """
+    Readiness endpoint for the Kubernetes readiness probe.
+    Returns 503 until stored prices have been loaded (or loading them was attempted)
+    and while the database is unreachable. Stale or missing current prices don't
+    make the process unready: history and models are still served from the database.
+    """
+    if not price_service.ready:
+        raise HTTPException(status_code=503, detail="Prices not loaded yet")
+    try:
+        await db.execute(text("SELECT 1"))
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"Database unavailable: {str(e)}")
+    stats = price_service.store.stats()
+    return {"status": "ready", "prices": stats["entries"], "stale": stats["stale"]}
+
 @app.get("/health", response_model=HealthResponse)
-async def health_check(db: Session = Depends(get_db)):
+async def health_check(db: AsyncSession = Depends(get_async_db)):
     """
-    Health check endpoint for Kubernetes readiness/liveness probes.
+    Health check endpoint for the Kubernetes liveness probe.
     Checks API and database connectivity.
     """
     db_status = "healthy"
     try:
         # Test database connection
-        db.execute(text("SELECT 1"))
+        await db.execute(text("SELECT 1"))
     except Exception as e:
         db_status = f"unhealthy: {str(e)}"
 
@@ -0,0 +1,170 @@
+"""Data migrations for the price history tables.
+
+Usage:
+    python migrations.py compact-history
+    python migrations.py backfill-rollup
+"""
+
+import argparse
+import logging
+from datetime import datetime, time, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import func, insert
+from sqlalchemy.orm import Session
+
+from database import SessionLocal, init_db
+from models.price_data import PriceDailyRollup, PriceData
+
+logger = logging.getLogger(__name__)
+
+DELETE_BATCH_SIZE = 500
+INSERT_BATCH_SIZE = 1000
+
+
+def compact_price_history(db: Session) -> dict:
+    """
+    Collapse runs of identical consecutive prices into validity intervals.
+
+    For every (normalized_id, provider), consecutive rows with the same input
+    and output price are merged into the first row of the run: its valid_from
+    is the run's first observation, its timestamp the run's last observation,
+    and its valid_to the first observation of the next run. The last run of
+    each series is left open (valid_to NULL) as the current price.
+
+    Returns:
+        Counts of rows scanned, kept and deleted
+    """
+    scanned = kept = deleted = 0
+    to_delete: List[str] = []
+    run_head: Optional[PriceData] = None
+
+    def close_run(next_row: Optional[PriceData]):
+        if run_head is None:
+            return
+        same_series = next_row is not None and \
+            (next_row.normalized_id, next_row.provider) == (run_head.normalized_id, run_head.provider)
+        if same_series:
+            run_head.valid_to = next_row.valid_from or next_row.timestamp
+        else:
+            run_head.valid_to = None
+
+    rows = db.query(PriceData).order_by(
+        PriceData.normalized_id, PriceData.provider, PriceData.timestamp
+    ).yield_per(1000)
+
+    for row in rows:
+        scanned += 1
+        same_run = run_head is not None \
+            and (row.normalized_id, row.provider) == (run_head.normalized_id, run_head.provider) \
+            and (row.input_price_per_1m, row.output_price_per_1m) == (run_head.input_price_per_1m, run_head.output_price_per_1m)
+        if same_run:
+            run_head.timestamp = row.timestamp
+            to_delete.append(row.id)
+            deleted += 1
+            continue
+
+        close_run(row)
+        run_head = row
+        if run_head.valid_from is None:
+            run_head.valid_from = run_head.timestamp
+        kept += 1
+
+    close_run(None)
+    # Write the merged run heads before deleting the rows folded into them
+    db.flush()
+    for start in range(0, len(to_delete), DELETE_BATCH_SIZE):
+        batch = to_delete[start:start + DELETE_BATCH_SIZE]
+        db.query(PriceData).filter(PriceData.id.in_(batch)).delete(synchronize_session=False)
+    db.commit()
+
+    logger.info(f"Compacted price history: scanned {scanned}, kept {kept}, deleted {deleted} rows")
+    return {"scanned": scanned, "kept": kept, "deleted": deleted}
+
+
+def backfill_daily_rollup(db: Session) -> dict:
+    """
+    Rebuild price_daily_rollup from the rows in price_data.
+
+    A snapshot row counts for the day it was observed; an interval row counts
+    for every day between its first and last observation, since the price was
+    observed unchanged throughout. Existing rollup rows are replaced, so the
+    backfill can be re-run safely.
+
+    Returns:
+        Counts of price_data rows scanned and rollup rows written
+    """
+    scanned = 0
+    rollups: Dict[Tuple[str, str, object], dict] = {}
+
+    rows = db.query(PriceData).order_by(
+        func.coalesce(PriceData.valid_from, PriceData.timestamp)
+    ).yield_per(1000)
+
+    for row in rows:
+        scanned += 1
+        first_seen = row.valid_from or row.timestamp
+        day = first_seen.date()
+        while day <= row.timestamp.date():
+            day_start = datetime.combine(day, time.min)
+            seen_from = max(first_seen, day_start)
+            seen_to = min(row.timestamp, day_start + timedelta(days=1) - timedelta(microseconds=1))
+            key = (row.normalized_id, row.provider, day)
+            rollup = rollups.get(key)
+            if rollup is None:
+                rollups[key] = {
+                    "normalized_id": row.normalized_id,
+                    "provider": row.provider,
+                    "day": day,
+                    "display_name": row.display_name,
+                    "input_min": row.input_price_per_1m,
+                    "input_max": row.input_price_per_1m,
+                    "input_first": row.input_price_per_1m,
+                    "input_last": row.input_price_per_1m,
+                    "output_min": row.output_price_per_1m,
+                    "output_max": row.output_price_per_1m,
+                    "output_first": row.output_price_per_1m,
+                    "output_last": row.output_price_per_1m,
+                    "first_seen": seen_from,
+                    "last_seen": seen_to,
+                }
+            else:
+                for side, price in (("input", row.input_price_per_1m), ("output", row.output_price_per_1m)):
+                    rollup[f"{side}_min"] = min(rollup[f"{side}_min"], price)
+                    rollup[f"{side}_max"] = max(rollup[f"{side}_max"], price)
+                    if seen_from < rollup["first_seen"]:
+                        rollup[f"{side}_first"] = price
+                    if seen_to >= rollup["last_seen"]:
+                        rollup[f"{side}_last"] = price
+                rollup["first_seen"] = min(rollup["first_seen"], seen_from)
+                rollup["last_seen"] = max(rollup["last_seen"], seen_to)
+            day += timedelta(days=1)
+
+    db.query(PriceDailyRollup).delete(synchronize_session=False)
+    values = list(rollups.values())
+    for start in range(0, len(values), INSERT_BATCH_SIZE):
+        db.execute(insert(PriceDailyRollup), values[start:start + INSERT_BATCH_SIZE])
+    db.commit()
+
+    logger.info(f"Backfilled daily rollup: scanned {scanned} price rows, wrote {len(values)} rollup rows")
+    return {"scanned": scanned, "rollup_rows": len(values)}
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["compact-history", "backfill-rollup"])
+    args = parser.parse_args(argv)
+
+    init_db()
+    db = SessionLocal()
+    try:
+        if args.command == "compact-history":
+            print(compact_price_history(db))
+        elif args.command == "backfill-rollup":
+            print(backfill_daily_rollup(db))
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,7 @@
-from sqlalchemy import Column, String, Float, DateTime
+from sqlalchemy import Column, String, Float, Date, DateTime, Index, Integer
 from sqlalchemy.ext.declarative import declarative_base
 from datetime import datetime, timezone
+from typing import Optional
 from utils import normalize_model_name
 
 Base = declarative_base()
@@ -14,13 +15,74 @@ class PriceData(Base):
     provider = Column(String, nullable=False)
     input_price_per_1m = Column(Float, nullable=False)
     output_price_per_1m = Column(Float, nullable=False)
-    timestamp = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    timestamp = Column(DateTime, default=lambda: datetime.now(timezone.utc))  # Last time this price was observed
+    valid_from = Column(DateTime, nullable=True)  # First time this price was observed
+    valid_to = Column(DateTime, nullable=True)  # When a different price replaced it; NULL while current
 
-    def __init__(self, model: str, provider: str, input_price_per_1m: float, output_price_per_1m: float):
-        self.id = f"{model}_{datetime.now(timezone.utc).isoformat()}"
+    __table_args__ = (
+        # Serves history lookups: one model, optionally one provider, over a time range
+        Index('ix_price_data_model_provider_timestamp', 'normalized_id', 'provider', 'timestamp'),
+    )
+
+    def __init__(self, model: str, provider: str, input_price_per_1m: float, output_price_per_1m: float, timestamp: Optional[datetime] = None):
+        self.id = self.build_id(model, provider, timestamp or datetime.now(timezone.utc))
         # Replace spaces with underscores and handle + characters
         self.normalized_id = normalize_model_name(model)
         self.display_name = model.strip()
         self.provider = provider.strip()
         self.input_price_per_1m = input_price_per_1m
-        self.output_price_per_1m = output_price_per_1m   
\ No newline at end of file
+        self.output_price_per_1m = output_price_per_1m
+        if timestamp is not None:
+            self.timestamp = timestamp
+
+    @staticmethod
+    def build_id(model: str, provider: str, timestamp: datetime) -> str:
+        """Build the row id; the provider keeps ids unique when a refresh shares one timestamp"""
+        return f"{model}_{provider}_{timestamp.isoformat()}"
+
+class PriceDailyRollup(Base):
+    """Per-day price summary of one model at one provider, updated on every refresh"""
+    __tablename__ = 'price_daily_rollup'
+
+    normalized_id = Column(String, primary_key=True)
+    provider = Column(String, primary_key=True)
+    day = Column(Date, primary_key=True)  # UTC day
+    display_name = Column(String, nullable=False)
+    input_min = Column(Float, nullable=False)
+    input_max = Column(Float, nullable=False)
+    input_first = Column(Float, nullable=False)
+    input_last = Column(Float, nullable=False)
+    output_min = Column(Float, nullable=False)
+    output_max = Column(Float, nullable=False)
+    output_first = Column(Float, nullable=False)
+    output_last = Column(Float, nullable=False)
+    first_seen = Column(DateTime, nullable=False)  # First observation within the day
+    last_seen = Column(DateTime, nullable=False)  # Last observation within the day
+
+class ModelCatalog(Base):
+    """Latest price of every model at every provider, one row per pair"""
+    __tablename__ = 'model_catalog'
+
+    normalized_id = Column(String, primary_key=True)
+    provider = Column(String, primary_key=True)
+    display_name = Column(String, nullable=False)
+    input_price_per_1m = Column(Float, nullable=False)
+    output_price_per_1m = Column(Float, nullable=False)
+    first_seen = Column(DateTime, nullable=False)  # First time the pair was observed
+    last_updated = Column(DateTime, nullable=False)  # Latest observation
+    # Refresh that last wrote the row; other processes reload rows newer than what they have seen
+    generation = Column(Integer, nullable=False, default=0, server_default="0", index=True)
+
+class RefreshJob(Base):
+    """A requested price refresh, claimed and run by a refresh worker"""
+    __tablename__ = 'refresh_jobs'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    status = Column(String, nullable=False, default="queued", index=True)  # queued, running, done or failed
+    requested_by = Column(String, nullable=False)  # "api" or "schedule"
+    requested_at = Column(DateTime, nullable=False)
+    started_at = Column(DateTime, nullable=True)  # Latest claim; a stale claim is taken over by another worker
+    finished_at = Column(DateTime, nullable=True)
+    worker = Column(String, nullable=True)  # Worker holding or last holding the job
+    price_count = Column(Integer, nullable=True)  # Prices fetched by a finished job
+    error = Column(String, nullable=True)
@@ -0,0 +1,95 @@
+"""Workload cost estimates across every model and provider.
+
+Current prices are packed into a price matrix, one row of (input, output)
+price per 1M tokens for each (model, provider), rebuilt only when the data
+generation changes. Costing m workloads is then a single (m, 2) x (2, n)
+matrix product, and ranking takes a partial sort per workload, so a thousand
+workloads over a thousand models stays in the milliseconds.
+"""
+
+from dataclasses import dataclass
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+COST_ESTIMATE_MAX_TOP_K = 100
+# Days in the monthly projection of per-day volumes
+DAYS_PER_MONTH = 30
+
+
+@dataclass
+class PriceMatrix:
+    generation: int
+    entries: List[dict]
+    # Shape (2, n): input and output price per 1M tokens of each entry
+    prices: np.ndarray
+
+    @classmethod
+    def from_entries(cls, generation: int, entries: Sequence[dict]) -> "PriceMatrix":
+        entries = list(entries)
+        prices = np.array(
+            [[entry["input_price_per_1m"] for entry in entries], [entry["output_price_per_1m"] for entry in entries]],
+            dtype=np.float64,
+        ).reshape(2, len(entries))
+        return cls(generation=generation, entries=entries, prices=prices)
+
+
+def rank_costs(matrix: PriceMatrix, tokens: np.ndarray, top_k: int) -> tuple:
+    """
+    Cost every workload on every entry and rank the cheapest `top_k` per workload.
+
+    Args:
+        tokens: Shape (m, 2), input and output tokens of each workload
+
+    Returns:
+        (indices, costs), both shape (m, min(top_k, n)): entry indices cheapest
+        first and their cost in dollars
+
+    Examples:
+        >>> matrix = PriceMatrix.from_entries(0, [
+        ...     {"input_price_per_1m": 10.0, "output_price_per_1m": 30.0},
+        ...     {"input_price_per_1m": 1.0, "output_price_per_1m": 2.0},
+        ... ])
+        >>> indices, costs = rank_costs(matrix, np.array([[1_000_000, 500_000]]), top_k=5)
+        >>> indices.tolist(), costs.tolist()
+        ([[1, 0]], [[2.0, 25.0]])
+    """
+    costs = tokens @ matrix.prices / 1_000_000
+    k = min(top_k, costs.shape[1])
+    if k < costs.shape[1]:
+        candidates = np.argpartition(costs, k - 1, axis=1)[:, :k]
+    else:
+        candidates = np.broadcast_to(np.arange(costs.shape[1]), costs.shape)
+    candidate_costs = np.take_along_axis(costs, candidates, axis=1)
+    order = np.argsort(candidate_costs, axis=1, kind="stable")
+    return np.take_along_axis(candidates, order, axis=1), np.take_along_axis(candidate_costs, order, axis=1)
+
+
+def estimate_costs(matrix: PriceMatrix, workloads: Sequence[dict], top_k: int) -> List[dict]:
+    """
+    Rank every (model, provider) by the cost of each workload.
+
+    Each workload has `input_tokens` and `output_tokens` per request and an
+    optional `requests_per_day`, which adds daily and monthly projections.
+    """
+    tokens = np.array([[w["input_tokens"], w["output_tokens"]] for w in workloads], dtype=np.float64).reshape(-1, 2)
+    indices, costs = rank_costs(matrix, tokens, top_k)
+
+    results = []
+    for workload, workload_indices, workload_costs in zip(workloads, indices.tolist(), costs.tolist()):
+        requests_per_day: Optional[float] = workload.get("requests_per_day")
+        ranked = []
+        for rank, (index, cost) in enumerate(zip(workload_indices, workload_costs), start=1):
+            entry = matrix.entries[index]
+            estimate = {
+                "rank": rank,
+                "model": entry["model"],
+                "provider": entry["provider"],
+                "cost_per_request": cost,
+            }
+            if requests_per_day is not None:
+                estimate["daily_cost"] = cost * requests_per_day
+                estimate["monthly_cost"] = cost * requests_per_day * DAYS_PER_MONTH
+            ranked.append(estimate)
+        results.append({"workload": workload, "estimates": ranked})
+    return results
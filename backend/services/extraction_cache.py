@@ -0,0 +1,128 @@
+"""Persistent, content-addressed cache of LLM extraction results.
+
+Entries map a hash of the normalized page content plus the prompt version to
+the price list the LLM extracted from it, so a page that has not changed is
+never sent to the LLM twice, even across restarts. The cache is a local SQLite
+file, bounded by entry count and age.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+EXTRACTION_CACHE_PATH = os.getenv("EXTRACTION_CACHE_PATH", "extraction_cache.db")
+EXTRACTION_CACHE_MAX_ENTRIES = int(os.getenv("EXTRACTION_CACHE_MAX_ENTRIES", "1000"))
+EXTRACTION_CACHE_MAX_AGE_SECONDS = float(os.getenv("EXTRACTION_CACHE_MAX_AGE_SECONDS", str(30 * 24 * 3600)))
+
+
+def normalize_content(content: str) -> str:
+    """
+    Normalize page content so that whitespace-only changes hash identically.
+
+    Examples:
+        >>> normalize_content("  Input:   $3\\n\\n\\n Output: $15  ")
+        'Input: $3 Output: $15'
+    """
+    return re.sub(r"\s+", " ", content).strip()
+
+
+class ExtractionCache:
+    def __init__(self, path: str = EXTRACTION_CACHE_PATH, max_entries: int = EXTRACTION_CACHE_MAX_ENTRIES, max_age_seconds: float = EXTRACTION_CACHE_MAX_AGE_SECONDS):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_age_seconds = max_age_seconds
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS extraction_cache (
+                key TEXT PRIMARY KEY,
+                prices TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_used_at REAL NOT NULL
+            )
+        """)
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(content: str, prompt_version: str) -> str:
+        """Build the cache key for page content extracted with a given prompt version."""
+        digest = hashlib.sha256()
+        digest.update(prompt_version.encode('utf-8'))
+        digest.update(b'\0')
+        digest.update(normalize_content(content).encode('utf-8'))
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[List[dict]]:
+        """Return the cached price list for a key, or None on a miss or an expired entry."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT prices, created_at FROM extraction_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or now - row[1] > self.max_age_seconds:
+                if row is not None:
+                    self._conn.execute("DELETE FROM extraction_cache WHERE key = ?", (key,))
+                    self._conn.commit()
+                    self.evictions += 1
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE extraction_cache SET last_used_at = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, key: str, prices: List[dict]):
+        """Store a price list and evict entries beyond the age and size limits."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO extraction_cache (key, prices, created_at, last_used_at) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(prices), now, now),
+            )
+            self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now: float):
+        expired = self._conn.execute(
+            "DELETE FROM extraction_cache WHERE created_at < ?", (now - self.max_age_seconds,)
+        ).rowcount
+        overflow = self._conn.execute(
+            """
+            DELETE FROM extraction_cache WHERE key IN (
+                SELECT key FROM extraction_cache ORDER BY last_used_at DESC LIMIT -1 OFFSET ?
+            )
+            """,
+            (self.max_entries,),
+        ).rowcount
+        if expired or overflow:
+            logger.info(f"Evicted {expired} expired and {overflow} least recently used extraction cache entries")
+        self.evictions += expired + overflow
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM extraction_cache").fetchone()[0]
+
+    def stats(self) -> dict:
+        """Return hit/miss/eviction counters and the current number of entries."""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": len(self),
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,158 @@
+"""Deterministic pricing extractors.
+
+Providers that publish their prices as plain HTML tables can be parsed directly
+instead of going through the LLM. Extractors are registered per provider name;
+PriceAgent tries the registered extractor first and falls back to the LLM when
+there is none, it fails, or its output does not pass `validate_prices`.
+
+There are no page-specific extractors yet. The providers in
+TABLE_EXTRACTOR_PROVIDERS share one generic extractor, `parse_pricing_tables`,
+which reads any table with model, input and output price columns; when their
+pages don't hold such a table, validation fails and the LLM takes over. A
+provider whose page needs more than that gets its own function through
+`register_extractor`, tested against HTML captured from its page.
+"""
+
+import math
+import re
+from functools import partial
+from typing import Callable, Dict, List, Optional
+
+from bs4 import BeautifulSoup
+
+from models.price_data import PriceData
+
+Extractor = Callable[[str], List[PriceData]]
+
+EXTRACTORS: Dict[str, Extractor] = {}
+
+# Largest per-1M token price we accept from a parsed table before distrusting it
+MAX_PRICE_PER_1M = 1000.0
+
+_AMOUNT_PATTERN = re.compile(r"\$\s*([0-9]+(?:,[0-9]{3})*(?:\.[0-9]+)?)")
+_PER_1K_PATTERN = re.compile(r"(?:/|per)\s*(?:1\s*k\b|1,000\b|thousand|k\s*tok)", re.IGNORECASE)
+
+
+def register_extractor(provider_name: str) -> Callable[[Extractor], Extractor]:
+    """Register a function as the deterministic extractor for a provider."""
+    def decorator(func: Extractor) -> Extractor:
+        EXTRACTORS[provider_name] = func
+        return func
+    return decorator
+
+
+def get_extractor(provider_name: str) -> Optional[Extractor]:
+    """Return the extractor registered for a provider, if any."""
+    return EXTRACTORS.get(provider_name)
+
+
+def parse_price_per_1m(text: str, unit_hint: str = "") -> Optional[float]:
+    """
+    Parse a dollar amount and convert it to dollars per 1M tokens.
+
+    Args:
+        text: Cell text containing the amount
+        unit_hint: Extra text that may carry the unit, such as the column header
+
+    Returns:
+        The price per 1M tokens, or None if the text has no dollar amount
+
+    Examples:
+        >>> parse_price_per_1m("$3 / MTok")
+        3.0
+        >>> parse_price_per_1m("$0.0025 per 1K tokens")
+        2.5
+        >>> parse_price_per_1m("$0.5", unit_hint="Input (per 1k tokens)")
+        500.0
+    """
+    match = _AMOUNT_PATTERN.search(text)
+    if not match:
+        return None
+    amount = float(match.group(1).replace(',', ''))
+    if _PER_1K_PATTERN.search(text) or _PER_1K_PATTERN.search(unit_hint):
+        amount *= 1000
+    return round(amount, 6)
+
+
+def _find_column(headers: List[str], keywords: List[str]) -> Optional[int]:
+    for index, header in enumerate(headers):
+        if any(keyword in header for keyword in keywords):
+            return index
+    return None
+
+
+def parse_pricing_tables(html: str, provider_name: str) -> List[PriceData]:
+    """
+    Parse every table with input and output price columns into PriceData.
+
+    The model column is the one whose header mentions "model", or the first
+    column otherwise. Rows without a dollar amount in both price columns are
+    skipped.
+    """
+    prices = []
+    soup = BeautifulSoup(html, "html.parser")
+
+    for table in soup.find_all("table"):
+        rows = table.find_all("tr")
+        if len(rows) < 2:
+            continue
+
+        raw_headers = [cell.get_text(" ", strip=True) for cell in rows[0].find_all(["th", "td"])]
+        headers = [header.lower() for header in raw_headers]
+        input_col = _find_column(headers, ["input", "prompt"])
+        output_col = _find_column(headers, ["output", "completion", "generation"])
+        if input_col is None or output_col is None:
+            continue
+        model_col = _find_column(headers, ["model"])
+        if model_col is None:
+            model_col = 0
+
+        for row in rows[1:]:
+            cells = [cell.get_text(" ", strip=True) for cell in row.find_all(["th", "td"])]
+            if len(cells) <= max(model_col, input_col, output_col):
+                continue
+            model_name = cells[model_col]
+            input_price = parse_price_per_1m(cells[input_col], raw_headers[input_col])
+            output_price = parse_price_per_1m(cells[output_col], raw_headers[output_col])
+            if not model_name or input_price is None or output_price is None:
+                continue
+            prices.append(PriceData(
+                model=model_name,
+                provider=provider_name,
+                input_price_per_1m=input_price,
+                output_price_per_1m=output_price,
+            ))
+
+    return prices
+
+
+def validate_prices(prices: List[PriceData]) -> bool:
+    """
+    Check that extracted prices are plausible enough to skip the LLM.
+
+    Returns:
+        False if nothing was extracted, a model name is empty, a price is
+        negative, not finite or implausibly large, or the same model was
+        extracted twice with different prices
+    """
+    if not prices:
+        return False
+
+    seen = {}
+    for price in prices:
+        if not price.display_name:
+            return False
+        for value in (price.input_price_per_1m, price.output_price_per_1m):
+            if value is None or not math.isfinite(value) or value < 0 or value > MAX_PRICE_PER_1M:
+                return False
+        pair = (price.input_price_per_1m, price.output_price_per_1m)
+        if seen.setdefault(price.normalized_id, pair) != pair:
+            return False
+    return True
+
+
+# Providers tried with the generic table extractor before the LLM
+TABLE_EXTRACTOR_PROVIDERS = ("Anthropic", "Cohere")
+
+for _provider_name in TABLE_EXTRACTOR_PROVIDERS:
+    EXTRACTORS[_provider_name] = partial(parse_pricing_tables, provider_name=_provider_name)
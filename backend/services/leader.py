@@ -0,0 +1,117 @@
+"""Leader election for the periodic price refresh.
+
+Every API process runs a refresh loop, but only the leader scrapes; the others
+reload what the leader stored. On PostgreSQL leadership is a session-level
+advisory lock held on a dedicated connection, on SQLite an exclusive lock on a
+local file. Both are released by the database or the OS when the holding
+process dies, so another process takes over on its next attempt.
+"""
+
+import fcntl
+import logging
+import os
+import tempfile
+from typing import Optional
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+
+logger = logging.getLogger(__name__)
+
+# Arbitrary application-wide key for pg_try_advisory_lock
+REFRESH_LOCK_ID = int(os.getenv("REFRESH_LOCK_ID", "727716915"))
+LEADER_LOCK_FILE = os.getenv("LEADER_LOCK_FILE", os.path.join(tempfile.gettempdir(), "mouse-refresh.lock"))
+
+
+class AdvisoryLockLeader:
+    """Leadership as a PostgreSQL session advisory lock"""
+
+    def __init__(self, engine: Engine, lock_id: int = REFRESH_LOCK_ID):
+        self.engine = engine
+        self.lock_id = lock_id
+        self._conn: Optional[Connection] = None
+
+    @property
+    def is_leader(self) -> bool:
+        return self._conn is not None
+
+    def try_acquire(self) -> bool:
+        """Become or stay the leader without blocking; returns whether this process leads"""
+        if self._conn is not None:
+            try:
+                self._conn.execute(text("SELECT 1"))
+                return True
+            except Exception as e:
+                # The session, and with it the lock, is gone; another process may lead now
+                logger.warning(f"Lost the refresh leader connection: {str(e)}")
+                self._discard()
+
+        conn = self.engine.connect().execution_options(isolation_level="AUTOCOMMIT")
+        try:
+            acquired = conn.execute(text("SELECT pg_try_advisory_lock(:lock_id)"), {"lock_id": self.lock_id}).scalar()
+        except Exception:
+            conn.close()
+            raise
+        if not acquired:
+            conn.close()
+            return False
+        self._conn = conn
+        logger.info(f"Acquired the refresh leader lock {self.lock_id}")
+        return True
+
+    def release(self):
+        if self._conn is None:
+            return
+        try:
+            self._conn.execute(text("SELECT pg_advisory_unlock(:lock_id)"), {"lock_id": self.lock_id})
+        finally:
+            self._discard()
+
+    def _discard(self):
+        try:
+            self._conn.close()
+        except Exception:
+            pass
+        self._conn = None
+
+
+class FileLockLeader:
+    """Leadership as an exclusive flock on a local file, for single-host SQLite deployments"""
+
+    def __init__(self, path: str = LEADER_LOCK_FILE):
+        self.path = path
+        self._fd: Optional[int] = None
+
+    @property
+    def is_leader(self) -> bool:
+        return self._fd is not None
+
+    def try_acquire(self) -> bool:
+        """Become or stay the leader without blocking; returns whether this process leads"""
+        if self._fd is not None:
+            return True
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+        self._fd = fd
+        logger.info(f"Acquired the refresh leader lock file {self.path}")
+        return True
+
+    def release(self):
+        if self._fd is None:
+            return
+        try:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        finally:
+            os.close(self._fd)
+            self._fd = None
+
+
+def create_leader_election(engine: Engine):
+    """Pick the leader election mechanism for the database behind `engine`"""
+    if engine.dialect.name == "postgresql":
+        return AdvisoryLockLeader(engine)
+    return FileLockLeader()
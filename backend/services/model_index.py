@@ -0,0 +1,205 @@
+"""Model identity resolution and search over the current models.
+
+`normalize_model_name` keys stored rows, but providers spell the same model
+differently: "claude-3-opus-20240229", "Claude 3 Opus" and "claude_3_opus".
+`canonical_model_id` reduces such spellings to one key, and an alias table maps
+remaining names (marketing names, "-latest" pointers) onto canonical keys.
+
+`ModelIndex` is built once per data generation from the price store. Exact and
+canonical lookups are dictionary hits; search uses a sorted list of name and
+token-suffix keys for prefix matches and trigram postings for fuzzy matches.
+"""
+
+import bisect
+import os
+import re
+from collections import Counter
+from typing import Dict, List, Optional, Set, Tuple
+
+from utils import normalize_model_name
+
+# Release dates appended to model names: -20240229, -2024-02-29, @20240229
+_DATE_SUFFIX = re.compile(r"[-_@ ]?(?:\d{8}|\d{4}-\d{2}-\d{2})$")
+_SEPARATORS = re.compile(r"[\s_:-]+")
+# "+" names a different model ("Command R" and "Command R+"), so it is spelled out rather than dropped
+_PLUS = re.compile(r"\s*\+")
+
+# Prefix matches collected before ranking; autocomplete shows only the best few
+SEARCH_PREFIX_CANDIDATES = 200
+# Minimum trigram similarity for a fuzzy match
+SEARCH_MIN_SIMILARITY = 0.3
+
+
+def canonical_model_id(name: str) -> str:
+    """
+    Reduce a model name to its canonical identity key.
+
+    Vendor prefixes and release-date suffixes are dropped, "+" becomes "-plus"
+    and every run of spaces, underscores, hyphens and colons becomes one hyphen.
+
+    Examples:
+        >>> canonical_model_id("claude-3-opus-20240229")
+        'claude-3-opus'
+        >>> canonical_model_id("Claude 3 Opus")
+        'claude-3-opus'
+        >>> canonical_model_id("anthropic/claude_3_opus@20240229")
+        'claude-3-opus'
+        >>> canonical_model_id("Claude 2.1")
+        'claude-2.1'
+        >>> canonical_model_id("Command R+"), canonical_model_id("command-r-plus")
+        ('command-r-plus', 'command-r-plus')
+    """
+    name = name.strip().lower().rsplit("/", 1)[-1]
+    name = _DATE_SUFFIX.sub("", name)
+    name = _PLUS.sub("-plus", name)
+    return _SEPARATORS.sub("-", name).strip("-")
+
+
+def parse_model_aliases(value: str) -> Dict[str, str]:
+    """
+    Parse model alias overrides.
+
+    Args:
+        value: Comma separated alias=model pairs
+
+    Returns:
+        Mapping of canonical alias to canonical model id
+
+    Examples:
+        >>> parse_model_aliases("gpt4=GPT-4, Opus=claude-3-opus-20240229")
+        {'gpt4': 'gpt-4', 'opus': 'claude-3-opus'}
+    """
+    aliases = {}
+    for pair in value.split(","):
+        if "=" not in pair:
+            continue
+        alias, model = pair.split("=", 1)
+        aliases[canonical_model_id(alias)] = canonical_model_id(model)
+    return aliases
+
+
+DEFAULT_MODEL_ALIASES = {
+    "gpt4": "gpt-4",
+    "gpt4o": "gpt-4o",
+    "gpt-4-turbo-preview": "gpt-4-turbo",
+    "chatgpt-4o-latest": "gpt-4o",
+    "claude-3-opus-latest": "claude-3-opus",
+    "claude-3-5-sonnet": "claude-3.5-sonnet",
+    "claude-3-5-sonnet-latest": "claude-3.5-sonnet",
+    "claude-3-5-haiku": "claude-3.5-haiku",
+    "claude-3-5-haiku-latest": "claude-3.5-haiku",
+    "gemini-pro": "gemini-1.0-pro",
+}
+MODEL_ALIASES = {**DEFAULT_MODEL_ALIASES, **parse_model_aliases(os.getenv("MODEL_ALIASES", ""))}
+
+
+def _trigrams(key: str) -> Set[str]:
+    padded = f" {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class ModelIndex:
+    def __init__(self, models: Dict[str, List[dict]], aliases: Optional[Dict[str, str]] = None):
+        """
+        Index the current models.
+
+        Args:
+            models: Current price entries of each model, keyed by normalized_id
+            aliases: Canonical alias to canonical model id
+        """
+        self.aliases = MODEL_ALIASES if aliases is None else aliases
+        self._models: List[Tuple[str, str, List[str]]] = []
+        self._normalized: Dict[str, int] = {}
+        self._canonical: Dict[str, List[int]] = {}
+        prefix_keys = []
+        postings: Dict[str, List[int]] = {}
+        self._trigram_counts: List[int] = []
+
+        for normalized_id, entries in sorted(models.items()):
+            if not entries:
+                continue
+            index = len(self._models)
+            display_name = entries[0]["model"]
+            self._models.append((normalized_id, display_name, sorted({entry["provider"] for entry in entries})))
+            self._normalized[normalized_id] = index
+
+            # From the display name: normalized ids have already lost the "+" of names like "Command R+"
+            key = self.canonical(display_name)
+            self._canonical.setdefault(key, []).append(index)
+            # Every token boundary starts a key, so "opus" finds "claude-3-opus"
+            tokens = key.split("-")
+            for position in range(len(tokens)):
+                prefix_keys.append(("-".join(tokens[position:]), position, index))
+            trigrams = _trigrams(key)
+            self._trigram_counts.append(len(trigrams))
+            for trigram in trigrams:
+                postings.setdefault(trigram, []).append(index)
+
+        prefix_keys.sort()
+        self._prefix_keys = [key for key, _, _ in prefix_keys]
+        self._prefix_targets = [(position, index) for _, position, index in prefix_keys]
+        self._postings = postings
+
+    def canonical(self, name: str) -> str:
+        """Return the canonical id of a name, following the alias table"""
+        key = canonical_model_id(name)
+        return self.aliases.get(key, key)
+
+    def resolve(self, name: str) -> List[str]:
+        """
+        Return the normalized_ids of the models a name refers to.
+
+        A name identical to a stored normalized_id resolves to exactly that
+        model; otherwise every stored spelling of its canonical identity matches.
+        Identity depends on names and aliases only, never on prices, so a
+        price change cannot make a name resolve to a different model.
+        """
+        normalized = normalize_model_name(name)
+        if normalized in self._normalized:
+            return [normalized]
+        return [self._models[index][0] for index in self._canonical.get(self.canonical(name), [])]
+
+    def search(self, query: str, limit: int = 10) -> List[dict]:
+        """
+        Rank models for an autocomplete query.
+
+        Exact identities come first, then models whose name starts with the
+        query, then models with a later word starting with it, then fuzzy
+        trigram matches; ties go to the shorter name.
+        """
+        key = canonical_model_id(query)
+        if not key or limit <= 0:
+            return []
+        ranked: Dict[int, Tuple] = {}
+
+        def offer(index: int, rank: Tuple):
+            if index not in ranked or rank < ranked[index]:
+                ranked[index] = rank
+
+        for index in self._canonical.get(self.canonical(query), []):
+            offer(index, (0, 0.0))
+
+        position = bisect.bisect_left(self._prefix_keys, key)
+        end = min(position + SEARCH_PREFIX_CANDIDATES, len(self._prefix_keys))
+        while position < end and self._prefix_keys[position].startswith(key):
+            token_position, index = self._prefix_targets[position]
+            offer(index, (1 if token_position == 0 else 2, float(len(self._models[index][1]))))
+            position += 1
+
+        if len(ranked) < limit:
+            query_trigrams = _trigrams(key)
+            shared = Counter(index for trigram in query_trigrams for index in self._postings.get(trigram, ()))
+            for index, count in shared.items():
+                similarity = count / (len(query_trigrams) + self._trigram_counts[index] - count)
+                if similarity >= SEARCH_MIN_SIMILARITY:
+                    offer(index, (3, -similarity))
+
+        best = sorted(ranked, key=lambda index: (ranked[index], self._models[index][1]))[:limit]
+        return [{
+            "normalized_id": self._models[index][0],
+            "display_name": self._models[index][1],
+            "providers": self._models[index][2],
+        } for index in best]
+
+    def __len__(self) -> int:
+        return len(self._models)
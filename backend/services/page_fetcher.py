@@ -0,0 +1,140 @@
+"""HTTP fetching of provider pricing pages.
+
+All fetches share one keep-alive session. Validators (ETag/Last-Modified) and a
+hash of the last body are kept per URL so callers can tell when a page has not
+changed since the previous refresh and skip the work that follows.
+"""
+
+import hashlib
+import logging
+import os
+import threading
+from dataclasses import dataclass
+from typing import Dict, Optional
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+USER_AGENT = 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36'
+FETCH_TIMEOUT_SECONDS = float(os.getenv("FETCH_TIMEOUT_SECONDS", "20"))
+
+
+def parse_host_timeouts(value: str) -> Dict[str, float]:
+    """
+    Parse per-host timeout overrides.
+
+    Args:
+        value: Comma separated host=seconds pairs
+
+    Returns:
+        Mapping of host name to timeout in seconds
+
+    Examples:
+        >>> parse_host_timeouts("cohere.com=5, www.anthropic.com=10")
+        {'cohere.com': 5.0, 'www.anthropic.com': 10.0}
+    """
+    timeouts = {}
+    for pair in value.split(','):
+        if '=' not in pair:
+            continue
+        host, seconds = pair.split('=', 1)
+        timeouts[host.strip().lower()] = float(seconds)
+    return timeouts
+
+
+FETCH_HOST_TIMEOUTS = parse_host_timeouts(os.getenv("FETCH_HOST_TIMEOUTS", ""))
+
+
+@dataclass
+class FetchResult:
+    """Outcome of fetching a page.
+
+    `changed` is False when the server answered 304 or the body hashes to the
+    same value as the previous fetch of the URL.
+    """
+    url: str
+    status_code: int
+    html: str
+    content_hash: str
+    changed: bool
+
+
+@dataclass
+class _StoredPage:
+    etag: Optional[str]
+    last_modified: Optional[str]
+    content_hash: str
+    html: str
+
+
+class PageFetcher:
+    def __init__(self, timeout: float = FETCH_TIMEOUT_SECONDS, host_timeouts: Optional[Dict[str, float]] = None, pool_maxsize: int = 10):
+        self.timeout = timeout
+        self.host_timeouts = FETCH_HOST_TIMEOUTS if host_timeouts is None else host_timeouts
+
+        self.session = requests.Session()
+        self.session.headers['User-Agent'] = USER_AGENT
+        adapter = HTTPAdapter(pool_connections=pool_maxsize, pool_maxsize=pool_maxsize)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        self._pages: Dict[str, _StoredPage] = {}
+        self._lock = threading.Lock()
+
+    def timeout_for(self, url: str) -> float:
+        """Return the timeout to use for a URL, honouring per-host overrides"""
+        host = (urlparse(url).hostname or '').lower()
+        return self.host_timeouts.get(host, self.timeout)
+
+    def fetch(self, url: str) -> FetchResult:
+        """
+        Fetch a page, sending conditional headers when the URL was fetched before.
+
+        Raises:
+            requests.RequestException: On connection errors, timeouts and
+                non-success status codes
+        """
+        with self._lock:
+            stored = self._pages.get(url)
+
+        headers = {}
+        if stored is not None:
+            if stored.etag:
+                headers['If-None-Match'] = stored.etag
+            if stored.last_modified:
+                headers['If-Modified-Since'] = stored.last_modified
+
+        response = self.session.get(url, headers=headers, timeout=self.timeout_for(url))
+
+        if response.status_code == 304 and stored is not None:
+            logger.info(f"{url} not modified (304)")
+            return FetchResult(url, 304, stored.html, stored.content_hash, changed=False)
+
+        response.raise_for_status()
+        html = response.text
+        content_hash = hashlib.sha256(html.encode('utf-8')).hexdigest()
+        changed = stored is None or stored.content_hash != content_hash
+
+        with self._lock:
+            self._pages[url] = _StoredPage(
+                etag=response.headers.get('ETag'),
+                last_modified=response.headers.get('Last-Modified'),
+                content_hash=content_hash,
+                html=html,
+            )
+
+        if not changed:
+            logger.info(f"{url} content unchanged (hash {content_hash[:12]})")
+        return FetchResult(url, response.status_code, html, content_hash, changed=changed)
+
+    def forget(self, url: str):
+        """Drop the stored validators and body for a URL"""
+        with self._lock:
+            self._pages.pop(url, None)
+
+
+# Shared by the agent tools and the fan-out path so they reuse one connection pool
+default_fetcher = PageFetcher()
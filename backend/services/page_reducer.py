@@ -0,0 +1,147 @@
+"""Reduction of markdown pricing pages before they are sent to the LLM.
+
+Pricing pages are mostly navigation, marketing copy and footers. The reducer
+keeps only the sections that look price-relevant (tables, currency amounts,
+"per 1M/1K tokens" phrases), together with the heading they sit under, and
+packs them into chunks that fit a token budget.
+"""
+
+import math
+import os
+import re
+from typing import List
+
+PAGE_TOKEN_BUDGET = int(os.getenv("PAGE_TOKEN_BUDGET", "6000"))
+
+# Rough characters-per-token ratio for English text and markdown
+CHARS_PER_TOKEN = 4
+
+# A short block right before a price block usually carries the model name
+CONTEXT_BLOCK_MAX_CHARS = 200
+
+_PRICE_SIGNAL = re.compile(
+    r"[$€£]\s*\d"
+    r"|\bper\s+(?:1\s*[mk]|1,000(?:,000)?|million|thousand)\b"
+    r"|/\s*(?:1\s*)?[mk]\s*tok"
+    r"|\bmtok\b",
+    re.IGNORECASE,
+)
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimate the number of LLM tokens in a piece of text.
+
+    Examples:
+        >>> estimate_tokens("")
+        0
+        >>> estimate_tokens("$3 / MTok")
+        3
+    """
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def is_price_relevant(block: str) -> bool:
+    """Return True if a markdown block is a table or mentions prices."""
+    return block.lstrip().startswith('|') or bool(_PRICE_SIGNAL.search(block))
+
+
+def split_blocks(markdown: str) -> List[str]:
+    """Split markdown into blocks separated by blank lines, keeping headings as their own blocks."""
+    blocks = []
+    for paragraph in re.split(r"\n\s*\n", markdown):
+        current = []
+        for line in paragraph.strip().splitlines():
+            if line.startswith('#'):
+                if current:
+                    blocks.append('\n'.join(current))
+                    current = []
+                blocks.append(line)
+            else:
+                current.append(line)
+        if current:
+            blocks.append('\n'.join(current))
+    return [block for block in blocks if block.strip()]
+
+
+def select_relevant_blocks(markdown: str) -> List[str]:
+    """Return the price-relevant blocks of a page in document order, with their headings."""
+    blocks = split_blocks(markdown)
+    selected = set()
+    heading_index = None
+
+    for index, block in enumerate(blocks):
+        if block.startswith('#'):
+            heading_index = index
+            continue
+        if not is_price_relevant(block):
+            continue
+        selected.add(index)
+        if heading_index is not None:
+            selected.add(heading_index)
+        previous = index - 1
+        if previous >= 0 and not blocks[previous].startswith('#') and len(blocks[previous]) <= CONTEXT_BLOCK_MAX_CHARS:
+            selected.add(previous)
+
+    return [blocks[index] for index in sorted(selected)]
+
+
+def chunk_blocks(blocks: List[str], token_budget: int) -> List[str]:
+    """Pack blocks into chunks of at most `token_budget` tokens, splitting oversized blocks by line."""
+    separator = '\n\n'
+    chunks = []
+    current = ''
+
+    for block in blocks:
+        pieces = [block]
+        if estimate_tokens(block) > token_budget:
+            pieces = _split_oversized(block, token_budget)
+        for piece in pieces:
+            candidate = f"{current}{separator}{piece}" if current else piece
+            if current and estimate_tokens(candidate) > token_budget:
+                chunks.append(current)
+                candidate = piece
+            current = candidate
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def _split_oversized(block: str, token_budget: int) -> List[str]:
+    max_chars = token_budget * CHARS_PER_TOKEN
+    pieces = []
+    current = ''
+    for line in block.splitlines():
+        while len(line) > max_chars:
+            if current:
+                pieces.append(current)
+                current = ''
+            pieces.append(line[:max_chars])
+            line = line[max_chars:]
+        if current and len(current) + len(line) + 1 > max_chars:
+            pieces.append(current)
+            current = ''
+        current = f"{current}\n{line}" if current else line
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def reduce_markdown(markdown: str, token_budget: int = PAGE_TOKEN_BUDGET) -> List[str]:
+    """
+    Reduce a markdown pricing page to its price-relevant sections.
+
+    Args:
+        markdown: The full markdown page
+        token_budget: Maximum estimated tokens per returned chunk
+
+    Returns:
+        Chunks of price-relevant content, each within the token budget. If
+        nothing on the page looks price-relevant, the start of the page is
+        returned as a single chunk so the LLM still gets a chance.
+    """
+    blocks = select_relevant_blocks(markdown)
+    if not blocks:
+        chunks = chunk_blocks(split_blocks(markdown), token_budget)
+        return chunks[:1]
+    return chunk_blocks(blocks, token_budget)
@@ -1,19 +1,96 @@
-from typing import List, Dict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, List, Dict, Optional, Tuple
+import hashlib
 import json
 import requests
 import os
 import re
+import threading
+import time
 from markdownify import markdownify
 from smolagents import ToolCallingAgent, tool
 from smolagents.models import OpenAIServerModel
 
 from models.price_data import PriceData
+from services.extraction_cache import ExtractionCache
+from services.extractors import get_extractor, validate_prices
+from services.page_fetcher import PageFetcher, default_fetcher
+from services.page_reducer import PAGE_TOKEN_BUDGET, estimate_tokens, reduce_markdown
+
+# "fan_out" extracts every provider as its own task; "agent" lets a single
+# ToolCallingAgent walk all providers in one run.
+PRICE_AGENT_MODE = os.getenv("PRICE_AGENT_MODE", "fan_out")
+PRICE_AGENT_CONCURRENCY = int(os.getenv("PRICE_AGENT_CONCURRENCY", "4"))
+
+PROVIDER_PRICING_PAGES = {
+    # TODO: Cloudflare prevents simple scraping of OpenAI Pricing
+    # "OpenAI": "https://platform.openai.com/docs/pricing",
+    # TODO: AWS puts prices in a table element that is not easily scraped
+    #"AWS Bedrock": "https://aws.amazon.com/bedrock/pricing/",
+    "Anthropic": "https://www.anthropic.com/pricing",
+    "Cohere": "https://cohere.com/pricing"
+}
+
+PROVIDER_EXTRACTION_PROMPT = """You are an expert at extracting pricing information and model metadata from AI model provider websites.
+Below is the pricing page of the provider "{provider_name}", converted to markdown.
+For each model on the page, identify:
+1. The model name
+2. The model origin if different from the provider name
+3. The input price per 1M tokens (aka Mtok)
+4. The output price per 1M tokens (aka Mtok)
+
+If prices are given in different units (e.g., per 1K tokens), convert them to dollars per 1M tokens.
+Return only JSON in this format:
+{{
+    "prices": [
+        {{
+            "model": "gpt-4",
+            "provider": "{provider_name}",
+            "model_origin": "openai",
+            "input_price_per_1m": 30.0,
+            "output_price_per_1m": 60.0
+        }}
+    ]
+}}
+
+Pricing page:
+{content}
+"""
+
+EXTRACTION_MODEL_ID = "gpt-4o-mini"
+
+# Cached extractions are only reused for the same model and prompt
+PROMPT_VERSION = hashlib.sha256(
+    f"{EXTRACTION_MODEL_ID}\n{PROVIDER_EXTRACTION_PROMPT}".encode('utf-8')
+).hexdigest()[:16]
+
+
+def html_to_markdown(html_content: str) -> str:
+    """Convert a pricing page to markdown and squeeze runs of blank lines."""
+    markdown_content = markdownify(html_content, heading_style="ATX").strip()
+    return re.sub(r"\n{3,}", "\n\n", markdown_content)
+
 
 class PriceAgent:
-    def __init__(self):
+    def __init__(self, mode: Optional[str] = None, max_concurrency: Optional[int] = None, fetcher: Optional[PageFetcher] = None, token_budget: Optional[int] = None, extraction_cache: Optional[ExtractionCache] = None):
+        self.mode = mode or PRICE_AGENT_MODE
+        self.max_concurrency = max_concurrency or PRICE_AGENT_CONCURRENCY
+        self.token_budget = token_budget or PAGE_TOKEN_BUDGET
+        self.fetcher = fetcher or default_fetcher
+        self.extraction_cache = extraction_cache if extraction_cache is not None else ExtractionCache()
+        # Last successfully extracted prices per provider and the hash of the page body they came from;
+        # reused only while the fetched page still has that hash
+        self._last_prices: Dict[str, Tuple[str, List[dict]]] = {}
+
+        # Which extraction path handled each provider ("extractor", "cache", "llm" or "unchanged")
+        self._metrics_lock = threading.Lock()
+        self._path_counts: Dict[str, int] = {"extractor": 0, "cache": 0, "llm": 0, "unchanged": 0}
+        self._token_totals: Dict[str, int] = {"before_reduction": 0, "after_reduction": 0}
+        self._provider_metrics: Dict[str, dict] = {}
+
         # Initialize the OpenAI model
         self.model = OpenAIServerModel(
-            model_id="gpt-4o-mini",
+            model_id=EXTRACTION_MODEL_ID,
             api_key=os.getenv("OPENAI_API_KEY")
         )
         
@@ -26,7 +103,186 @@ class PriceAgent:
         )
 
     def fetch_prices(self) -> List[PriceData]:
-        """Fetch and parse prices from all providers using the agent."""
+        """Fetch and parse prices from all providers."""
+        if self.mode == "agent":
+            return self._fetch_prices_with_agent()
+        return self._fetch_prices_fan_out()
+
+    def _fetch_prices_fan_out(self) -> List[PriceData]:
+        """Fetch and extract each provider as its own task with bounded concurrency.
+
+        A provider that fails is dropped from the result; the others are unaffected.
+        """
+        all_prices = []
+        providers = dict(PROVIDER_PRICING_PAGES)
+        if not providers:
+            return all_prices
+
+        max_workers = min(self.max_concurrency, len(providers))
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="price-provider") as pool:
+            futures = {
+                pool.submit(self.fetch_provider_prices, provider_name, pricing_url): provider_name
+                for provider_name, pricing_url in providers.items()
+            }
+            for future in as_completed(futures):
+                provider_name = futures[future]
+                try:
+                    provider_prices = future.result()
+                    print(f"Extracted {len(provider_prices)} prices for {provider_name}")
+                    all_prices.extend(provider_prices)
+                except Exception as e:
+                    print(f"Error fetching prices for {provider_name}: {str(e)}")
+
+        return all_prices
+
+    def fetch_provider_prices(self, provider_name: str, provider_pricing_url: str) -> List[PriceData]:
+        """Fetch a single provider's pricing page and extract its prices.
+
+        When the page is unchanged since the last successful extraction (304 or an
+        identical body), the previous prices are returned without converting the
+        page or calling the LLM. If extraction fails, the page's validators are
+        dropped so the next refresh fetches and extracts it again. Otherwise the provider's registered deterministic
+        extractor is tried first, and the LLM is used only when there is none or
+        its output does not validate and the reduced page is not in the
+        extraction cache.
+        """
+        started = time.perf_counter()
+        print(f"Fetching pricing page for {provider_name} from {provider_pricing_url}")
+        page = self.fetcher.fetch(provider_pricing_url)
+        content_hash, last_prices = self._last_prices.get(provider_name, (None, None))
+        if not page.changed and content_hash == page.content_hash:
+            print(f"{provider_name} pricing page unchanged, reusing previous prices")
+            prices = [self._price_from_dict(price) for price in last_prices]
+            self._record_path(provider_name, "unchanged", len(prices), started)
+            return prices
+
+        details = {}
+        try:
+            prices = self._extract_deterministic(provider_name, page.html)
+            if prices is not None:
+                path = "extractor"
+            else:
+                path, prices, details = self._extract_with_llm(provider_name, page.html)
+        except Exception:
+            # The fetcher already recorded this body as seen; forget it so it is not taken as unchanged
+            self._last_prices.pop(provider_name, None)
+            self.fetcher.forget(provider_pricing_url)
+            raise
+        self._record_path(provider_name, path, len(prices), started, **details)
+
+        if prices:
+            self._last_prices[provider_name] = (page.content_hash, [self._price_to_dict(price) for price in prices])
+        else:
+            # Nothing usable came back; make sure the next refresh tries again
+            self._last_prices.pop(provider_name, None)
+            self.fetcher.forget(provider_pricing_url)
+        return prices
+
+    def _extract_deterministic(self, provider_name: str, html: str) -> Optional[List[PriceData]]:
+        """Run the provider's registered extractor, returning None when the LLM should be used."""
+        extractor = get_extractor(provider_name)
+        if extractor is None:
+            return None
+        try:
+            prices = extractor(html)
+        except Exception as e:
+            print(f"Extractor for {provider_name} failed, falling back to LLM: {str(e)}")
+            return None
+        if not validate_prices(prices):
+            print(f"Extractor output for {provider_name} did not validate, falling back to LLM")
+            return None
+        return prices
+
+    def _extract_with_llm(self, provider_name: str, html: str) -> Tuple[str, List[PriceData], dict]:
+        """Ask the LLM to extract the provider's prices from the reduced page.
+
+        The page is converted to markdown and reduced to its price-relevant
+        sections, chunked under the token budget; each chunk is one LLM call.
+        Reduced content that was extracted before is served from the extraction
+        cache instead.
+
+        Returns:
+            The path that produced the prices ("cache" or "llm"), the prices
+            (first occurrence wins for a model repeated across chunks) and the
+            token counts before and after reduction.
+        """
+        markdown = html_to_markdown(html)
+        chunks = reduce_markdown(markdown, self.token_budget)
+        details = {
+            "tokens_before_reduction": estimate_tokens(markdown),
+            "tokens_after_reduction": sum(estimate_tokens(chunk) for chunk in chunks),
+            "chunks": len(chunks),
+        }
+        print(
+            f"Reduced {provider_name} pricing page from {details['tokens_before_reduction']} "
+            f"to {details['tokens_after_reduction']} tokens in {len(chunks)} chunk(s)"
+        )
+
+        cache_key = ExtractionCache.make_key("\n\n".join(chunks), PROMPT_VERSION)
+        cached = self.extraction_cache.get(cache_key)
+        if cached is not None:
+            print(f"Using cached extraction for {provider_name}")
+            return "cache", [self._price_from_dict(price) for price in cached], details
+
+        prices = []
+        seen = set()
+        for chunk in chunks:
+            prompt = PROVIDER_EXTRACTION_PROMPT.format(provider_name=provider_name, content=chunk)
+            response = self.model(
+                [{"role": "user", "content": prompt}],
+                response_format={"type": "json_object"},
+            )
+            for price in self._parse_prices(response.content, default_provider=provider_name):
+                if price.normalized_id not in seen:
+                    seen.add(price.normalized_id)
+                    prices.append(price)
+        if prices:
+            self.extraction_cache.put(cache_key, [self._price_to_dict(price) for price in prices])
+        return "llm", prices, details
+
+    def _record_path(self, provider_name: str, path: str, price_count: int, started: float, **details):
+        with self._metrics_lock:
+            self._path_counts[path] += 1
+            if path == "llm":
+                self._token_totals["before_reduction"] += details.get("tokens_before_reduction", 0)
+                self._token_totals["after_reduction"] += details.get("tokens_after_reduction", 0)
+            self._provider_metrics[provider_name] = {
+                "path": path,
+                "price_count": price_count,
+                "duration_ms": round((time.perf_counter() - started) * 1000, 3),
+                **details,
+            }
+
+    def get_metrics(self) -> dict:
+        """Return extraction path counters, token totals, cache counters and the last outcome per provider."""
+        with self._metrics_lock:
+            return {
+                "extraction_paths": dict(self._path_counts),
+                "llm_tokens": dict(self._token_totals),
+                "extraction_cache": self.extraction_cache.stats(),
+                "providers": {name: dict(metrics) for name, metrics in self._provider_metrics.items()},
+            }
+
+    @staticmethod
+    def _price_to_dict(price: PriceData) -> dict:
+        return {
+            "model": price.display_name,
+            "provider": price.provider,
+            "input_price_per_1m": price.input_price_per_1m,
+            "output_price_per_1m": price.output_price_per_1m,
+        }
+
+    @staticmethod
+    def _price_from_dict(price_info: dict) -> PriceData:
+        return PriceData(
+            model=price_info["model"],
+            provider=price_info["provider"],
+            input_price_per_1m=price_info["input_price_per_1m"],
+            output_price_per_1m=price_info["output_price_per_1m"],
+        )
+
+    def _fetch_prices_with_agent(self) -> List[PriceData]:
+        """Fetch and parse prices from all providers in a single agent run."""
         all_prices = []
         
         try:
@@ -59,45 +315,52 @@ class PriceAgent:
                 Then, for each provider and pricing page, use the fetch_pricing_pages tool to fetch the pricing data.
                 Finally, analyze the pricing data and return the results in the structured JSON format.
                 """)
-            
-            # Handle both dictionary and AgentText responses
-            if isinstance(result, dict):
-                prices = result.get("prices", [])
-            else:
-                # Try to parse the AgentText response as JSON
-                try:
-                    # Remove escaped newlines and parse
-                    cleaned_result = str(result).replace('\\n', '').replace('\\', '')
-                    parsed_result = json.loads(cleaned_result)
-                    prices = parsed_result.get("prices", [])
-                except json.JSONDecodeError as e:
-                    print(f"Could not parse agent response as JSON: {str(e)}")
-                    print(f"Raw response: {result}")
-                    return all_prices
-            
-            if not isinstance(prices, list):
-                print(f"Expected 'prices' to be a list, got {type(prices)}")
-                return all_prices
-            
-            # Convert to PriceData objects
-            for price_info in prices:
-                try:
-                    price = PriceData(
-                        model=price_info.get("model"),
-                        provider=price_info.get("provider"),
-                        input_price_per_1m=price_info.get("input_price_per_1m"),
-                        output_price_per_1m=price_info.get("output_price_per_1m"),
-                    )
-                    all_prices.append(price)
-                except Exception as e:
-                    print(f"Error creating PriceData object: {str(e)}")
-                    print(f"Price info: {price_info}")
+            all_prices = self._parse_prices(result)
 
         except Exception as e:
             print(f"Error in fetch_prices: {str(e)}")
 
         return all_prices
 
+    def _parse_prices(self, result: Any, default_provider: Optional[str] = None) -> List[PriceData]:
+        """Convert an LLM/agent response into PriceData objects."""
+        all_prices = []
+
+        # Handle both dictionary and AgentText responses
+        if isinstance(result, dict):
+            prices = result.get("prices", [])
+        else:
+            # Try to parse the AgentText response as JSON
+            try:
+                # Remove escaped newlines and parse
+                cleaned_result = str(result).replace('\\n', '').replace('\\', '')
+                parsed_result = json.loads(cleaned_result)
+                prices = parsed_result.get("prices", [])
+            except json.JSONDecodeError as e:
+                print(f"Could not parse agent response as JSON: {str(e)}")
+                print(f"Raw response: {result}")
+                return all_prices
+        
+        if not isinstance(prices, list):
+            print(f"Expected 'prices' to be a list, got {type(prices)}")
+            return all_prices
+        
+        # Convert to PriceData objects
+        for price_info in prices:
+            try:
+                price = PriceData(
+                    model=price_info.get("model"),
+                    provider=price_info.get("provider") or default_provider,
+                    input_price_per_1m=price_info.get("input_price_per_1m"),
+                    output_price_per_1m=price_info.get("output_price_per_1m"),
+                )
+                all_prices.append(price)
+            except Exception as e:
+                print(f"Error creating PriceData object: {str(e)}")
+                print(f"Price info: {price_info}")
+
+        return all_prices
+
     @tool
     def get_provider_info() -> Dict[str, str]:
         """Returns information about known AI model providers and their pricing pages.
@@ -114,14 +377,7 @@ class PriceAgent:
                 "Anthropic": "https://www.anthropic.com/pricing"
             }
         """
-        provider_info = {
-            # TODO: Cloudflare prevents simple scraping of OpenAI Pricing
-            # "OpenAI": "https://platform.openai.com/docs/pricing",
-            # TODO: AWS puts prices in a table element that is not easily scraped
-            #"AWS Bedrock": "https://aws.amazon.com/bedrock/pricing/",
-            "Anthropic": "https://www.anthropic.com/pricing",
-            "Cohere": "https://cohere.com/pricing"
-        }
+        provider_info = dict(PROVIDER_PRICING_PAGES)
 
         print(f"Getting provider info: {provider_info}\n")
 
@@ -129,35 +385,26 @@ class PriceAgent:
 
     @tool
     def fetch_pricing_page(provider_name: str, provider_pricing_url: str) -> str:
-        """Fetches pricing page from a provider and converts it to markdown.
+        """Fetches pricing page from a provider and converts its price-relevant sections to markdown.
 
         Args:
             provider_name: The name of the provider
             provider_pricing_url: The URL of the provider's model pricing page
 
         Returns:
-            The markdown content of the pricing page.
+            The price-relevant markdown content of the pricing page.
             If a page cannot be fetched, the value will be an error message.
         """
         result = {}
         
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36'
-        }
-        
         try:
             print(f"Fetching pricing page for {provider_name} from {provider_pricing_url}")
-            response = requests.get(provider_pricing_url, headers=headers)
-            print(f"Response code: {response.status_code}")
-            if response.status_code == 200:
-                html_content = response.text
-                # Convert HTML to markdown and clean up
-                markdown_content = markdownify(html_content).strip()
-                markdown_content = re.sub(r"\n{3,}", "\n\n", markdown_content)
-                result = markdown_content
-            else:
-                result = f"Error: HTTP {response.status_code} when fetching {provider_name} pricing page"
-                print(f"Error fetching {provider_name} pricing page: {response}")
+            page = default_fetcher.fetch(provider_pricing_url)
+            print(f"Response code: {page.status_code}")
+            result = "\n\n".join(reduce_markdown(html_to_markdown(page.html)))
+        except requests.HTTPError as e:
+            result = f"Error: HTTP {e.response.status_code} when fetching {provider_name} pricing page"
+            print(f"Error fetching {provider_name} pricing page: {e.response}")
         except requests.RequestException as e:
             result = f"Error fetching {provider_name} pricing page: {str(e)}"
         except Exception as e:
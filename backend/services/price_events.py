@@ -0,0 +1,113 @@
+"""Propagation of price updates between API processes.
+
+The refresh leader bumps the generation of every model_catalog row it writes
+and, on PostgreSQL, sends a NOTIFY in the same transaction. Every process runs
+a subscriber that reloads the rows newer than the generation it has seen: on a
+notification, and on a polling interval as a fallback for SQLite, for
+notifications missed while the LISTEN connection was down, or when LISTEN is
+unavailable.
+
+Writers hold a transaction advisory lock from their first read to commit, so
+generations are unique and committed in increasing order: a subscriber that
+has seen generation N never later finds a row stamped N or lower.
+"""
+
+import asyncio
+import logging
+import os
+from contextlib import suppress
+from typing import Awaitable, Callable, Optional
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+
+from services.leader import REFRESH_LOCK_ID
+
+logger = logging.getLogger(__name__)
+
+PRICE_EVENTS_CHANNEL = os.getenv("PRICE_EVENTS_CHANNEL", "prices_updated")
+PRICE_EVENTS_POLL_SECONDS = float(os.getenv("PRICE_EVENTS_POLL_SECONDS", "1"))
+# While LISTEN works polling only catches missed notifications, so it can be rare
+LISTEN_FALLBACK_POLL_SECONDS = 30.0
+# Transaction advisory lock serializing price writes; distinct from the leader and job claim locks
+PRICE_WRITE_LOCK_ID = REFRESH_LOCK_ID + 2
+
+
+def notify_statement(generation: int, channel: str = PRICE_EVENTS_CHANNEL):
+    """Statement announcing a committed generation; PostgreSQL delivers it when the transaction commits"""
+    return select(func.pg_notify(channel, str(generation)))
+
+
+def write_lock_statement(lock_id: int = PRICE_WRITE_LOCK_ID):
+    """Statement taking the price write lock on PostgreSQL, held until the transaction ends"""
+    return select(func.pg_advisory_xact_lock(lock_id))
+
+
+class PriceEventSubscriber:
+    """Calls `on_update` whenever another process may have written new prices"""
+
+    def __init__(self, engine: AsyncEngine, on_update: Callable[[], Awaitable],
+                 channel: str = PRICE_EVENTS_CHANNEL, poll_interval: float = PRICE_EVENTS_POLL_SECONDS):
+        self.engine = engine
+        self.on_update = on_update
+        self.channel = channel
+        self.poll_interval = poll_interval
+        self.notifications = 0
+        self._wakeup = asyncio.Event()
+        self._conn: Optional[AsyncConnection] = None
+        self._driver_conn = None
+        self._retry_listen_at = 0.0
+
+    @property
+    def listening(self) -> bool:
+        return self._driver_conn is not None and not self._driver_conn.is_closed()
+
+    async def run(self):
+        """Reload on every notification or poll interval until cancelled"""
+        try:
+            while True:
+                if self.engine.dialect.name == "postgresql" and not self.listening \
+                        and asyncio.get_running_loop().time() >= self._retry_listen_at:
+                    await self._listen()
+                interval = max(self.poll_interval, LISTEN_FALLBACK_POLL_SECONDS) if self.listening \
+                    else self.poll_interval
+                with suppress(asyncio.TimeoutError):
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=interval)
+                self._wakeup.clear()
+                try:
+                    await self.on_update()
+                except Exception as e:
+                    # Keep subscribing; the next notification or poll retries
+                    logger.error(f"Reloading updated prices failed: {str(e)}")
+        finally:
+            await self._unlisten()
+
+    async def _listen(self):
+        """LISTEN on a dedicated connection, falling back to polling if that fails"""
+        await self._unlisten()
+        try:
+            self._conn = await self.engine.connect()
+            raw = await self._conn.get_raw_connection()
+            self._driver_conn = raw.driver_connection
+            await self._driver_conn.add_listener(self.channel, self._on_notify)
+            logger.info(f"Listening for price updates on channel {self.channel}")
+        except Exception as e:
+            logger.warning(f"LISTEN {self.channel} failed, polling every {self.poll_interval} seconds: {str(e)}")
+            await self._unlisten()
+            self._retry_listen_at = asyncio.get_running_loop().time() + LISTEN_FALLBACK_POLL_SECONDS
+
+    async def _unlisten(self):
+        if self._conn is None:
+            return
+        try:
+            if self.listening:
+                await self._driver_conn.remove_listener(self.channel, self._on_notify)
+            await self._conn.close()
+        except Exception:
+            pass
+        self._conn = None
+        self._driver_conn = None
+
+    def _on_notify(self, connection, pid, channel, payload):
+        self.notifications += 1
+        self._wakeup.set()
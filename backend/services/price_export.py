@@ -0,0 +1,200 @@
+"""Streaming export of the stored price history.
+
+Rows are read from a server-side cursor in fixed-size batches and encoded one
+batch at a time, so an export holds at most one batch in memory however many
+rows it covers. NDJSON and CSV need nothing beyond the standard library;
+Parquet needs the optional pyarrow package and writes one row group per batch.
+"""
+
+import csv
+import io
+import os
+from datetime import datetime
+from typing import AsyncIterator, List, Optional, Sequence
+
+from pydantic_core import to_json
+from sqlalchemy import func, select
+
+from models.price_data import PriceData
+from utils import normalize_model_name
+
+EXPORT_BATCH_ROWS = int(os.getenv("EXPORT_BATCH_ROWS", "5000"))
+
+EXPORT_COLUMNS = (
+    "normalized_id",
+    "model",
+    "provider",
+    "input_price_per_1m",
+    "output_price_per_1m",
+    "valid_from",
+    "valid_to",
+    "timestamp",
+)
+
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
+def parquet_available() -> bool:
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def export_statement(model_name: Optional[str] = None, provider: Optional[str] = None,
+                     start: Optional[datetime] = None, end: Optional[datetime] = None):
+    """
+    Select the price_data rows overlapping [start, end], optionally for one model and provider.
+
+    Bounds are naive UTC, as stored. Rows are ordered along the
+    (normalized_id, provider, timestamp) index so the database can stream them
+    without sorting.
+    """
+    query = select(
+        PriceData.normalized_id,
+        PriceData.display_name.label("model"),
+        PriceData.provider,
+        PriceData.input_price_per_1m,
+        PriceData.output_price_per_1m,
+        PriceData.valid_from,
+        PriceData.valid_to,
+        PriceData.timestamp,
+    )
+    if model_name:
+        query = query.where(PriceData.normalized_id == normalize_model_name(model_name))
+    if provider:
+        query = query.where(func.lower(PriceData.provider) == provider.lower())
+    if start is not None:
+        query = query.where(PriceData.timestamp >= start)
+    if end is not None:
+        query = query.where(func.coalesce(PriceData.valid_from, PriceData.timestamp) <= end)
+    return query.order_by(PriceData.normalized_id, PriceData.provider, PriceData.timestamp)
+
+
+def _isoformat(value: Optional[datetime]) -> Optional[str]:
+    # Stored datetimes are naive UTC
+    return None if value is None else value.isoformat() + "Z"
+
+
+def encode_ndjson(rows: Sequence) -> bytes:
+    """
+    Encode a batch of export rows as newline-delimited JSON.
+
+    Examples:
+        >>> encode_ndjson([("gpt-4", "GPT-4", "OpenAI", 30.0, 60.0, None, None, datetime(2024, 1, 1))])
+        b'{"normalized_id":"gpt-4","model":"GPT-4","provider":"OpenAI","input_price_per_1m":30.0,"output_price_per_1m":60.0,"valid_from":null,"valid_to":null,"timestamp":"2024-01-01T00:00:00Z"}\\n'
+    """
+    return b"".join(
+        to_json({
+            **dict(zip(EXPORT_COLUMNS[:5], row[:5])),
+            "valid_from": _isoformat(row[5]),
+            "valid_to": _isoformat(row[6]),
+            "timestamp": _isoformat(row[7]),
+        }) + b"\n"
+        for row in rows
+    )
+
+
+def encode_csv(rows: Sequence, header: bool = False) -> bytes:
+    """
+    Encode a batch of export rows as CSV, with the header row if requested.
+
+    Examples:
+        >>> encode_csv([("gpt-4", "GPT-4", "OpenAI", 30.0, 60.0, None, None, datetime(2024, 1, 1))])
+        b'gpt-4,GPT-4,OpenAI,30.0,60.0,,,2024-01-01T00:00:00Z\\r\\n'
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(EXPORT_COLUMNS)
+    writer.writerows(
+        (*row[:5], _isoformat(row[5]) or "", _isoformat(row[6]) or "", _isoformat(row[7]) or "")
+        for row in rows
+    )
+    return buffer.getvalue().encode()
+
+
+class _ChunkSink:
+    """Write-only file object collecting what pyarrow writes until it is drained"""
+
+    def __init__(self):
+        self.closed = False
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+class ParquetEncoder:
+    """Encodes batches of export rows as one Parquet file, one row group per batch"""
+
+    def __init__(self):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self._pa = pa
+        timestamp = pa.timestamp("us", tz="UTC")
+        self.schema = pa.schema([
+            ("normalized_id", pa.string()),
+            ("model", pa.string()),
+            ("provider", pa.string()),
+            ("input_price_per_1m", pa.float64()),
+            ("output_price_per_1m", pa.float64()),
+            ("valid_from", timestamp),
+            ("valid_to", timestamp),
+            ("timestamp", timestamp),
+        ])
+        self._sink = _ChunkSink()
+        self._writer = pq.ParquetWriter(self._sink, self.schema)
+
+    def encode(self, rows: Sequence) -> bytes:
+        """Write a batch as a row group and return the bytes produced so far"""
+        columns = list(zip(*rows))
+        self._writer.write_table(self._pa.Table.from_arrays(
+            [self._pa.array(column, type=field.type) for column, field in zip(columns, self.schema)],
+            schema=self.schema,
+        ))
+        return self._sink.drain()
+
+    def finish(self) -> bytes:
+        """Close the file and return its remaining bytes, including the footer"""
+        self._writer.close()
+        return self._sink.drain()
+
+
+async def encode_export(batches: AsyncIterator[Sequence], export_format: str) -> AsyncIterator[bytes]:
+    """Encode an async stream of row batches in the requested format, one chunk per batch"""
+    if export_format == "parquet":
+        encoder = ParquetEncoder()
+        async for rows in batches:
+            yield encoder.encode(rows)
+        yield encoder.finish()
+        return
+
+    if export_format == "csv":
+        yield encode_csv([], header=True)
+    async for rows in batches:
+        yield encode_csv(rows) if export_format == "csv" else encode_ndjson(rows)
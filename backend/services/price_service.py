@@ -1,65 +1,447 @@
 import asyncio
-from datetime import datetime, timedelta, timezone
-from typing import List, Optional
-import cachetools
+import os
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import suppress
+from collections import namedtuple
+from datetime import datetime, time, timedelta, timezone
+from typing import AsyncIterator, Callable, Dict, List, Optional, Tuple
 import logging
 
-from models.price_data import PriceData
-from services.price_agent import PriceAgent
-from database import get_db, init_db
+from sqlalchemy import DateTime, and_, case, func, insert, literal, or_, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from models.price_data import ModelCatalog, PriceDailyRollup, PriceData
+from services.cost_estimator import PriceMatrix, estimate_costs
+from services.model_index import ModelIndex
+from services.price_store import PriceStore
+from services.price_stream import PriceStreamBroker
+from database import AsyncSessionLocal, async_engine, engine, get_db, init_db
+from services.leader import create_leader_election
+from services.price_events import PriceEventSubscriber, notify_statement, write_lock_statement
+from services.price_export import EXPORT_BATCH_ROWS, export_statement
 from utils import normalize_model_name
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
+REFRESH_INTERVAL_SECONDS = 1800  # 30 minutes
+REFRESH_WORKERS = int(os.getenv("REFRESH_WORKERS", "1"))
+REFRESH_TIMEOUT_SECONDS = float(os.getenv("REFRESH_TIMEOUT_SECONDS", "900"))
+# "in_process" scrapes in the leading API process; "worker" leaves scraping to `python -m worker` processes
+REFRESH_MODE = os.getenv("REFRESH_MODE", "in_process")
+# "interval" stores a row only when a price changes; "snapshot" stores every observation
+PRICE_HISTORY_MODE = os.getenv("PRICE_HISTORY_MODE", "interval")
+# Rows per bulk statement, well below PostgreSQL's 65535 bind parameter limit
+BULK_INSERT_BATCH_SIZE = 1000
+# History ranges longer than this many days are served from price_daily_rollup
+HISTORY_ROLLUP_MIN_DAYS = int(os.getenv("HISTORY_ROLLUP_MIN_DAYS", "90"))
+# Cap on the points one batch history request may return
+HISTORY_BATCH_MAX_POINTS = int(os.getenv("HISTORY_BATCH_MAX_POINTS", "50000"))
+# Prices last observed longer ago than this are not loaded into the store at startup
+WARM_START_MAX_AGE_SECONDS = float(os.getenv("WARM_START_MAX_AGE_SECONDS", str(7 * 24 * 3600)))
+
+def chunked(items: list, size: int):
+    """Yield successive slices of at most `size` items"""
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+def as_utc(value: datetime) -> datetime:
+    """Treat naive datetimes read back from the database as UTC"""
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+# Bucket widths for downsampled history, finest first; months vary in length,
+# so max_buckets counts them from their shortest
+HISTORY_RESOLUTIONS = {
+    "hour": timedelta(hours=1),
+    "day": timedelta(days=1),
+    "week": timedelta(weeks=1),
+    "month": timedelta(days=30),
+}
+# strftime formats for the SQLite bucket expression; weeks start on Monday like date_trunc
+_SQLITE_BUCKET_FORMATS = {
+    "hour": ("%Y-%m-%d %H:00:00",),
+    "day": ("%Y-%m-%d 00:00:00",),
+    "week": ("%Y-%m-%d 00:00:00", "weekday 0", "-6 days"),
+    "month": ("%Y-%m-01 00:00:00",),
+}
+
+def max_buckets(days: int, resolution: str) -> int:
+    """
+    Return the most buckets of `resolution` a window of `days` can touch, counting both partial ends.
+
+    Examples:
+        >>> max_buckets(1, "hour")
+        25
+        >>> max_buckets(365, "week")
+        54
+        >>> max_buckets(3650, "month")
+        132
+    """
+    if resolution == "month":
+        # Months are as short as 28 days
+        return days // 28 + 2
+    return -(-timedelta(days=days) // HISTORY_RESOLUTIONS[resolution]) + 1
+
+def choose_resolution(days: int, resolution: Optional[str] = None, max_points: Optional[int] = None) -> Optional[str]:
+    """
+    Pick the bucket resolution for a history request.
+
+    Returns the requested resolution, coarsened if needed so that the window
+    fits in `max_points` buckets, or None when neither was requested (raw
+    points). Raises ValueError if even monthly buckets don't fit.
+
+    Examples:
+        >>> choose_resolution(30)
+        >>> choose_resolution(30, max_points=1000)
+        'hour'
+        >>> choose_resolution(365, resolution="hour", max_points=100)
+        'week'
+        >>> choose_resolution(3650, max_points=10)
+        Traceback (most recent call last):
+        ...
+        ValueError: 3650 days need at least 132 monthly points, more than max_points=10
+    """
+    if resolution is None and max_points is None:
+        return None
+    names = list(HISTORY_RESOLUTIONS)
+    start = names.index(resolution) if resolution else 0
+    for name in names[start:]:
+        if max_points is None or max_buckets(days, name) <= max_points:
+            return name
+    raise ValueError(
+        f"{days} days need at least {max_buckets(days, names[-1])} monthly points, more than max_points={max_points}"
+    )
+
+def next_bucket(bucket: datetime, resolution: str) -> datetime:
+    """Return the start of the bucket following `bucket`"""
+    if resolution == "month":
+        if bucket.month == 12:
+            return bucket.replace(year=bucket.year + 1, month=1)
+        return bucket.replace(month=bucket.month + 1)
+    return bucket + HISTORY_RESOLUTIONS[resolution]
+
+def truncate_to_bucket(value: datetime, resolution: str) -> datetime:
+    """Return the start of the bucket containing `value`, matching the SQL bucket expression"""
+    value = value.replace(minute=0, second=0, microsecond=0)
+    if resolution == "hour":
+        return value
+    value = value.replace(hour=0)
+    if resolution == "week":
+        return value - timedelta(days=value.weekday())
+    if resolution == "month":
+        return value.replace(day=1)
+    return value
+
+# (normalized_id, provider) of one history series; a None provider stands for all providers
+SeriesKey = Tuple[str, Optional[str]]
+
+# One aggregated bucket of a provider's series, as consumed by PriceService._fill_buckets
+HistoryBucket = namedtuple("HistoryBucket", [
+    "bucket", "input_min", "input_max", "output_min", "output_max",
+    "first_start", "last_seen", "input_last", "output_last",
+])
+
+def _parse_db_datetime(value) -> datetime:
+    """Bucket expressions come back as datetimes on PostgreSQL and strings on SQLite"""
+    if isinstance(value, str):
+        return datetime.fromisoformat(value)
+    return value
+
+def _bucket_point(bucket: datetime, input_min: float, input_max: float, input_last: float,
+                  output_min: float, output_max: float, output_last: float) -> dict:
+    # The *_per_1m keys hold the bucket's last price so raw and bucketed series chart alike
+    return {
+        "timestamp": bucket.isoformat(),
+        "input_price_per_1m": input_last,
+        "output_price_per_1m": output_last,
+        "input_price_min": input_min,
+        "input_price_max": input_max,
+        "output_price_min": output_min,
+        "output_price_max": output_max,
+    }
+
 class PriceService:
     def __init__(self):
-        self.cache = cachetools.TTLCache(maxsize=100, ttl=1800)  # 30 minutes cache
-        self.agent = PriceAgent()
-        init_db()  # This will create the tables if they don't exist
-        try:
-            asyncio.create_task(self._periodic_refresh())
-        except RuntimeError:
-            logger.info("No event loop running, skipping periodic refresh task creation")
+        self.store = PriceStore()
+        # Pushes changed prices to /prices/stream subscribers
+        self.updates = PriceStreamBroker()
+        # Built by the first refresh: the scraping stack is only imported where refreshes run
+        self._agent = None
+        self.refresh_workers = REFRESH_WORKERS
+        self.refresh_timeout = REFRESH_TIMEOUT_SECONDS
+        self.refresh_mode = REFRESH_MODE
+        self.history_mode = PRICE_HISTORY_MODE
+        self.rollup_min_days = HISTORY_ROLLUP_MIN_DAYS
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._refresh_lock = asyncio.Lock()
+        self._refresh_task: Optional[asyncio.Task] = None
+        self._events_task: Optional[asyncio.Task] = None
+        # Ready to serve once prices were loaded from the database, or loading them was at least
+        # attempted; serving never waits for prices to be fresh
+        self.ready = False
+        # Bumped whenever the data behind current prices, models and providers changes
+        self.generation = 0
+        # Only the leader among all API processes scrapes; the others reload its results
+        self.leader = create_leader_election(engine)
+        # Current prices packed for cost estimates, rebuilt once per generation
+        self._price_matrix: Optional[PriceMatrix] = None
+        # Model identity and search index over the store, rebuilt once per generation
+        self._model_index: Optional[ModelIndex] = None
+        self._model_index_generation = -1
+        # Newest model_catalog generation this process has loaded into the store
+        self.catalog_generation = 0
+        self.events = PriceEventSubscriber(async_engine, self.reload_changed)
+
+    @property
+    def agent(self):
+        """The price agent, constructed on first use"""
+        if self._agent is None:
+            from services.price_agent import PriceAgent
+            self._agent = PriceAgent()
+        return self._agent
+
+    @agent.setter
+    def agent(self, agent):
+        self._agent = agent
+
+    async def start(self):
+        """Create the database tables if needed and start the periodic refresh task"""
+        await asyncio.to_thread(init_db)
+        self._refresh_task = asyncio.create_task(self._periodic_refresh())
 
     async def _periodic_refresh(self):
+        try:
+            if await self._run_blocking(self.warm_from_db):
+                self.get_model_index()
+                self.updates.publish(self.store.values())
+        except Exception as e:
+            logger.error(f"Loading prices from the database failed: {str(e)}")
+        finally:
+            # History and models are served from the database whether or not current prices loaded
+            self.ready = True
+        # Subscribe only after the warm start, which already loaded everything stored so far
+        self._events_task = asyncio.create_task(self.events.run())
+        delay = self._first_refresh_delay()
+        if delay > 0:
+            logger.info(f"Stored prices are fresh, first refresh in {delay:.0f} seconds")
+            await asyncio.sleep(delay)
         while True:
-            await self.refresh_prices()
-            await asyncio.sleep(1800)  # 30 minutes
+            try:
+                if self.refresh_mode != "worker" and await self._run_blocking(self.leader.try_acquire):
+                    await self.refresh_prices()
+                else:
+                    # Price events normally deliver the leader's or a worker's results well before this
+                    logger.info("Another process runs price refreshes, reloading changed prices")
+                    await self.reload_changed()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Keep the loop alive; the next interval gets another chance
+                logger.error(f"Periodic price refresh failed: {str(e)}")
+            await asyncio.sleep(REFRESH_INTERVAL_SECONDS)
 
-    async def refresh_prices(self):
-        """Refresh prices from all sources using the agent"""
-        prices = self.agent.fetch_prices()
-        self._update_cache(prices)
-        await self._store_historical_prices(prices)
+    @staticmethod
+    def _latest_prices_statement(dialect_name: str, since: Optional[datetime]):
+        """Select the latest row per (normalized_id, provider) observed since `since`, or ever if None.
 
-    def _update_cache(self, prices: List[PriceData]):
-        """Update the cache with new prices"""
-        for price in prices:
-            self.cache[price.normalized_id] = {
-                "model": price.display_name,
-                "provider": price.provider,
-                "input_price_per_1m": price.input_price_per_1m,
-                "output_price_per_1m": price.output_price_per_1m,
-                "last_updated": datetime.now(timezone.utc)
-            }
+        PostgreSQL uses DISTINCT ON; other databases rank rows with a window
+        function. Both walk the (normalized_id, provider, timestamp) index.
+        """
+        columns = (
+            PriceData.normalized_id,
+            PriceData.display_name,
+            PriceData.provider,
+            PriceData.input_price_per_1m,
+            PriceData.output_price_per_1m,
+            PriceData.timestamp,
+        )
+        filters = [PriceData.timestamp >= since] if since is not None else []
+        if dialect_name == "postgresql":
+            return select(*columns).where(*filters).distinct(
+                PriceData.normalized_id, PriceData.provider
+            ).order_by(PriceData.normalized_id, PriceData.provider, PriceData.timestamp.desc())
+
+        ranked = select(*columns, func.row_number().over(
+            partition_by=(PriceData.normalized_id, PriceData.provider),
+            order_by=PriceData.timestamp.desc(),
+        ).label("rank")).where(*filters).subquery()
+        return select(*(ranked.c[column.key] for column in columns)).where(ranked.c.rank == 1)
+
+    def warm_from_db(self) -> int:
+        """Load the latest stored price of every (model, provider) into the store.
+
+        Entries keep the time they were last observed, so they age into
+        staleness as usual. Prices older than WARM_START_MAX_AGE_SECONDS are
+        skipped, unless nothing newer is stored: after refreshes have failed
+        for that long, the latest prices are still loaded, reported as stale,
+        rather than none. Returns the number of prices loaded.
+        """
+        db = next(get_db())
+        try:
+            # Read first: rows written meanwhile are newer and get reloaded by the subscriber
+            catalog_generation = db.execute(select(func.coalesce(func.max(ModelCatalog.generation), 0))).scalar()
+            dialect_name = db.get_bind().dialect.name
+            since = datetime.now(timezone.utc) - timedelta(seconds=WARM_START_MAX_AGE_SECONDS)
+            rows = db.execute(self._latest_prices_statement(dialect_name, since.replace(tzinfo=None))).all()
+            if not rows:
+                rows = db.execute(self._latest_prices_statement(dialect_name, None)).all()
+                if rows:
+                    logger.warning(f"No prices observed within {WARM_START_MAX_AGE_SECONDS:.0f} seconds, "
+                                   f"loading the latest {len(rows)} stored prices as stale")
+        finally:
+            db.close()
+
+        for row in rows:
+            price = PriceData(row.display_name, row.provider, row.input_price_per_1m, row.output_price_per_1m)
+            self.store.upsert([price], observed_at=as_utc(row.timestamp))
+        self.catalog_generation = max(self.catalog_generation, catalog_generation)
+        if rows:
+            self.ready = True
+            self.generation += 1
+        logger.info(f"Loaded {len(rows)} stored prices into the price store")
+        return len(rows)
+
+    async def reload_changed(self) -> int:
+        """Load the model_catalog rows written by refreshes this process has not seen yet.
+
+        Called by the price event subscriber, so processes that do not refresh
+        serve the leader's prices. Returns the number of prices loaded.
+        """
+        db = AsyncSessionLocal()
+        try:
+            result = await db.execute(
+                select(ModelCatalog).where(ModelCatalog.generation > self.catalog_generation)
+            )
+            rows = result.scalars().all()
+        finally:
+            await db.close()
+        if not rows:
+            return 0
+
+        changed = []
+        for row in rows:
+            price = PriceData(row.display_name, row.provider, row.input_price_per_1m, row.output_price_per_1m)
+            changed.extend(self.store.upsert([price], observed_at=as_utc(row.last_updated)))
+        self.catalog_generation = max(self.catalog_generation, max(row.generation for row in rows))
+        self.ready = True
+        self.generation += 1
+        self.get_model_index()
+        if changed:
+            self.updates.publish(changed)
+        logger.info(f"Reloaded {len(rows)} prices up to catalog generation {self.catalog_generation}")
+        return len(rows)
+
+    def _first_refresh_delay(self) -> float:
+        """Seconds until the first refresh is due, judged by the newest price in the store"""
+        newest = max((entry["last_updated"] for entry in self.store.values()), default=None)
+        if newest is None:
+            return 0.0
+        age = (datetime.now(timezone.utc) - newest).total_seconds()
+        return max(0.0, REFRESH_INTERVAL_SECONDS - age)
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        """Return the refresh executor, creating it on first use (or after shutdown)"""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.refresh_workers,
+                thread_name_prefix="price-refresh",
+            )
+        return self._executor
+
+    async def _run_blocking(self, func: Callable, *args):
+        """Run a blocking callable on the refresh executor, bounded by the refresh timeout.
+
+        On timeout or cancellation the pending future is cancelled. A call that has
+        already started keeps running in its worker thread, but its result is discarded.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self._get_executor(), func, *args)
+        try:
+            return await asyncio.wait_for(future, timeout=self.refresh_timeout)
+        except asyncio.TimeoutError:
+            logger.error(f"Price refresh timed out after {self.refresh_timeout} seconds")
+            raise
+
+    async def refresh_prices(self) -> int:
+        """Refresh prices from all sources using the agent, returning the number of prices fetched.
+
+        The agent run blocks on HTTP fetches and the LLM, so it runs on the refresh
+        executor instead of the event loop. Concurrent calls are serialized.
+        """
+        async with self._refresh_lock:
+            # Through a lambda, so the first refresh also builds the agent, imports included, off the loop
+            prices = await self._run_blocking(lambda: self.agent.fetch_prices())
+            changed = self._update_store(prices)
+            logger.info(f"Refreshed {len(prices)} prices, {len(changed)} new or changed")
+            if len(self.store):
+                self.ready = True
+            await self._store_historical_prices(prices)
+            if prices:
+                self.generation += 1
+                # Build the model index now rather than on the first lookup
+                self.get_model_index()
+            # After the generation bump, so a subscriber's snapshot never predates the event id it carries
+            if changed:
+                self.updates.publish(changed)
+            return len(prices)
+
+    async def shutdown(self):
+        """Stop the refresh and price event tasks, give up leadership and release the refresh executor"""
+        for task in (self._refresh_task, self._events_task):
+            if task is not None:
+                task.cancel()
+                with suppress(asyncio.CancelledError):
+                    await task
+        self._refresh_task = self._events_task = None
+        # Hand leadership to another process right away instead of when this one exits
+        self.leader.release()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def _update_store(self, prices: List[PriceData]) -> List[dict]:
+        """Update the price store with new prices, returning the new or changed entries"""
+        return self.store.upsert(prices)
 
     async def _store_historical_prices(self, prices: List[PriceData]):
-        """Store historical price data in the database"""
+        """Store historical price data in the database, on the refresh executor.
+
+        The write is synchronous session I/O that grows with the number of
+        prices, so like the agent run it stays off the event loop.
+        """
+        generation = await self._run_blocking(self._write_historical_prices, prices)
+        # This process already holds these prices; don't reload its own writes
+        self.catalog_generation = max(self.catalog_generation, generation)
+
+    def _write_historical_prices(self, prices: List[PriceData]) -> int:
+        """Write a refresh to the history, rollup and catalog tables, returning its catalog generation.
+
+        The whole refresh is written with one observation timestamp and staged as
+        bulk statements rather than one ORM object per row. On PostgreSQL
+        concurrent writers (a manual refresh on another replica, say) are
+        serialized, so they neither both extend the same open interval nor
+        stamp the catalog with the same generation. Waiting for another
+        writer's lock happens here, on the refresh executor, never on the loop.
+        """
         db = next(get_db())
         try:
-            for price in prices:
-                # Create a new PriceData instance with the current timestamp
-                new_price = PriceData(
-                    model=price.display_name,  # Use display_name for the model parameter
-                    provider=price.provider,
-                    input_price_per_1m=price.input_price_per_1m,
-                    output_price_per_1m=price.output_price_per_1m
-                )
-                logger.info(f"Storing historical price for {new_price.display_name} (normalized: {new_price.normalized_id})")
-                db.add(new_price)
+            if db.get_bind().dialect.name == "postgresql":
+                db.execute(write_lock_statement())
+            observed_at = datetime.now(timezone.utc)
+            if self.history_mode == "snapshot":
+                written = self._store_snapshots(db, prices, observed_at)
+            else:
+                written = self._store_intervals(db, prices, observed_at)
+            self._update_daily_rollup(db, prices, observed_at)
+            generation = self._update_model_catalog(db, prices, observed_at)
+            if db.get_bind().dialect.name == "postgresql":
+                db.execute(notify_statement(generation))
             db.commit()
-            logger.info("Successfully stored historical prices")
+            logger.info(f"Successfully stored historical prices ({written} new rows for {len(prices)} prices)")
+            return generation
         except Exception as e:
             db.rollback()
             logger.error(f"Error storing historical prices: {str(e)}")
@@ -67,80 +449,621 @@ class PriceService:
         finally:
             db.close()
 
+    @staticmethod
+    def _price_row(price: PriceData, observed_at: datetime, valid_to: Optional[datetime]) -> dict:
+        display_name = price.display_name.strip()
+        provider = price.provider.strip()
+        return {
+            "id": PriceData.build_id(display_name, provider, observed_at),
+            "normalized_id": normalize_model_name(display_name),
+            "display_name": display_name,
+            "provider": provider,
+            "input_price_per_1m": price.input_price_per_1m,
+            "output_price_per_1m": price.output_price_per_1m,
+            "timestamp": observed_at,
+            "valid_from": observed_at,
+            "valid_to": valid_to,
+        }
+
+    @staticmethod
+    def _bulk_insert(db, rows: List[dict]):
+        """Insert rows in as few statements as the dialect allows.
+
+        PostgreSQL gets multi-row INSERT ... ON CONFLICT DO NOTHING statements;
+        other databases get a single executemany.
+        """
+        if not rows:
+            return
+        if db.get_bind().dialect.name == "postgresql":
+            for batch in chunked(rows, BULK_INSERT_BATCH_SIZE):
+                db.execute(pg_insert(PriceData).values(batch).on_conflict_do_nothing(index_elements=["id"]))
+        else:
+            db.execute(insert(PriceData), rows)
+
+    def _store_snapshots(self, db, prices: List[PriceData], observed_at: datetime) -> int:
+        """Store every observed price as its own point-in-time row"""
+        rows = {}
+        for price in prices:
+            row = self._price_row(price, observed_at, valid_to=observed_at)
+            rows[row["id"]] = row
+        self._bulk_insert(db, list(rows.values()))
+        return len(rows)
+
+    def _store_intervals(self, db, prices: List[PriceData], observed_at: datetime) -> int:
+        """Store prices as validity intervals, adding a row only when a price changes.
+
+        The current row of each (model, provider) has no valid_to; its timestamp
+        is moved forward to the latest observation. A changed price closes the
+        current row at observed_at and opens a new one.
+        """
+        latest: Dict[Tuple[str, str], PriceData] = {}
+        for price in prices:
+            latest[(price.normalized_id, price.provider)] = price
+        if not latest:
+            return 0
+
+        current = {}
+        normalized_ids = sorted({normalized_id for normalized_id, _ in latest})
+        for batch in chunked(normalized_ids, BULK_INSERT_BATCH_SIZE):
+            current_rows = db.query(
+                PriceData.id,
+                PriceData.normalized_id,
+                PriceData.provider,
+                PriceData.input_price_per_1m,
+                PriceData.output_price_per_1m,
+            ).filter(
+                PriceData.valid_to.is_(None),
+                PriceData.normalized_id.in_(batch),
+            )
+            for row in current_rows:
+                current[(row.normalized_id, row.provider)] = row
+
+        unchanged_ids, closed_ids, new_rows = [], [], []
+        for key, price in latest.items():
+            row = current.get(key)
+            if row is not None and row.input_price_per_1m == price.input_price_per_1m \
+                    and row.output_price_per_1m == price.output_price_per_1m:
+                unchanged_ids.append(row.id)
+                continue
+            if row is not None:
+                closed_ids.append(row.id)
+            new_rows.append(self._price_row(price, observed_at, valid_to=None))
+
+        for batch in chunked(unchanged_ids, BULK_INSERT_BATCH_SIZE):
+            db.execute(update(PriceData).where(PriceData.id.in_(batch)).values(timestamp=observed_at))
+        for batch in chunked(closed_ids, BULK_INSERT_BATCH_SIZE):
+            db.execute(update(PriceData).where(PriceData.id.in_(batch)).values(valid_to=observed_at))
+        self._bulk_insert(db, new_rows)
+        return len(new_rows)
+
+    @staticmethod
+    def _dialect_insert(db):
+        """Return the insert construct supporting ON CONFLICT for the session's database"""
+        if db.get_bind().dialect.name == "postgresql":
+            return pg_insert
+        return sqlite_insert
+
+    def _update_model_catalog(self, db, prices: List[PriceData], observed_at: datetime) -> int:
+        """Upsert the latest price of each (model, provider) into model_catalog.
+
+        Written rows are stamped with the next catalog generation, which is returned.
+        Under the write lock max + 1 is unique and increases with commit order.
+        """
+        generation = db.execute(select(func.coalesce(func.max(ModelCatalog.generation), 0))).scalar() + 1
+        rows = {}
+        for price in prices:
+            display_name = price.display_name.strip()
+            row = {
+                "normalized_id": normalize_model_name(display_name),
+                "provider": price.provider.strip(),
+                "display_name": display_name,
+                "input_price_per_1m": price.input_price_per_1m,
+                "output_price_per_1m": price.output_price_per_1m,
+                "first_seen": observed_at,
+                "last_updated": observed_at,
+                "generation": generation,
+            }
+            rows[(row["normalized_id"], row["provider"])] = row
+        if not rows:
+            return generation
+        # Executed with every row, like the rollup upsert, so it compiles once; on the
+        # table rather than the entity, which skips the ORM's per-row bulk insert bookkeeping
+        stmt = self._dialect_insert(db)(ModelCatalog.__table__)
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=["normalized_id", "provider"],
+            set_={
+                "display_name": stmt.excluded.display_name,
+                "input_price_per_1m": stmt.excluded.input_price_per_1m,
+                "output_price_per_1m": stmt.excluded.output_price_per_1m,
+                "last_updated": stmt.excluded.last_updated,
+                "generation": stmt.excluded.generation,
+            },
+        ), list(rows.values()))
+        return generation
+
+    def _update_daily_rollup(self, db, prices: List[PriceData], observed_at: datetime):
+        """Fold this refresh's observations into today's price_daily_rollup rows.
+
+        A new day starts with first = last = min = max = the observed price;
+        later observations widen min/max and replace last in one upsert.
+        """
+        rows = {}
+        day = observed_at.date()
+        for price in prices:
+            display_name = price.display_name.strip()
+            normalized_id, provider = normalize_model_name(display_name), price.provider.strip()
+            rows[(normalized_id, provider)] = {
+                "normalized_id": normalized_id,
+                "provider": provider,
+                "day": day,
+                "display_name": display_name,
+                "input_min": price.input_price_per_1m,
+                "input_max": price.input_price_per_1m,
+                "input_first": price.input_price_per_1m,
+                "input_last": price.input_price_per_1m,
+                "output_min": price.output_price_per_1m,
+                "output_max": price.output_price_per_1m,
+                "output_first": price.output_price_per_1m,
+                "output_last": price.output_price_per_1m,
+                "first_seen": observed_at,
+                "last_seen": observed_at,
+            }
+        if not rows:
+            return
+
+        dialect_insert = self._dialect_insert(db)
+        if db.get_bind().dialect.name == "postgresql":
+            least, greatest = func.least, func.greatest
+        else:
+            # SQLite's multi-argument min()/max() are its scalar least/greatest
+            least, greatest = func.min, func.max
+        table = PriceDailyRollup.__table__
+        stmt = dialect_insert(table)
+        excluded = stmt.excluded
+        # One statement executed with every row: compiled once (and cached) rather than once per VALUES
+        # batch, and on the table so the ORM's per-row bulk insert bookkeeping is skipped
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=["normalized_id", "provider", "day"],
+            set_={
+                "display_name": excluded.display_name,
+                "input_min": least(table.c.input_min, excluded.input_min),
+                "input_max": greatest(table.c.input_max, excluded.input_max),
+                "input_last": excluded.input_last,
+                "output_min": least(table.c.output_min, excluded.output_min),
+                "output_max": greatest(table.c.output_max, excluded.output_max),
+                "output_last": excluded.output_last,
+                "last_seen": excluded.last_seen,
+            },
+        ), list(rows.values()))
+
+    def get_metrics(self) -> dict:
+        """Get refresh pipeline, price store and price stream metrics"""
+        # No pipeline metrics before the first refresh has built the agent
+        agent_metrics = self._agent.get_metrics() if self._agent is not None else {}
+        return {**agent_metrics, "price_store": self.store.stats(), "price_stream": self.updates.stats()}
+
+    def get_price_matrix(self) -> PriceMatrix:
+        """Return the price matrix of current prices, rebuilding it when the generation changed"""
+        if self._price_matrix is None or self._price_matrix.generation != self.generation:
+            self._price_matrix = PriceMatrix.from_entries(self.generation, self.store.values())
+        return self._price_matrix
+
+    def get_cost_estimates(self, workloads: List[dict], top_k: int = 10) -> List[dict]:
+        """Rank the cheapest `top_k` (model, provider) pairs for each workload"""
+        return estimate_costs(self.get_price_matrix(), workloads, top_k)
+
     def get_all_prices(self) -> List[dict]:
-        """Get all current prices from cache"""
-        return list(self.cache.values())
+        """Get all current prices from the store"""
+        return self.store.values()
 
     def get_prices_by_provider(self, provider: str) -> List[dict]:
         """Get prices for a specific provider"""
-        return [price for price in self.cache.values() if price["provider"].lower() == provider.lower()]
+        return self.store.by_provider(provider)
+
+    def get_model_index(self) -> ModelIndex:
+        """Return the model index of current prices, rebuilding it when the generation changed"""
+        if self._model_index is None or self._model_index_generation != self.generation:
+            self._model_index = ModelIndex(self.store.models())
+            self._model_index_generation = self.generation
+        return self._model_index
+
+    def resolve_model(self, model_name: str) -> List[str]:
+        """Return the normalized_ids a model name refers to, or its plain normalization if none is current"""
+        return self.get_model_index().resolve(model_name) or [normalize_model_name(model_name)]
+
+    def search_models(self, query: str, limit: int = 10) -> List[dict]:
+        """Rank current models for an autocomplete query"""
+        return self.get_model_index().search(query, limit)
 
     def get_price_by_model(self, model_name: str) -> List[dict]:
-        """Get prices for a specific model from all providers"""
-        # Normalize the model name by replacing spaces with underscores and handling + characters
-        normalized_name = normalize_model_name(model_name)
-        
-        # Get all prices from cache that match the normalized model name
-        matching_prices = []
-        for price in self.cache.values():
-            if normalize_model_name(price["model"]) == normalized_name:
-                matching_prices.append(price)
-        
-        return matching_prices
-
-    def get_price_history(self, model_name: str, provider: Optional[str] = None, days: int = 30) -> List[dict]:
-        """Get historical price data for a specific model, optionally filtered by provider"""
-        db = next(get_db())
-        try:
-            end_date = datetime.now(timezone.utc)  # Use UTC time
-            start_date = end_date - timedelta(days=days)
-            
-            # Normalize the model name by replacing spaces with underscores and handling + characters
-            normalized_name = normalize_model_name(model_name)
-            
-            # Get current prices from cache for this model
-            current_prices = self.get_price_by_model(model_name)
-            
-            # If provider is specified, filter current prices
-            if provider:
-                current_prices = [p for p in current_prices if p["provider"].lower() == provider.lower()]
-            
-            # Get historical prices for each provider
-            historical_data = []
-            for current_price in current_prices:
-                provider_name = current_price["provider"]
-                
-                logger.info(f"Searching for historical prices for model: {model_name} from provider: {provider_name}")
-                logger.info(f"Normalized name: {normalized_name}")
-                logger.info(f"Time range: {start_date} to {end_date}")
-                
-                # Query historical prices for this model and provider
-                prices = db.query(PriceData).filter(
-                    PriceData.normalized_id == normalized_name,
-                    PriceData.provider == provider_name,
-                    PriceData.timestamp >= start_date,
-                    PriceData.timestamp <= end_date
-                ).order_by(PriceData.timestamp).all()
-                
-                logger.info(f"Found {len(prices)} historical prices for {model_name} from {provider_name}")
-                
-                historical_data.append({
-                    "model": model_name,
-                    "provider": provider_name,
-                    "prices": [{
-                        "input_price_per_1m": price.input_price_per_1m,
-                        "output_price_per_1m": price.output_price_per_1m,
-                        "timestamp": price.timestamp.isoformat()
-                    } for price in prices],
-                    "time_range": {
-                        "start": start_date.isoformat(),
-                        "end": end_date.isoformat()
-                    }
+        """Get prices for a specific model from all providers, matching any spelling of its identity"""
+        return [entry for model_id in self.resolve_model(model_name) for entry in self.store.by_model(model_id)]
+
+    @staticmethod
+    def _expand_to_points(rows: list, start_date: datetime, end_date: datetime) -> List[dict]:
+        """Expand stored rows into price points clipped to the time range.
+
+        Each row yields a point at its first observation and, for an interval,
+        another at its last observation, so a constant price spanning weeks is
+        two points instead of one per refresh.
+        """
+        points = []
+        for row in rows:
+            last_seen = as_utc(row.timestamp)
+            first_seen = as_utc(row.valid_from) if row.valid_from is not None else last_seen
+            timestamps = [max(first_seen, start_date)]
+            if min(last_seen, end_date) > timestamps[0]:
+                timestamps.append(min(last_seen, end_date))
+            for timestamp in timestamps:
+                points.append({
+                    "input_price_per_1m": row.input_price_per_1m,
+                    "output_price_per_1m": row.output_price_per_1m,
+                    "timestamp": timestamp.isoformat()
                 })
-            
-            return historical_data
+        return points
+
+    @staticmethod
+    def _series_filter(normalized_id_column, provider_column, series: List[SeriesKey]):
+        """SQL condition selecting the requested (normalized_id, provider) series; a None provider selects all"""
+        all_providers = sorted({normalized_id for normalized_id, provider in series if provider is None})
+        conditions = [normalized_id_column.in_(all_providers)] if all_providers else []
+        for normalized_id, provider in sorted({(n, p.lower()) for n, p in series if p is not None}):
+            if normalized_id not in all_providers:
+                conditions.append(and_(normalized_id_column == normalized_id, func.lower(provider_column) == provider))
+        return or_(*conditions)
+
+    @staticmethod
+    def _bucket_expression(dialect_name: str, column, resolution: str):
+        """SQL expression truncating `column` to the start of its bucket"""
+        if dialect_name == "postgresql":
+            return func.date_trunc(resolution, column)
+        fmt, *modifiers = _SQLITE_BUCKET_FORMATS[resolution]
+        return func.strftime(fmt, column, *modifiers)
+
+    async def _query_history_buckets(self, db, series: List[SeriesKey], start_date: datetime, end_date: datetime,
+                                     resolution: str) -> Dict[SeriesKey, list]:
+        """
+        Aggregate history into buckets in SQL, returning bucket rows per (normalized_id, provider).
+
+        Each row is bucketed by when its price took effect (clipped to the
+        range start) and carries the min/max input and output prices, the
+        first and last start in the bucket, and the price that took effect
+        last, joined back from the row with that start.
+        """
+        # Compare against naive UTC so both dialects bucket the stored values as-is
+        start_naive = start_date.replace(tzinfo=None)
+        end_naive = end_date.replace(tzinfo=None)
+        took_effect = func.coalesce(PriceData.valid_from, PriceData.timestamp)
+        clipped = case((took_effect < start_naive, literal(start_naive, DateTime())), else_=took_effect)
+        bucket = self._bucket_expression(db.bind.dialect.name, clipped, resolution)
+
+        filters = [
+            self._series_filter(PriceData.normalized_id, PriceData.provider, series),
+            PriceData.timestamp >= start_naive,
+            took_effect <= end_naive,
+        ]
+
+        buckets = select(
+            PriceData.normalized_id.label("normalized_id"),
+            PriceData.provider.label("provider"),
+            bucket.label("bucket"),
+            func.min(PriceData.input_price_per_1m).label("input_min"),
+            func.max(PriceData.input_price_per_1m).label("input_max"),
+            func.min(PriceData.output_price_per_1m).label("output_min"),
+            func.max(PriceData.output_price_per_1m).label("output_max"),
+            func.min(clipped).label("first_start"),
+            func.max(took_effect).label("last_start"),
+            func.max(PriceData.timestamp).label("last_seen"),
+        ).where(*filters).group_by(PriceData.normalized_id, PriceData.provider, bucket).subquery()
+
+        result = await db.execute(select(
+            buckets,
+            PriceData.input_price_per_1m.label("input_last"),
+            PriceData.output_price_per_1m.label("output_last"),
+        ).join(PriceData, and_(
+            PriceData.normalized_id == buckets.c.normalized_id,
+            PriceData.provider == buckets.c.provider,
+            took_effect == buckets.c.last_start,
+        )).order_by(buckets.c.normalized_id, buckets.c.provider, buckets.c.bucket))
+        rows = result.all()
+
+        rows_by_series: Dict[SeriesKey, list] = {}
+        for row in rows:
+            series_rows = rows_by_series.setdefault((row.normalized_id, row.provider), [])
+            # Two rows taking effect at the same instant join twice; keep one
+            if not series_rows or series_rows[-1].bucket != row.bucket:
+                series_rows.append(row)
+        return rows_by_series
+
+    @staticmethod
+    async def _query_rollup_buckets(db, series: List[SeriesKey], start_date: datetime, end_date: datetime,
+                                    resolution: str) -> Dict[SeriesKey, list]:
+        """
+        Read daily rollup rows for the range and merge them into buckets per (normalized_id, provider).
+
+        The rollup holds at most one row per provider and day, so coarsening
+        to weeks or months here stays cheap for any range.
+        """
+        query = select(PriceDailyRollup).where(
+            PriceService._series_filter(PriceDailyRollup.normalized_id, PriceDailyRollup.provider, series),
+            PriceDailyRollup.day >= start_date.date(),
+            PriceDailyRollup.day <= end_date.date(),
+        )
+        result = await db.execute(query.order_by(
+            PriceDailyRollup.normalized_id, PriceDailyRollup.provider, PriceDailyRollup.day
+        ))
+        rows = result.scalars().all()
+
+        rows_by_series: Dict[SeriesKey, list] = {}
+        for row in rows:
+            bucket = truncate_to_bucket(datetime.combine(row.day, time.min), resolution)
+            buckets = rows_by_series.setdefault((row.normalized_id, row.provider), [])
+            if buckets and buckets[-1].bucket == bucket:
+                merged = buckets[-1]
+                buckets[-1] = merged._replace(
+                    input_min=min(merged.input_min, row.input_min),
+                    input_max=max(merged.input_max, row.input_max),
+                    output_min=min(merged.output_min, row.output_min),
+                    output_max=max(merged.output_max, row.output_max),
+                    last_seen=row.last_seen,
+                    input_last=row.input_last,
+                    output_last=row.output_last,
+                )
+                continue
+            buckets.append(HistoryBucket(
+                bucket=bucket,
+                input_min=row.input_min,
+                input_max=row.input_max,
+                output_min=row.output_min,
+                output_max=row.output_max,
+                first_start=row.first_seen,
+                last_seen=row.last_seen,
+                input_last=row.input_last,
+                output_last=row.output_last,
+            ))
+        return rows_by_series
+
+    @staticmethod
+    def _fill_buckets(rows: list, end_date: datetime, resolution: str) -> List[dict]:
+        """
+        Turn bucket rows into a contiguous OHLC-style series.
+
+        Buckets without a price change repeat the price in effect, up to the
+        bucket of the series' last observation. A bucket whose first change
+        happens after the bucket start also spans the price carried in.
+        """
+        points = []
+        carried = None
+        for index, row in enumerate(rows):
+            bucket = as_utc(_parse_db_datetime(row.bucket))
+            input_min, input_max = row.input_min, row.input_max
+            output_min, output_max = row.output_min, row.output_max
+            if carried is not None and as_utc(_parse_db_datetime(row.first_start)) > bucket:
+                input_min, input_max = min(input_min, carried[0]), max(input_max, carried[0])
+                output_min, output_max = min(output_min, carried[1]), max(output_max, carried[1])
+            points.append(_bucket_point(bucket, input_min, input_max, row.input_last,
+                                        output_min, output_max, row.output_last))
+            carried = (row.input_last, row.output_last)
+
+            if index + 1 < len(rows):
+                fill_until = as_utc(_parse_db_datetime(rows[index + 1].bucket))
+            else:
+                last_seen = min(as_utc(_parse_db_datetime(row.last_seen)), end_date)
+                fill_until = next_bucket(truncate_to_bucket(last_seen, resolution), resolution)
+            bucket = next_bucket(bucket, resolution)
+            while bucket < fill_until:
+                points.append(_bucket_point(bucket, carried[0], carried[0], carried[0],
+                                            carried[1], carried[1], carried[1]))
+                bucket = next_bucket(bucket, resolution)
+        return points
+
+    async def _query_history(self, db, series: List[SeriesKey], start_date: datetime, end_date: datetime,
+                             bucket_resolution: Optional[str], use_rollup: bool) -> Dict[SeriesKey, list]:
+        """Fetch the rows of every requested series in one query, keyed by (normalized_id, provider)"""
+        if use_rollup:
+            return await self._query_rollup_buckets(db, series, start_date, end_date, bucket_resolution)
+        if bucket_resolution:
+            return await self._query_history_buckets(db, series, start_date, end_date, bucket_resolution)
+
+        # Query the rows (intervals or snapshots) overlapping the time range;
+        # timestamps are stored as naive UTC, which asyncpg requires for comparison
+        result = await db.execute(select(
+            PriceData.normalized_id,
+            PriceData.provider,
+            PriceData.input_price_per_1m,
+            PriceData.output_price_per_1m,
+            PriceData.timestamp,
+            PriceData.valid_from,
+        ).where(
+            self._series_filter(PriceData.normalized_id, PriceData.provider, series),
+            PriceData.timestamp >= start_date.replace(tzinfo=None),
+            func.coalesce(PriceData.valid_from, PriceData.timestamp) <= end_date.replace(tzinfo=None)
+        ).order_by(PriceData.normalized_id, PriceData.provider, PriceData.timestamp))
+        rows = result.all()
+        logger.info(f"Found {len(rows)} historical prices for {len(series)} series")
+
+        rows_by_series: Dict[SeriesKey, list] = {}
+        for row in rows:
+            rows_by_series.setdefault((row.normalized_id, row.provider), []).append(row)
+        return rows_by_series
+
+    @staticmethod
+    def _merge_series(series: List[list], bucket_resolution: Optional[str]) -> list:
+        """Merge the rows of several spellings of one model at one provider into one ordered series"""
+        rows = [row for rows in series for row in rows]
+        if not bucket_resolution:
+            return sorted(rows, key=lambda row: row.timestamp)
+        merged: List[HistoryBucket] = []
+        for row in sorted(rows, key=lambda row: (row.bucket, row.last_seen)):
+            bucket = HistoryBucket(*(getattr(row, field) for field in HistoryBucket._fields))
+            if merged and merged[-1].bucket == bucket.bucket:
+                previous = merged[-1]
+                bucket = bucket._replace(
+                    input_min=min(previous.input_min, bucket.input_min),
+                    input_max=max(previous.input_max, bucket.input_max),
+                    output_min=min(previous.output_min, bucket.output_min),
+                    output_max=max(previous.output_max, bucket.output_max),
+                    first_start=min(previous.first_start, bucket.first_start),
+                )
+                merged[-1] = bucket
+            else:
+                merged.append(bucket)
+        return merged
+
+    def _history_window(self, days: int, resolution: Optional[str], max_points: Optional[int]):
+        """Return the time range, bucket resolution and whether to read the daily rollup for a history request"""
+        end_date = datetime.now(timezone.utc)  # Use UTC time
+        start_date = end_date - timedelta(days=days)
+        bucket_resolution = choose_resolution(days, resolution, max_points)
+        use_rollup = days > self.rollup_min_days
+        if use_rollup and bucket_resolution in (None, "hour"):
+            bucket_resolution = choose_resolution(days, "day", max_points)
+        return start_date, end_date, bucket_resolution, use_rollup
+
+    def _model_histories(self, model_name: str, provider: Optional[str], rows_by_series: Dict[SeriesKey, list],
+                         start_date: datetime, end_date: datetime, bucket_resolution: Optional[str]) -> List[dict]:
+        """Build the per-provider history series of one requested model from fetched rows"""
+        model_ids = set(self.resolve_model(model_name))
+        provider_series: Dict[str, List[list]] = {}
+        for (normalized_id, provider_name), rows in rows_by_series.items():
+            if normalized_id in model_ids and (not provider or provider_name.lower() == provider.lower()):
+                provider_series.setdefault(provider_name, []).append(rows)
+        # Spellings of one model at one provider form one series
+        provider_rows = {
+            provider_name: series[0] if len(series) == 1 else self._merge_series(series, bucket_resolution)
+            for provider_name, series in provider_series.items()
+        }
+        # Providers currently serving the model are listed even without history in range
+        for current_price in self.get_price_by_model(model_name):
+            if not provider or current_price["provider"].lower() == provider.lower():
+                provider_rows.setdefault(current_price["provider"], [])
+
+        time_range = {
+            "start": start_date.isoformat(),
+            "end": end_date.isoformat()
+        }
+        if bucket_resolution:
+            time_range["resolution"] = bucket_resolution
+        return [{
+            "model": model_name,
+            "provider": provider_name,
+            "prices": self._fill_buckets(rows, end_date, bucket_resolution)
+            if bucket_resolution else self._expand_to_points(rows, start_date, end_date),
+            "time_range": time_range
+        } for provider_name, rows in provider_rows.items()]
+
+    async def get_price_history(self, model_name: str, provider: Optional[str] = None, days: int = 30,
+                                resolution: Optional[str] = None, max_points: Optional[int] = None) -> List[dict]:
+        """Get historical price data for a specific model, optionally filtered by provider.
+
+        Every provider's series is fetched in a single query ordered by
+        (provider, timestamp), served by the composite index, and grouped here.
+
+        With `resolution` or `max_points`, prices are aggregated per time
+        bucket in SQL instead and each point carries the min, max and last
+        input and output price of its bucket; `max_points` coarsens the
+        resolution until the range fits. Ranges longer than
+        `rollup_min_days` are always bucketed, at least by day, and read
+        from the daily rollup table.
+
+        Queries run on the async engine, so they don't block the event loop.
+        """
+        histories = await self.get_price_history_batch([(model_name, provider)], days, resolution, max_points)
+        return histories[model_name]
+
+    async def get_price_history_batch(self, series: List[Tuple[str, Optional[str]]], days: int = 30,
+                                      resolution: Optional[str] = None,
+                                      max_points: Optional[int] = None) -> Dict[str, List[dict]]:
+        """Get the history of several (model, optional provider) pairs over one window, keyed by model.
+
+        All pairs are answered by a single query, so a dashboard charting many
+        models costs one round trip instead of one per model. Bucketing and
+        `max_points` apply per series as in `get_price_history`.
+        """
+        db = AsyncSessionLocal()
+        try:
+            start_date, end_date, bucket_resolution, use_rollup = self._history_window(days, resolution, max_points)
+            keys = [
+                (model_id, provider) for model_name, provider in series for model_id in self.resolve_model(model_name)
+            ]
+
+            logger.info(f"Searching for historical prices of {len(keys)} series: {keys}")
+            logger.info(f"Time range: {start_date} to {end_date}, resolution: {bucket_resolution or 'raw'}{' from daily rollup' if use_rollup else ''}")
+
+            rows_by_series = await self._query_history(db, keys, start_date, end_date, bucket_resolution, use_rollup)
+
+            histories: Dict[str, List[dict]] = {}
+            for model_name, provider in series:
+                model_histories = histories.setdefault(model_name, [])
+                listed = {history["provider"] for history in model_histories}
+                model_histories.extend(
+                    history for history in self._model_histories(
+                        model_name, provider, rows_by_series, start_date, end_date, bucket_resolution
+                    ) if history["provider"] not in listed
+                )
+            return histories
         except Exception as e:
             logger.error(f"Error fetching price history: {str(e)}")
             raise
         finally:
-            db.close()           
\ No newline at end of file
+            await db.close()
+
+    async def estimate_history_points(self, series: List[Tuple[str, Optional[str]]], days: int = 30,
+                                      resolution: Optional[str] = None, max_points: Optional[int] = None) -> int:
+        """Return an upper bound on the points `get_price_history_batch` would return, without fetching them.
+
+        One aggregate query counts the stored rows of every requested series.
+        A raw series returns at most two points per interval row and one per
+        snapshot; a bucketed series at most one point per bucket in the window.
+        """
+        start_date, end_date, bucket_resolution, use_rollup = self._history_window(days, resolution, max_points)
+        keys = [(model_id, provider) for model_name, provider in series for model_id in self.resolve_model(model_name)]
+        if use_rollup:
+            table = PriceDailyRollup
+            filters = [PriceDailyRollup.day >= start_date.date(), PriceDailyRollup.day <= end_date.date()]
+            points = func.count()
+        else:
+            table = PriceData
+            took_effect = func.coalesce(PriceData.valid_from, PriceData.timestamp)
+            filters = [
+                PriceData.timestamp >= start_date.replace(tzinfo=None),
+                took_effect <= end_date.replace(tzinfo=None),
+            ]
+            points = func.count() + func.count(case((took_effect < PriceData.timestamp, 1)))
+
+        db = AsyncSessionLocal()
+        try:
+            result = await db.execute(
+                select(points)
+                .where(self._series_filter(table.normalized_id, table.provider, keys), *filters)
+                .group_by(table.normalized_id, table.provider)
+            )
+            series_points = result.scalars().all()
+        finally:
+            await db.close()
+
+        if bucket_resolution is None:
+            return sum(series_points)
+        return len(series_points) * max_buckets(days, bucket_resolution)
+
+    async def iter_price_data(self, model_name: Optional[str] = None, provider: Optional[str] = None,
+                              start: Optional[datetime] = None, end: Optional[datetime] = None,
+                              batch_size: int = EXPORT_BATCH_ROWS) -> AsyncIterator[list]:
+        """Yield stored price_data rows overlapping [start, end] in batches of `batch_size`.
+
+        Rows come from a server-side cursor, so memory use is bounded by one
+        batch however many rows match.
+        """
+        def naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+            if value is None or value.tzinfo is None:
+                return value
+            return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+        statement = export_statement(model_name, provider, naive_utc(start), naive_utc(end))
+        db = AsyncSessionLocal()
+        try:
+            result = await db.stream(statement.execution_options(yield_per=batch_size))
+            async for rows in result.partitions():
+                yield rows
+        finally:
+            await db.close()
@@ -0,0 +1,97 @@
+"""In-memory store of the current price of every model at every provider.
+
+Entries are keyed by (normalized_id, provider), so providers serving the same
+model no longer overwrite each other, and are indexed by model and by
+lower-cased provider so lookups cost O(k) in the number of matches instead of
+a scan. Nothing is evicted: an entry that a refresh has not confirmed for
+`stale_after_seconds` is reported as stale but keeps being served.
+"""
+
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from models.price_data import PriceData
+from utils import normalize_model_name
+
+PRICE_STALE_AFTER_SECONDS = float(os.getenv("PRICE_STALE_AFTER_SECONDS", "3600"))
+
+PriceKey = Tuple[str, str]
+
+
+class PriceStore:
+    def __init__(self, stale_after_seconds: float = PRICE_STALE_AFTER_SECONDS):
+        self.stale_after = timedelta(seconds=stale_after_seconds)
+        self._entries: Dict[PriceKey, dict] = {}
+        self._by_model: Dict[str, Dict[PriceKey, dict]] = {}
+        self._by_provider: Dict[str, Dict[PriceKey, dict]] = {}
+
+    def upsert(self, prices: Iterable[PriceData], observed_at: Optional[datetime] = None) -> List[dict]:
+        """
+        Record observed prices.
+
+        Every observed entry gets `last_updated = observed_at`.
+
+        Returns:
+            The entries that are new or whose input or output price changed
+        """
+        observed_at = observed_at or datetime.now(timezone.utc)
+        changed = []
+        for price in prices:
+            provider = price.provider.strip()
+            key = (price.normalized_id, provider)
+            entry = {
+                "model": price.display_name,
+                "provider": provider,
+                "input_price_per_1m": price.input_price_per_1m,
+                "output_price_per_1m": price.output_price_per_1m,
+                "last_updated": observed_at,
+            }
+            previous = self._entries.get(key)
+            if previous is None or (previous["input_price_per_1m"], previous["output_price_per_1m"]) \
+                    != (entry["input_price_per_1m"], entry["output_price_per_1m"]):
+                changed.append(entry)
+            self._entries[key] = entry
+            self._by_model.setdefault(key[0], {})[key] = entry
+            self._by_provider.setdefault(provider.lower(), {})[key] = entry
+        return changed
+
+    def get(self, model_name: str, provider: str) -> Optional[dict]:
+        """Return the entry for one model at one provider, if present"""
+        return self._entries.get((normalize_model_name(model_name), provider.strip()))
+
+    def by_model(self, model_name: str) -> List[dict]:
+        """Return the entries of a model at every provider"""
+        return list(self._by_model.get(normalize_model_name(model_name), {}).values())
+
+    def by_provider(self, provider: str) -> List[dict]:
+        """Return the entries of every model at a provider, matching the provider case-insensitively"""
+        return list(self._by_provider.get(provider.strip().lower(), {}).values())
+
+    def values(self) -> List[dict]:
+        return list(self._entries.values())
+
+    def models(self) -> Dict[str, List[dict]]:
+        """Return the entries of every model, keyed by normalized_id"""
+        return {model_id: list(entries.values()) for model_id, entries in self._by_model.items()}
+
+    def is_stale(self, entry: dict, now: Optional[datetime] = None) -> bool:
+        """Return True if no refresh has confirmed the entry within the staleness window"""
+        now = now or datetime.now(timezone.utc)
+        return now - entry["last_updated"] > self.stale_after
+
+    def stale_entries(self, now: Optional[datetime] = None) -> List[dict]:
+        now = now or datetime.now(timezone.utc)
+        return [entry for entry in self._entries.values() if self.is_stale(entry, now)]
+
+    def stats(self) -> dict:
+        """Return the number of entries, models, providers and stale entries"""
+        return {
+            "entries": len(self._entries),
+            "models": len(self._by_model),
+            "providers": len(self._by_provider),
+            "stale": len(self.stale_entries()),
+        }
+
+    def __len__(self) -> int:
+        return len(self._entries)
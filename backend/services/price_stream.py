@@ -0,0 +1,147 @@
+"""Server-Sent Events stream of price updates.
+
+Each subscriber gets a snapshot of all current prices on connect, then one
+`update` event per refresh carrying only the (model, provider) entries that
+are new or changed. Events are serialized once when published and kept in a
+bounded buffer, so a client reconnecting with `Last-Event-ID` receives what
+it missed, or a fresh snapshot if it fell behind the buffer.
+
+Event ids are `<epoch>-<n>`, where the epoch is random per broker. Numbering
+restarts with every process and differs between replicas, so an id from
+another epoch, after a restart or on reconnecting through a load balancer to
+another replica, says nothing about what the client missed and gets a
+snapshot instead of being compared against this broker's numbering.
+
+Idle subscribers cost one suspended generator each: they all wait on a single
+shared future that a publish resolves, instead of one queue per connection.
+"""
+
+import asyncio
+import os
+import secrets
+from collections import deque
+from typing import AsyncIterator, Callable, Deque, List, Optional, Tuple
+
+from pydantic_core import to_json
+
+PRICE_STREAM_BUFFER_EVENTS = int(os.getenv("PRICE_STREAM_BUFFER_EVENTS", "256"))
+PRICE_STREAM_HEARTBEAT_SECONDS = float(os.getenv("PRICE_STREAM_HEARTBEAT_SECONDS", "15"))
+
+# SSE comment sent on idle streams so proxies don't time them out
+KEEPALIVE = b": keepalive\n\n"
+
+
+def format_event(event_id: str, event: str, data: bytes) -> bytes:
+    """
+    Format one SSE message; `data` must be single-line JSON.
+
+    Examples:
+        >>> format_event("9f2c-3", "update", b'[]')
+        b'id: 9f2c-3\\nevent: update\\ndata: []\\n\\n'
+    """
+    return b"id: %s\nevent: %s\ndata: %s\n\n" % (event_id.encode(), event.encode(), data)
+
+
+def parse_event_id(value: Optional[str], epoch: str) -> Optional[int]:
+    """
+    Parse a Last-Event-ID header, ignoring values not issued in this epoch.
+
+    Examples:
+        >>> parse_event_id("9f2c-12", "9f2c")
+        12
+        >>> parse_event_id("7a01-12", "9f2c") is None
+        True
+        >>> parse_event_id("12", "9f2c") is None
+        True
+    """
+    if value is None:
+        return None
+    value_epoch, _, number = value.strip().rpartition("-")
+    if value_epoch != epoch:
+        return None
+    try:
+        event_id = int(number)
+    except ValueError:
+        return None
+    return event_id if event_id >= 0 else None
+
+
+class PriceStreamBroker:
+    def __init__(self, buffer_size: int = PRICE_STREAM_BUFFER_EVENTS,
+                 heartbeat_seconds: float = PRICE_STREAM_HEARTBEAT_SECONDS, epoch: Optional[str] = None):
+        self.heartbeat_seconds = heartbeat_seconds
+        self.epoch = epoch or secrets.token_hex(4)
+        self.last_id = 0
+        self.subscribers = 0
+        self.snapshots_sent = 0
+        self._events: Deque[Tuple[int, bytes]] = deque(maxlen=buffer_size)
+        self._published: Optional[asyncio.Future] = None
+
+    def publish(self, entries: List[dict]) -> int:
+        """Record an update event for changed price entries and wake every subscriber; returns its id"""
+        self.last_id += 1
+        self._events.append((self.last_id, format_event(self.event_id(self.last_id), "update", to_json(entries))))
+        if self._published is not None and not self._published.done():
+            self._published.set_result(None)
+        self._published = None
+        return self.last_id
+
+    def event_id(self, number: int) -> str:
+        """The SSE id of this broker's event `number`"""
+        return f"{self.epoch}-{number}"
+
+    def events_after(self, event_id: int) -> Optional[List[Tuple[int, bytes]]]:
+        """Return the buffered events newer than `event_id`, or None if some were already dropped"""
+        if event_id > self.last_id:
+            # Not issued by this broker
+            return None
+        if event_id == self.last_id:
+            return []
+        if not self._events or self._events[0][0] > event_id + 1:
+            return None
+        return [event for event in self._events if event[0] > event_id]
+
+    async def subscribe(self, snapshot: Callable[[], bytes], last_event_id: Optional[str] = None) -> AsyncIterator[bytes]:
+        """
+        Yield SSE messages for one client until it disconnects.
+
+        Args:
+            snapshot: Returns the JSON array of all current prices
+            last_event_id: The client's Last-Event-ID header when resuming
+        """
+        self.subscribers += 1
+        try:
+            cursor = parse_event_id(last_event_id, self.epoch)
+            if cursor is None:
+                cursor = -1
+            while True:
+                if cursor == self.last_id:
+                    loop = asyncio.get_running_loop()
+                    if self._published is None or self._published.get_loop() is not loop:
+                        self._published = loop.create_future()
+                    # asyncio.wait, unlike wait_for, leaves the shared future alone on timeout
+                    await asyncio.wait({self._published}, timeout=self.heartbeat_seconds)
+                    if cursor == self.last_id:
+                        yield KEEPALIVE
+                        continue
+
+                missed = self.events_after(cursor) if cursor >= 0 else None
+                if missed is None:
+                    cursor = self.last_id
+                    self.snapshots_sent += 1
+                    yield format_event(self.event_id(cursor), "snapshot", snapshot())
+                    continue
+                for event_id, message in missed:
+                    cursor = event_id
+                    yield message
+        finally:
+            self.subscribers -= 1
+
+    def stats(self) -> dict:
+        """Return the number of connected subscribers, the latest event id and snapshots sent"""
+        return {
+            "subscribers": self.subscribers,
+            "last_event_id": self.event_id(self.last_id),
+            "buffered_events": len(self._events),
+            "snapshots_sent": self.snapshots_sent,
+        }
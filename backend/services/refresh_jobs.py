@@ -0,0 +1,179 @@
+"""Database-backed queue of price refresh jobs and the worker that runs them.
+
+With REFRESH_MODE=worker, API processes never scrape: POST /refresh enqueues a
+row in refresh_jobs, and `python -m worker` processes claim queued jobs, run
+the price agent and store the results, which API processes pick up through
+price events. On PostgreSQL a claim selects the oldest claimable job with
+FOR UPDATE SKIP LOCKED, so concurrent workers never block on or share a job;
+on SQLite, which serializes writers, a compare-and-set UPDATE does the same.
+
+Jobs run one at a time across all workers: while a job is running within its
+lease, queued jobs stay queued. A claim is a lease rather than a held lock: a
+job whose worker died while running it becomes claimable again once
+REFRESH_JOB_LEASE_SECONDS have passed.
+The leader among the workers also enqueues a job whenever none was requested
+within the refresh interval.
+"""
+
+import asyncio
+import logging
+import os
+import socket
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from sqlalchemy import and_, exists, func, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models.price_data import RefreshJob
+from services.leader import REFRESH_LOCK_ID
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+# Idle workers check for queued jobs this often
+WORKER_POLL_SECONDS = float(os.getenv("WORKER_POLL_SECONDS", "5"))
+# A running job not finished within this long is presumed abandoned; longer than REFRESH_TIMEOUT_SECONDS
+REFRESH_JOB_LEASE_SECONDS = float(os.getenv("REFRESH_JOB_LEASE_SECONDS", "1200"))
+# Transaction advisory lock serializing claims on PostgreSQL; distinct from the leader lock
+REFRESH_CLAIM_LOCK_ID = REFRESH_LOCK_ID + 1
+
+
+def _utcnow() -> datetime:
+    # Stored datetimes are naive UTC
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def _claimable(now: datetime, lease_seconds: float):
+    expired = RefreshJob.started_at < now - timedelta(seconds=lease_seconds)
+    running = RefreshJob.__table__.alias("running")
+    # Another job still running within its lease holds back every other job
+    busy = exists().where(
+        running.c.status == RUNNING,
+        running.c.started_at >= now - timedelta(seconds=lease_seconds),
+    )
+    return and_(
+        or_(RefreshJob.status == QUEUED, and_(RefreshJob.status == RUNNING, expired)),
+        ~busy,
+    )
+
+
+async def enqueue_refresh(db: AsyncSession, requested_by: str = "api") -> int:
+    """Queue a refresh, or return the id of the one already waiting to run"""
+    queued = await db.execute(select(RefreshJob.id).where(RefreshJob.status == QUEUED).order_by(RefreshJob.id).limit(1))
+    job_id = queued.scalar()
+    if job_id is None:
+        job = RefreshJob(status=QUEUED, requested_by=requested_by, requested_at=_utcnow())
+        db.add(job)
+        await db.flush()
+        job_id = job.id
+        logger.info(f"Queued refresh job {job_id} requested by {requested_by}")
+    await db.commit()
+    return job_id
+
+
+async def schedule_refresh(db: AsyncSession, interval_seconds: float) -> Optional[int]:
+    """Queue a refresh if none was requested within the interval; returns the new job's id"""
+    latest = (await db.execute(select(func.max(RefreshJob.requested_at)))).scalar()
+    if latest is not None and latest > _utcnow() - timedelta(seconds=interval_seconds):
+        await db.rollback()
+        return None
+    return await enqueue_refresh(db, requested_by="schedule")
+
+
+async def claim_job(db: AsyncSession, worker: str, lease_seconds: float = REFRESH_JOB_LEASE_SECONDS) -> Optional[int]:
+    """
+    Claim the oldest queued or abandoned job for a worker.
+
+    Returns its id, or None if there is none or another job is still running.
+    """
+    now = _utcnow()
+    query = select(RefreshJob.id).where(_claimable(now, lease_seconds)).order_by(RefreshJob.id).limit(1)
+    if db.get_bind().dialect.name == "postgresql":
+        # Without it, two claims could each see no running job and both start one
+        await db.execute(select(func.pg_advisory_xact_lock(REFRESH_CLAIM_LOCK_ID)))
+        query = query.with_for_update(skip_locked=True)
+    job_id = (await db.execute(query)).scalar()
+    if job_id is None:
+        await db.rollback()
+        return None
+    # Conditional, so of two SQLite workers that selected the same job only one claims it
+    result = await db.execute(
+        update(RefreshJob)
+        .where(RefreshJob.id == job_id, _claimable(now, lease_seconds))
+        .values(status=RUNNING, started_at=now, worker=worker)
+    )
+    await db.commit()
+    return job_id if result.rowcount == 1 else None
+
+
+async def finish_job(db: AsyncSession, job_id: int, worker: str,
+                     price_count: Optional[int] = None, error: Optional[str] = None) -> bool:
+    """Record a job's outcome; returns False if the worker's lease was taken over meanwhile"""
+    result = await db.execute(
+        update(RefreshJob)
+        .where(RefreshJob.id == job_id, RefreshJob.worker == worker, RefreshJob.status == RUNNING)
+        .values(status=FAILED if error else DONE, finished_at=_utcnow(), price_count=price_count, error=error)
+    )
+    await db.commit()
+    return result.rowcount == 1
+
+
+async def get_job(db: AsyncSession, job_id: int) -> Optional[dict]:
+    job = await db.get(RefreshJob, job_id)
+    if job is None:
+        return None
+    return {column.name: getattr(job, column.name) for column in RefreshJob.__table__.columns}
+
+
+class RefreshWorker:
+    """Claims refresh jobs and runs them with a PriceService until cancelled"""
+
+    def __init__(self, service, session_factory, refresh_interval: float,
+                 poll_interval: float = WORKER_POLL_SECONDS, name: Optional[str] = None):
+        self.service = service
+        self.session_factory = session_factory
+        self.refresh_interval = refresh_interval
+        self.poll_interval = poll_interval
+        self.name = name or f"{socket.gethostname()}:{os.getpid()}"
+
+    async def run_once(self) -> Optional[int]:
+        """Schedule a periodic refresh if due and this worker leads, then run one claimed job; returns its id"""
+        if await asyncio.to_thread(self.service.leader.try_acquire):
+            async with self.session_factory() as db:
+                await schedule_refresh(db, self.refresh_interval)
+
+        async with self.session_factory() as db:
+            job_id = await claim_job(db, self.name)
+        if job_id is None:
+            return None
+
+        logger.info(f"Worker {self.name} running refresh job {job_id}")
+        price_count, error = None, None
+        try:
+            price_count = await self.service.refresh_prices()
+        except Exception as e:
+            logger.error(f"Refresh job {job_id} failed: {str(e)}")
+            error = str(e) or type(e).__name__
+        async with self.session_factory() as db:
+            if not await finish_job(db, job_id, self.name, price_count=price_count, error=error):
+                logger.warning(f"Refresh job {job_id} was taken over by another worker before it finished")
+        return job_id
+
+    async def run(self):
+        """Run jobs as they are queued; a job interrupted by cancellation is retried once its lease expires"""
+        logger.info(f"Refresh worker {self.name} started")
+        while True:
+            try:
+                if await self.run_once() is not None:
+                    continue
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Database unavailable and the like; keep polling
+                logger.error(f"Refresh worker iteration failed: {str(e)}")
+            await asyncio.sleep(self.poll_interval)
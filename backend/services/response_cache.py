@@ -0,0 +1,106 @@
+"""Cache of serialized API responses, valid for one data generation.
+
+Current prices, models and providers only change when a refresh commits, so
+their JSON is serialized once per generation and served as bytes. Each entry
+carries a strong ETag so clients can revalidate with `If-None-Match` and get a
+304, and large bodies are stored gzipped as well for clients that accept it.
+"""
+
+import gzip
+import hashlib
+import os
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+from fastapi import Request, Response
+from pydantic import TypeAdapter
+
+RESPONSE_GZIP_MIN_BYTES = int(os.getenv("RESPONSE_GZIP_MIN_BYTES", "1024"))
+
+
+@dataclass
+class CachedResponse:
+    generation: int
+    body: bytes
+    etag: str
+    gzipped: Optional[bytes] = None
+
+    @property
+    def gzip_etag(self) -> str:
+        # A distinct strong ETag per encoding, since the bytes differ
+        return self.etag[:-1] + '-gzip"'
+
+
+def etag_matches(if_none_match: Optional[str], *etags: str) -> bool:
+    """
+    Return True if an If-None-Match header matches any of the given ETags.
+
+    Examples:
+        >>> etag_matches('"abc", W/"def"', '"def"')
+        True
+        >>> etag_matches('*', '"abc"')
+        True
+        >>> etag_matches(None, '"abc"')
+        False
+    """
+    if not if_none_match:
+        return False
+    candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return "*" in candidates or any(etag in candidates for etag in etags)
+
+
+class ResponseCache:
+    def __init__(self, gzip_min_bytes: int = RESPONSE_GZIP_MIN_BYTES):
+        self.gzip_min_bytes = gzip_min_bytes
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self._entries: Dict[str, CachedResponse] = {}
+
+    def get(self, key: str, generation: int) -> Optional[CachedResponse]:
+        """Return the entry for a key if it was built for the current generation"""
+        entry = self._entries.get(key)
+        if entry is None or entry.generation != generation:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry
+
+    def put(self, key: str, generation: int, adapter: TypeAdapter, payload: Any) -> CachedResponse:
+        """Validate and serialize a payload with its response model's adapter and store it for a generation"""
+        body = adapter.dump_json(adapter.validate_python(payload))
+        entry = CachedResponse(
+            generation=generation,
+            body=body,
+            etag=f'"{hashlib.sha256(body).hexdigest()[:32]}"',
+        )
+        if len(body) >= self.gzip_min_bytes:
+            entry.gzipped = gzip.compress(body, compresslevel=9, mtime=0)
+        self._entries[key] = entry
+        return entry
+
+    def respond(self, request: Request, entry: CachedResponse) -> Response:
+        """Build the response for a cached entry: 304, gzipped or plain JSON"""
+        use_gzip = entry.gzipped is not None and "gzip" in request.headers.get("accept-encoding", "")
+        etag = entry.gzip_etag if use_gzip else entry.etag
+        headers = {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+
+        if etag_matches(request.headers.get("if-none-match"), entry.etag, entry.gzip_etag):
+            self.not_modified += 1
+            return Response(status_code=304, headers=headers)
+        if use_gzip:
+            headers["Content-Encoding"] = "gzip"
+            return Response(entry.gzipped, media_type="application/json", headers=headers)
+        return Response(entry.body, media_type="application/json", headers=headers)
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        """Return hit/miss/304 counters and the number of cached responses"""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "not_modified": self.not_modified,
+            "entries": len(self._entries),
+        }
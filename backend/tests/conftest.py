@@ -2,22 +2,60 @@
 
 import os
 import pytest
-from unittest.mock import Mock
+from unittest.mock import AsyncMock, Mock, patch
 from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
 
 os.environ["SQLALCHEMY_DATABASE_URL"] = "sqlite:///:memory:"
 os.environ["OPENAI_API_KEY"] = "test-api-key-for-testing"
+os.environ["EXTRACTION_CACHE_PATH"] = ":memory:"
 
-from main import app
+from main import app, price_service, response_cache
+from models.price_data import Base
 
 
 @pytest.fixture
 def client():
     """Create a test client for the FastAPI app."""
-    with TestClient(app) as client:
+    response_cache.clear()
+    # The lifespan creates the tables; tests drive refreshes themselves instead of scraping
+    with patch.object(price_service, '_periodic_refresh', AsyncMock()), TestClient(app) as client:
         yield client
 
 
+@pytest.fixture
+def test_db(tmp_path):
+    """Create an isolated SQLite database and point PriceService at it.
+
+    The database is a temporary file so that the sync engine used for writes
+    and the async engine used for history reads see the same data. Yields a
+    session factory bound to the test database; the async engine is available
+    as its `async_engine` attribute.
+    """
+    path = tmp_path / "test.db"
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    # NullPool: aiosqlite connections are bound to the event loop of the test that opened them
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{path}", poolclass=NullPool)
+    TestingSessionLocal.async_engine = async_engine
+
+    def override_get_db():
+        db = TestingSessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    with patch('services.price_service.get_db', override_get_db), \
+         patch('services.price_service.AsyncSessionLocal', async_sessionmaker(async_engine, expire_on_commit=False)):
+        yield TestingSessionLocal
+    engine.dispose()
+
+
 @pytest.fixture
 def mock_price_agent():
     """Mock PriceAgent for testing."""
@@ -1,7 +1,14 @@
 """Tests for API endpoints."""
 
-from unittest.mock import patch, Mock
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
 
+import httpx
+import pytest
+from unittest.mock import patch, Mock, AsyncMock
+
+from models.price_data import PriceData
 
 
 class TestAPIEndpoints:
@@ -40,6 +47,34 @@ class TestAPIEndpoints:
             assert len(data) == 1
             assert data[0]["model"] == "GPT-4"
     
+    def test_get_all_prices_etag(self, client):
+        """Test that /prices is served from the response cache with ETag revalidation."""
+        from main import price_service
+
+        with patch('main.price_service.get_all_prices') as mock_get_prices:
+            mock_get_prices.return_value = []
+            first = client.get("/prices")
+            etag = first.headers["etag"]
+
+            second = client.get("/prices")
+            revalidated = client.get("/prices", headers={"If-None-Match": etag})
+
+            assert second.json() == first.json()
+            assert revalidated.status_code == 304
+            assert mock_get_prices.call_count == 1
+
+            mock_get_prices.return_value = [{
+                "model": "GPT-4",
+                "provider": "OpenAI",
+                "input_price_per_1m": 30.0,
+                "output_price_per_1m": 60.0,
+                "last_updated": "2024-01-01T00:00:00Z"
+            }]
+            with patch.object(price_service, 'generation', price_service.generation + 1):
+                after_refresh = client.get("/prices", headers={"If-None-Match": etag})
+            assert after_refresh.status_code == 200
+            assert mock_get_prices.call_count == 2
+
     def test_get_prices_by_provider(self, client):
         """Test getting prices by provider."""
         with patch('main.price_service.get_prices_by_provider') as mock_get_prices:
@@ -85,7 +120,7 @@ class TestAPIEndpoints:
     
     def test_get_price_history(self, client):
         """Test getting price history."""
-        with patch('main.price_service.get_price_history') as mock_get_history:
+        with patch('main.price_service.get_price_history', new_callable=AsyncMock) as mock_get_history:
             mock_get_history.return_value = [{
                 "model": "GPT-4",
                 "provider": "OpenAI",
@@ -106,15 +141,84 @@ class TestAPIEndpoints:
             assert len(data) == 1
             assert data[0]["model"] == "GPT-4"
     
+    def test_get_price_history_batch(self, client):
+        """Test getting the history of several models in one request."""
+        with patch('main.price_service.get_price_history_batch', new_callable=AsyncMock) as mock_get_history, \
+             patch('main.price_service.estimate_history_points', new_callable=AsyncMock, return_value=8):
+            mock_get_history.return_value = {"GPT-4": [{
+                "model": "GPT-4",
+                "provider": "OpenAI",
+                "prices": [{"timestamp": "2024-01-01T00:00:00Z", "input_price_per_1m": 30.0, "output_price_per_1m": 60.0}],
+                "time_range": {"start": "2023-12-25T00:00:00Z", "end": "2024-01-01T00:00:00Z"}
+            }], "Claude 3": []}
+
+            response = client.post("/prices/history/batch", json={
+                "series": [{"model": "GPT-4", "provider": "OpenAI"}, {"model": "Claude 3"}],
+                "days": 7,
+                "resolution": "day",
+            })
+
+            assert response.status_code == 200
+            assert response.json()["GPT-4"][0]["prices"][0]["input_price_per_1m"] == 30.0
+            assert response.json()["Claude 3"] == []
+            mock_get_history.assert_called_once_with(
+                [("GPT-4", "OpenAI"), ("Claude 3", None)], 7, resolution="day", max_points=None
+            )
+
+    def test_get_price_history_batch_point_cap(self, client):
+        """Test that a batch estimated to return more points than the cap is rejected before it is fetched."""
+        with patch('main.price_service.get_price_history_batch', new_callable=AsyncMock) as mock_get_history, \
+             patch('main.price_service.estimate_history_points', new_callable=AsyncMock, return_value=4) as mock_estimate, \
+             patch('main.HISTORY_BATCH_MAX_POINTS', 3):
+            response = client.post("/prices/history/batch", json={"series": [{"model": "GPT-4"}, {"model": "GPT-4o"}]})
+
+            assert response.status_code == 413
+            assert "up to 4 price points" in response.json()["detail"]
+            mock_estimate.assert_awaited_once_with([("GPT-4", None), ("GPT-4o", None)], 30, resolution=None, max_points=None)
+            mock_get_history.assert_not_awaited()
+
+    def test_get_price_history_max_points_too_small(self, client):
+        """Test that a window that can't fit in max_points is a 400 on both history endpoints."""
+        with patch('main.price_service.get_price_history', new_callable=AsyncMock) as mock_get_history, \
+             patch('main.price_service.get_price_history_batch', new_callable=AsyncMock) as mock_get_batch:
+            response = client.get("/prices/history/GPT-4?days=3650&max_points=10")
+            assert response.status_code == 400
+            assert "max_points=10" in response.json()["detail"]
+
+            response = client.post("/prices/history/batch", json={"series": [{"model": "GPT-4"}], "days": 3650, "max_points": 10})
+            assert response.status_code == 400
+            mock_get_history.assert_not_awaited()
+            mock_get_batch.assert_not_awaited()
+
+    def test_get_price_history_batch_requires_series(self, client):
+        """Test that an empty batch is rejected."""
+        response = client.post("/prices/history/batch", json={"series": []})
+        assert response.status_code == 422
+
     def test_get_price_history_with_parameters(self, client):
         """Test getting price history with provider and days parameters."""
-        with patch('main.price_service.get_price_history') as mock_get_history:
+        with patch('main.price_service.get_price_history', new_callable=AsyncMock) as mock_get_history:
             mock_get_history.return_value = []
             
             response = client.get("/prices/history/GPT-4?provider=OpenAI&days=7")
             assert response.status_code == 200
             
-            mock_get_history.assert_called_once_with("GPT-4", "OpenAI", 7)
+            mock_get_history.assert_called_once_with("GPT-4", "OpenAI", 7, resolution=None, max_points=None)
+
+    def test_get_price_history_with_resolution(self, client):
+        """Test that resolution and max_points are passed through to the service."""
+        with patch('main.price_service.get_price_history', new_callable=AsyncMock) as mock_get_history:
+            mock_get_history.return_value = []
+
+            response = client.get("/prices/history/GPT-4?days=365&resolution=day&max_points=100")
+            assert response.status_code == 200
+
+            mock_get_history.assert_called_once_with("GPT-4", None, 365, resolution="day", max_points=100)
+
+    def test_get_price_history_invalid_resolution(self, client):
+        """Test that unknown resolutions and non-positive max_points are rejected."""
+        assert client.get("/prices/history/GPT-4?resolution=second").status_code == 422
+        assert client.get("/prices/history/GPT-4?max_points=0").status_code == 422
     
     def test_refresh_prices(self, client):
         """Test the refresh prices endpoint."""
@@ -126,24 +230,237 @@ class TestAPIEndpoints:
             response = client.post("/refresh")
             assert response.status_code == 200
             assert response.json() == {"message": "Prices refreshed successfully"}
+
+    def test_refresh_queues_job_in_worker_mode(self, client, test_db):
+        """Test that in worker mode /refresh queues a job instead of scraping in the API process."""
+        from sqlalchemy.ext.asyncio import async_sessionmaker
+        from database import get_async_db
+        from main import app, price_service
+
+        AsyncTestingSessionLocal = async_sessionmaker(test_db.async_engine)
+
+        async def override_get_async_db():
+            async with AsyncTestingSessionLocal() as session:
+                yield session
+
+        app.dependency_overrides[get_async_db] = override_get_async_db
+        try:
+            with patch.object(price_service, 'refresh_mode', "worker"), \
+                 patch.object(price_service, 'refresh_prices') as mock_refresh:
+                response = client.post("/refresh")
+                again = client.post("/refresh")
+
+            assert response.status_code == 202
+            assert again.json()["job_id"] == response.json()["job_id"]
+            mock_refresh.assert_not_called()
+
+            job = client.get(f"/refresh/jobs/{response.json()['job_id']}")
+            assert job.status_code == 200
+            assert job.json()["status"] == "queued"
+            assert job.json()["requested_by"] == "api"
+            assert client.get("/refresh/jobs/999").status_code == 404
+        finally:
+            app.dependency_overrides.clear()
+    
+    def test_ready_before_prices_loaded(self, client):
+        """Test that readiness fails until loading stored prices was attempted."""
+        with patch('main.price_service.ready', False):
+            response = client.get("/ready")
+            assert response.status_code == 503
+
+    def test_ready_after_prices_loaded(self, client):
+        """Test that readiness succeeds once stored prices were loaded, whether or not they are fresh."""
+        from services.price_store import PriceStore
+
+        store = PriceStore()
+        store.upsert([PriceData("GPT-4", "OpenAI", 30.0, 60.0)], observed_at=datetime.now(timezone.utc) - timedelta(days=30))
+        with patch('main.price_service.ready', True), patch('main.price_service.store', store):
+            response = client.get("/ready")
+            assert response.status_code == 200
+            assert response.json() == {"status": "ready", "prices": 1, "stale": 1}
+
+    def test_ready_requires_database(self, client):
+        """Test that readiness fails while the database is unreachable."""
+        from database import get_async_db
+        from main import app
+
+        async def broken_db():
+            db = Mock()
+            db.execute = AsyncMock(side_effect=ConnectionError("connection refused"))
+            yield db
+
+        app.dependency_overrides[get_async_db] = broken_db
+        try:
+            with patch('main.price_service.ready', True):
+                response = client.get("/ready")
+            assert response.status_code == 503
+            assert "Database unavailable" in response.json()["detail"]
+        finally:
+            app.dependency_overrides.clear()
+
+    @pytest.mark.asyncio
+    async def test_price_stream(self):
+        """Test that the price stream opens with a snapshot of current prices as Server-Sent Events."""
+        from main import price_service, response_cache, stream_prices
+
+        response_cache.clear()
+        with patch.object(price_service, 'get_all_prices', return_value=[{
+            "model": "GPT-4",
+            "provider": "OpenAI",
+            "input_price_per_1m": 30.0,
+            "output_price_per_1m": 60.0,
+            "last_updated": "2024-01-01T00:00:00Z"
+        }]):
+            response = await stream_prices(last_event_id=None)
+            message = await anext(response.body_iterator)
+        await response.body_iterator.aclose()
+
+        assert response.media_type == "text/event-stream"
+        assert response.headers["cache-control"] == "no-cache"
+        assert message.startswith(b"id: ")
+        assert b"event: snapshot\ndata: [{\"model\":\"GPT-4\"" in message
+
+    async def test_export_prices(self, test_db):
+        """Test streaming the price history as CSV."""
+        from main import app
+
+        db = test_db()
+        db.add(PriceData("GPT-4", "OpenAI", 30.0, 60.0, timestamp=datetime(2024, 1, 1)))
+        db.commit()
+        db.close()
+
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as ac:
+            response = await ac.get("/prices/export", params={"format": "csv", "model": "gpt-4"})
+
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/csv")
+        assert 'filename="price_history.csv"' in response.headers["content-disposition"]
+        lines = response.text.splitlines()
+        assert lines[0].startswith("normalized_id,model,provider")
+        assert lines[1].startswith("gpt-4,GPT-4,OpenAI,30.0,60.0")
+
+    def test_export_parquet_without_pyarrow(self, client):
+        """Test that Parquet export reports the missing optional dependency."""
+        with patch('main.parquet_available', return_value=False):
+            response = client.get("/prices/export?format=parquet")
+        assert response.status_code == 501
+
+    def test_cost_estimate(self, client):
+        """Test ranking current prices for several workloads."""
+        from main import price_service
+
+        with patch.object(price_service.store, 'values', return_value=[
+            {"model": "GPT-4", "provider": "OpenAI", "input_price_per_1m": 30.0, "output_price_per_1m": 60.0},
+            {"model": "Claude 3 Haiku", "provider": "Anthropic", "input_price_per_1m": 0.25, "output_price_per_1m": 1.25},
+        ]), patch.object(price_service, '_price_matrix', None):
+            response = client.post("/cost/estimate", json={
+                "workloads": [
+                    {"name": "chat", "input_tokens": 2000, "output_tokens": 500, "requests_per_day": 10000},
+                    {"input_tokens": 1000000, "output_tokens": 0},
+                ],
+                "top_k": 1,
+            })
+
+        assert response.status_code == 200
+        chat, bulk = response.json()
+        assert chat["workload"]["name"] == "chat"
+        assert chat["estimates"] == [{
+            "rank": 1, "model": "Claude 3 Haiku", "provider": "Anthropic", "cost_per_request": 0.001125,
+            "daily_cost": 11.25, "monthly_cost": 337.5,
+        }]
+        assert bulk["estimates"][0]["cost_per_request"] == 0.25
+        assert bulk["estimates"][0]["daily_cost"] is None
+
+    def test_cost_estimate_validation(self, client):
+        """Test that negative token counts and oversized top_k are rejected."""
+        assert client.post("/cost/estimate", json={"workloads": [{"input_tokens": -1, "output_tokens": 0}]}).status_code == 422
+        assert client.post("/cost/estimate", json={
+            "workloads": [{"input_tokens": 1, "output_tokens": 1}], "top_k": 1000
+        }).status_code == 422
+
+    def test_get_metrics(self, client):
+        """Test the refresh pipeline metrics endpoint."""
+        with patch('main.price_service.get_metrics') as mock_get_metrics:
+            mock_get_metrics.return_value = {
+                "extraction_paths": {"extractor": 1, "llm": 1, "unchanged": 0},
+                "providers": {"Anthropic": {"path": "extractor", "price_count": 3, "duration_ms": 4.2}},
+            }
+
+            response = client.get("/metrics")
+            assert response.status_code == 200
+            assert response.json()["providers"]["Anthropic"]["path"] == "extractor"
     
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("cold_agent", [False, True])
+    async def test_prices_latency_during_slow_refresh(self, test_db, cold_agent):
+        """Test that /prices stays responsive while a slow refresh runs and writes its history.
+
+        The refresh fetches 2000 prices and stores them through the real write
+        path on SQLite; the cold case also builds the agent on the first refresh.
+        """
+        from main import app, price_service
+        from services.price_store import PriceStore
+
+        prices = [PriceData(f"Model {i}", f"Provider {i % 20}", 1.0 + i, 2.0 + i) for i in range(2000)]
+
+        def slow_fetch_prices():
+            time.sleep(0.2)
+            return prices
+
+        def slow_agent():
+            # Stands in for importing the scraping stack and building the agent
+            time.sleep(0.5)
+            return Mock(fetch_prices=Mock(side_effect=slow_fetch_prices))
+
+        transport = httpx.ASGITransport(app=app)
+        with patch.object(price_service, '_agent', None if cold_agent else Mock(fetch_prices=Mock(side_effect=slow_fetch_prices))), \
+             patch('services.price_agent.PriceAgent', side_effect=slow_agent), \
+             patch.object(price_service, 'store', PriceStore()), \
+             patch.object(price_service, 'history_mode', "interval"):
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as ac:
+                refresh = asyncio.create_task(ac.post("/refresh"))
+
+                # Sample for the whole refresh, fetch and write alike
+                latencies = []
+                while not refresh.done() or len(latencies) < 100:
+                    start = time.perf_counter()
+                    # Let the refresh run its share of the loop first; any time it blocks the loop counts against the request
+                    await asyncio.sleep(0)
+                    response = await ac.get("/prices")
+                    latencies.append(time.perf_counter() - start)
+                    assert response.status_code == 200
+
+                refresh_response = await refresh
+                assert refresh_response.status_code == 200
+
+        db = test_db()
+        try:
+            assert db.query(PriceData).count() == len(prices)
+        finally:
+            db.close()
+        p99 = sorted(latencies)[int(len(latencies) * 0.99) - 1]
+        assert p99 < 0.1
+        # Not even one request waited for the agent to be built or the history to be written
+        assert max(latencies) < 0.25
+
     def test_get_all_models(self, client):
         """Test getting all models from database."""
-        from database import get_db
+        from database import get_async_db
         from main import app
         
-        def mock_get_db():
+        async def mock_get_async_db():
             mock_db = Mock()
             mock_result = Mock()
             mock_result.normalized_id = "gpt-4"
             mock_result.display_name = "GPT-4"
             mock_result.provider = "OpenAI"
-            mock_result.timestamp = "2024-01-01T00:00:00Z"
+            mock_result.last_updated = "2024-01-01T00:00:00Z"
             
-            mock_db.query.return_value.distinct.return_value.all.return_value = [mock_result]
+            mock_db.execute = AsyncMock(return_value=Mock(all=Mock(return_value=[mock_result])))
             yield mock_db
         
-        app.dependency_overrides[get_db] = mock_get_db
+        app.dependency_overrides[get_async_db] = mock_get_async_db
         
         try:
             response = client.get("/models")
@@ -156,20 +473,42 @@ class TestAPIEndpoints:
         finally:
             app.dependency_overrides.clear()
     
+    def test_search_models(self, client):
+        """Test model autocomplete over the current prices."""
+        from main import price_service
+
+        entries = [
+            {"model": "GPT-4o", "provider": "OpenAI", "input_price_per_1m": 5.0, "output_price_per_1m": 15.0},
+            {"model": "GPT-4", "provider": "OpenAI", "input_price_per_1m": 30.0, "output_price_per_1m": 60.0},
+            {"model": "Claude 3 Opus", "provider": "Anthropic", "input_price_per_1m": 15.0, "output_price_per_1m": 75.0},
+        ]
+        with patch.object(price_service.store, 'models', return_value={
+            "gpt-4o": entries[:1], "gpt-4": entries[1:2], "claude_3_opus": entries[2:],
+        }), patch.object(price_service, 'generation', price_service.generation + 1):
+            response = client.get("/models/search", params={"q": "gpt", "limit": 5})
+            fuzzy = client.get("/models/search", params={"q": "opsu"})
+
+        assert response.status_code == 200
+        assert [r["display_name"] for r in response.json()] == ["GPT-4", "GPT-4o"]
+        assert response.json()[0]["providers"] == ["OpenAI"]
+        assert fuzzy.json() == []
+        assert client.get("/models/search", params={"q": ""}).status_code == 422
+        assert client.get("/models/search", params={"q": "gpt", "limit": 0}).status_code == 422
+
     def test_get_all_providers(self, client):
         """Test getting all providers from database."""
-        from database import get_db
+        from database import get_async_db
         from main import app
         
-        def mock_get_db():
+        async def mock_get_async_db():
             mock_db = Mock()
-            mock_db.query.return_value.group_by.return_value.all.return_value = [
+            mock_db.execute = AsyncMock(return_value=Mock(all=Mock(return_value=[
                 ("OpenAI", 3, "2024-01-01T00:00:00Z"),
                 ("Anthropic", 2, "2024-01-01T00:00:00Z")
-            ]
+            ])))
             yield mock_db
         
-        app.dependency_overrides[get_db] = mock_get_db
+        app.dependency_overrides[get_async_db] = mock_get_async_db
         
         try:
             response = client.get("/providers")
@@ -182,3 +521,39 @@ class TestAPIEndpoints:
             assert "Anthropic" in provider_names
         finally:
             app.dependency_overrides.clear()
+
+    def test_models_and_providers_read_catalog(self, client, test_db):
+        """Test that /models and /providers return one entry per catalog row, not per history row."""
+        from datetime import datetime, timedelta
+        from sqlalchemy.ext.asyncio import async_sessionmaker
+        from database import get_async_db
+        from main import app
+        from models.price_data import ModelCatalog, PriceData
+
+        now = datetime(2024, 1, 1)
+        db = test_db()
+        for hours in range(5):
+            db.add(PriceData("GPT-4", "OpenAI", 30.0, 60.0, timestamp=now + timedelta(hours=hours)))
+        for normalized_id, display_name, provider in (("gpt-4", "GPT-4", "OpenAI"), ("gpt-4", "GPT-4", "Azure"), ("o1", "o1", "OpenAI")):
+            db.add(ModelCatalog(
+                normalized_id=normalized_id, provider=provider, display_name=display_name,
+                input_price_per_1m=1.0, output_price_per_1m=2.0, first_seen=now, last_updated=now,
+            ))
+        db.commit()
+        db.close()
+
+        AsyncTestingSessionLocal = async_sessionmaker(test_db.async_engine)
+
+        async def override_get_async_db():
+            async with AsyncTestingSessionLocal() as session:
+                yield session
+
+        app.dependency_overrides[get_async_db] = override_get_async_db
+        try:
+            models = client.get("/models").json()
+            providers = {p["name"]: p["model_count"] for p in client.get("/providers").json()}
+        finally:
+            app.dependency_overrides.clear()
+
+        assert len(models) == 3
+        assert providers == {"OpenAI": 2, "Azure": 1}
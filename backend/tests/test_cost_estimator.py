@@ -0,0 +1,62 @@
+"""Tests for the workload cost estimator."""
+
+import random
+
+import numpy as np
+
+from services.cost_estimator import DAYS_PER_MONTH, PriceMatrix, estimate_costs, rank_costs
+
+ENTRIES = [
+    {"model": "GPT-4", "provider": "OpenAI", "input_price_per_1m": 30.0, "output_price_per_1m": 60.0},
+    {"model": "GPT-4o mini", "provider": "OpenAI", "input_price_per_1m": 0.15, "output_price_per_1m": 0.6},
+    {"model": "Claude 3 Haiku", "provider": "Anthropic", "input_price_per_1m": 0.25, "output_price_per_1m": 1.25},
+]
+
+
+class TestCostEstimator:
+    """Test cases for cost ranking over the price matrix."""
+
+    def test_ranks_cheapest_first(self):
+        """Test that estimates are ranked by cost per request."""
+        matrix = PriceMatrix.from_entries(1, ENTRIES)
+
+        (result,) = estimate_costs(matrix, [{"input_tokens": 1_000_000, "output_tokens": 1_000_000}], top_k=2)
+
+        assert [(e["rank"], e["model"]) for e in result["estimates"]] == [(1, "GPT-4o mini"), (2, "Claude 3 Haiku")]
+        assert result["estimates"][0]["cost_per_request"] == 0.75
+        assert "daily_cost" not in result["estimates"][0]
+
+    def test_daily_and_monthly_projection(self):
+        """Test that per-day volumes add daily and monthly costs."""
+        matrix = PriceMatrix.from_entries(1, ENTRIES)
+
+        (result,) = estimate_costs(matrix, [{"input_tokens": 1000, "output_tokens": 0, "requests_per_day": 1000}], top_k=1)
+
+        estimate = result["estimates"][0]
+        assert estimate["daily_cost"] == 0.15
+        assert estimate["monthly_cost"] == 0.15 * DAYS_PER_MONTH
+
+    def test_matches_brute_force(self):
+        """Test the partial sort against sorting every cost, with top_k both below and above the entry count."""
+        rng = random.Random(7)
+        entries = [{"model": f"m{i}", "provider": "p", "input_price_per_1m": rng.uniform(0, 10),
+                    "output_price_per_1m": rng.uniform(0, 40)} for i in range(50)]
+        matrix = PriceMatrix.from_entries(1, entries)
+        tokens = np.array([[rng.randint(0, 10_000), rng.randint(0, 10_000)] for _ in range(20)], dtype=np.float64)
+
+        for top_k in (5, 50, 80):
+            indices, costs = rank_costs(matrix, tokens, top_k)
+            for row, (input_tokens, output_tokens) in enumerate(tokens):
+                expected = sorted((input_tokens * e["input_price_per_1m"] + output_tokens * e["output_price_per_1m"]) / 1e6
+                                  for e in entries)[:top_k]
+                assert np.allclose(costs[row], expected)
+                assert np.allclose(matrix.prices[0, indices[row]] * input_tokens / 1e6
+                                   + matrix.prices[1, indices[row]] * output_tokens / 1e6, costs[row])
+
+    def test_empty_matrix(self):
+        """Test that estimating without prices returns empty rankings."""
+        matrix = PriceMatrix.from_entries(0, [])
+
+        results = estimate_costs(matrix, [{"input_tokens": 10, "output_tokens": 10}], top_k=5)
+
+        assert results[0]["estimates"] == []
@@ -0,0 +1,84 @@
+"""Tests for ExtractionCache."""
+
+from unittest.mock import patch
+
+import pytest
+
+from services.extraction_cache import ExtractionCache, normalize_content
+
+PRICES = [{"model": "Claude 3 Haiku", "provider": "Anthropic", "input_price_per_1m": 0.25, "output_price_per_1m": 1.25}]
+
+
+class TestExtractionCache:
+    """Test cases for ExtractionCache."""
+
+    @pytest.fixture
+    def cache(self):
+        """Create an in-memory extraction cache."""
+        cache = ExtractionCache(":memory:", max_entries=3, max_age_seconds=3600)
+        yield cache
+        cache.close()
+
+    def test_miss_then_hit(self, cache):
+        """Test that stored prices are returned and counted as hits."""
+        key = ExtractionCache.make_key("Input: $0.25 / MTok", "v1")
+        assert cache.get(key) is None
+
+        cache.put(key, PRICES)
+
+        assert cache.get(key) == PRICES
+        assert cache.stats() == {"hits": 1, "misses": 1, "evictions": 0, "entries": 1}
+
+    def test_key_ignores_whitespace(self):
+        """Test that whitespace-only changes produce the same key."""
+        assert ExtractionCache.make_key("Input:  $0.25\n\n/ MTok ", "v1") == ExtractionCache.make_key("Input: $0.25 / MTok", "v1")
+
+    def test_key_depends_on_prompt_version(self):
+        """Test that a new prompt version does not reuse old extractions."""
+        assert ExtractionCache.make_key("Input: $0.25", "v1") != ExtractionCache.make_key("Input: $0.25", "v2")
+
+    def test_expired_entries_miss(self, cache):
+        """Test that entries older than the max age are evicted on read."""
+        key = ExtractionCache.make_key("page", "v1")
+        with patch('services.extraction_cache.time.time', return_value=1000.0):
+            cache.put(key, PRICES)
+        with patch('services.extraction_cache.time.time', return_value=1000.0 + 3601):
+            assert cache.get(key) is None
+
+        assert cache.evictions == 1
+        assert len(cache) == 0
+
+    def test_size_eviction_drops_least_recently_used(self, cache):
+        """Test that the cache keeps at most max_entries, evicting the least recently used."""
+        keys = [ExtractionCache.make_key(f"page {i}", "v1") for i in range(4)]
+        for i, key in enumerate(keys[:3]):
+            with patch('services.extraction_cache.time.time', return_value=1000.0 + i):
+                cache.put(key, PRICES)
+        with patch('services.extraction_cache.time.time', return_value=1010.0):
+            cache.get(keys[0])
+            cache.put(keys[3], PRICES)
+
+        assert len(cache) == 3
+        with patch('services.extraction_cache.time.time', return_value=1011.0):
+            assert cache.get(keys[1]) is None
+            assert cache.get(keys[0]) == PRICES
+
+    def test_persists_across_instances(self, tmp_path):
+        """Test that entries survive reopening the cache file."""
+        path = str(tmp_path / "extraction_cache.db")
+        key = ExtractionCache.make_key("page", "v1")
+        first = ExtractionCache(path)
+        first.put(key, PRICES)
+        first.close()
+
+        second = ExtractionCache(path)
+        assert second.get(key) == PRICES
+        second.close()
+
+
+class TestNormalizeContent:
+    """Test cases for normalize_content function."""
+
+    def test_collapses_whitespace(self):
+        """Test that runs of whitespace collapse to one space."""
+        assert normalize_content(" a \n\n b\tc ") == "a b c"
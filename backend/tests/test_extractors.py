@@ -0,0 +1,131 @@
+"""Tests for deterministic pricing extractors."""
+
+from models.price_data import PriceData
+from services.extractors import (
+    EXTRACTORS,
+    TABLE_EXTRACTOR_PROVIDERS,
+    get_extractor,
+    parse_price_per_1m,
+    parse_pricing_tables,
+    register_extractor,
+    validate_prices,
+)
+
+PER_MTOK_HTML = """
+<html><body>
+<nav>Products Pricing Company</nav>
+<table>
+  <tr><th>Model</th><th>Input</th><th>Output</th></tr>
+  <tr><td>Claude 3 Opus</td><td>$15 / MTok</td><td>$75 / MTok</td></tr>
+  <tr><td>Claude 3 Haiku</td><td>$0.25 / MTok</td><td>$1.25 / MTok</td></tr>
+</table>
+</body></html>
+"""
+
+PER_1K_HTML = """
+<table>
+  <thead><tr><th>Model</th><th>Input price (per 1K tokens)</th><th>Output price (per 1K tokens)</th></tr></thead>
+  <tbody>
+    <tr><td>Command R</td><td>$0.0005</td><td>$0.0015</td></tr>
+    <tr><td>Embed</td><td>$0.0001</td><td>-</td></tr>
+  </tbody>
+</table>
+"""
+
+
+class TestParsePricePer1M:
+    """Test cases for parse_price_per_1m function."""
+
+    def test_per_mtok(self):
+        """Test prices already quoted per million tokens."""
+        assert parse_price_per_1m("$3 / MTok") == 3.0
+        assert parse_price_per_1m("$1,250.00 per million tokens") == 1250.0
+
+    def test_per_1k_in_cell(self):
+        """Test that per-1K prices are converted to per-1M."""
+        assert parse_price_per_1m("$0.0025 per 1K tokens") == 2.5
+
+    def test_per_1k_in_header(self):
+        """Test that the unit can come from the column header."""
+        assert parse_price_per_1m("$0.5", unit_hint="Input (per 1k tokens)") == 500.0
+
+    def test_no_amount(self):
+        """Test that cells without a dollar amount are ignored."""
+        assert parse_price_per_1m("Contact sales") is None
+        assert parse_price_per_1m("-") is None
+
+
+class TestParsePricingTables:
+    """Test cases for parse_pricing_tables function."""
+
+    def test_per_mtok_table(self):
+        """Test parsing a per-MTok pricing table."""
+        prices = parse_pricing_tables(PER_MTOK_HTML, "Anthropic")
+
+        assert [p.display_name for p in prices] == ["Claude 3 Opus", "Claude 3 Haiku"]
+        assert prices[0].input_price_per_1m == 15.0
+        assert prices[0].output_price_per_1m == 75.0
+        assert all(p.provider == "Anthropic" for p in prices)
+
+    def test_per_1k_table_skips_incomplete_rows(self):
+        """Test parsing a per-1K table, skipping rows without both prices."""
+        prices = parse_pricing_tables(PER_1K_HTML, "Cohere")
+
+        assert len(prices) == 1
+        assert prices[0].display_name == "Command R"
+        assert prices[0].input_price_per_1m == 0.5
+        assert prices[0].output_price_per_1m == 1.5
+
+    def test_tables_without_price_columns_are_ignored(self):
+        """Test that unrelated tables produce no prices."""
+        html = "<table><tr><th>Plan</th><th>Seats</th></tr><tr><td>Team</td><td>$30</td></tr></table>"
+        assert parse_pricing_tables(html, "Anthropic") == []
+
+
+class TestValidatePrices:
+    """Test cases for validate_prices function."""
+
+    def test_valid(self):
+        """Test that plausible prices validate."""
+        assert validate_prices([PriceData("Claude 3 Opus", "Anthropic", 15.0, 75.0)])
+
+    def test_empty(self):
+        """Test that an empty extraction does not validate."""
+        assert not validate_prices([])
+
+    def test_implausible_price(self):
+        """Test that negative or huge prices do not validate."""
+        assert not validate_prices([PriceData("Model", "Anthropic", -1.0, 2.0)])
+        assert not validate_prices([PriceData("Model", "Anthropic", 1.0, 20000.0)])
+
+    def test_conflicting_duplicates(self):
+        """Test that one model with two different prices does not validate."""
+        assert not validate_prices([
+            PriceData("Claude 3 Opus", "Anthropic", 15.0, 75.0),
+            PriceData("Claude 3 Opus", "Anthropic", 3.0, 15.0),
+        ])
+
+
+class TestExtractorRegistry:
+    """Test cases for the extractor registry."""
+
+    def test_builtin_extractors(self):
+        """Test that the table providers get the generic table extractor, bound to their name."""
+        assert TABLE_EXTRACTOR_PROVIDERS == ("Anthropic", "Cohere")
+        for provider_name in TABLE_EXTRACTOR_PROVIDERS:
+            prices = get_extractor(provider_name)(PER_MTOK_HTML)
+            assert [(p.display_name, p.provider) for p in prices] == [
+                ("Claude 3 Opus", provider_name), ("Claude 3 Haiku", provider_name),
+            ]
+        assert get_extractor("Unknown") is None
+
+    def test_register_extractor(self):
+        """Test registering a new provider extractor."""
+        @register_extractor("Example")
+        def extract_example(html):
+            return []
+
+        try:
+            assert get_extractor("Example") is extract_example
+        finally:
+            EXTRACTORS.pop("Example")
@@ -0,0 +1,100 @@
+"""Tests for refresh leader election."""
+
+import subprocess
+import sys
+from unittest.mock import Mock
+
+import pytest
+
+from services.leader import AdvisoryLockLeader, FileLockLeader, create_leader_election
+
+
+class TestFileLockLeader:
+    """Test cases for FileLockLeader."""
+
+    def test_single_leader(self, tmp_path):
+        """Test that only one holder of the lock file leads until it releases."""
+        path = str(tmp_path / "leader.lock")
+        first, second = FileLockLeader(path), FileLockLeader(path)
+
+        assert first.try_acquire()
+        assert first.try_acquire()
+        assert not second.try_acquire()
+
+        first.release()
+        assert not first.is_leader
+        assert second.try_acquire()
+        second.release()
+
+    def test_failover_when_leader_dies(self, tmp_path):
+        """Test that leadership is free again once the leading process exits."""
+        path = str(tmp_path / "leader.lock")
+        holder = subprocess.Popen(
+            [sys.executable, "-c", (
+                "import sys, time; from services.leader import FileLockLeader; "
+                f"assert FileLockLeader({path!r}).try_acquire(); print('ready', flush=True); time.sleep(60)"
+            )],
+            stdout=subprocess.PIPE, text=True,
+        )
+        try:
+            assert holder.stdout.readline().strip() == "ready"
+            follower = FileLockLeader(path)
+            assert not follower.try_acquire()
+        finally:
+            holder.kill()
+            holder.wait()
+
+        assert follower.try_acquire()
+        follower.release()
+
+
+class TestAdvisoryLockLeader:
+    """Test cases for AdvisoryLockLeader."""
+
+    @pytest.fixture
+    def engine(self):
+        engine = Mock()
+        self.conn = engine.connect.return_value.execution_options.return_value
+        return engine
+
+    def test_acquires_advisory_lock(self, engine):
+        """Test that leadership is taken with pg_try_advisory_lock on a dedicated connection."""
+        self.conn.execute.return_value.scalar.return_value = True
+        leader = AdvisoryLockLeader(engine, lock_id=42)
+
+        assert leader.try_acquire()
+
+        statement, params = self.conn.execute.call_args[0]
+        assert "pg_try_advisory_lock" in str(statement)
+        assert params == {"lock_id": 42}
+        self.conn.close.assert_not_called()
+
+    def test_lock_held_elsewhere(self, engine):
+        """Test that a failed lock attempt closes its connection."""
+        self.conn.execute.return_value.scalar.return_value = False
+        leader = AdvisoryLockLeader(engine)
+
+        assert not leader.try_acquire()
+        assert not leader.is_leader
+        self.conn.close.assert_called_once()
+
+    def test_reacquires_after_connection_loss(self, engine):
+        """Test that a dead leader connection drops leadership and competes again."""
+        self.conn.execute.return_value.scalar.return_value = True
+        leader = AdvisoryLockLeader(engine)
+        assert leader.try_acquire()
+
+        self.conn.execute.side_effect = [ConnectionError("server closed the connection"), Mock(scalar=Mock(return_value=False))]
+
+        assert not leader.try_acquire()
+        assert engine.connect.call_count == 2
+
+
+def test_create_leader_election_by_dialect():
+    """Test that PostgreSQL gets advisory locks and other databases a file lock."""
+    engine = Mock()
+    engine.dialect.name = "postgresql"
+    assert isinstance(create_leader_election(engine), AdvisoryLockLeader)
+
+    engine.dialect.name = "sqlite"
+    assert isinstance(create_leader_election(engine), FileLockLeader)
@@ -0,0 +1,223 @@
+"""Tests for price history migrations."""
+
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.pool import StaticPool
+
+from database import (
+    create_missing_indexes,
+    migrate_model_catalog_columns,
+    migrate_price_data_columns,
+    populate_model_catalog,
+)
+from migrations import backfill_daily_rollup, compact_price_history
+from models.price_data import ModelCatalog, PriceDailyRollup, PriceData
+
+
+def add_snapshot(db, model, provider, input_price, output_price, timestamp):
+    row = PriceData(model, provider, input_price, output_price)
+    row.timestamp = row.valid_from = row.valid_to = timestamp
+    db.add(row)
+
+
+class TestCompactPriceHistory:
+    """Test cases for compact_price_history function."""
+
+    def test_collapses_duplicate_runs(self, test_db):
+        """Test that runs of identical prices become one interval each."""
+        base = datetime(2024, 1, 1)
+        db = test_db()
+        series = [30.0, 30.0, 30.0, 25.0, 25.0, 30.0]
+        for i, price in enumerate(series):
+            add_snapshot(db, "GPT-4", "OpenAI", price, price * 2, base + timedelta(minutes=30 * i))
+        db.commit()
+
+        result = compact_price_history(db)
+
+        assert result == {"scanned": 6, "kept": 3, "deleted": 3}
+        rows = db.query(PriceData).order_by(PriceData.valid_from).all()
+        assert [row.input_price_per_1m for row in rows] == [30.0, 25.0, 30.0]
+        assert rows[0].valid_from == base
+        assert rows[0].timestamp == base + timedelta(minutes=60)
+        assert rows[0].valid_to == base + timedelta(minutes=90)
+        assert rows[1].valid_to == base + timedelta(minutes=150)
+        assert rows[2].valid_to is None
+        db.close()
+
+    def test_series_are_compacted_independently(self, test_db):
+        """Test that each (model, provider) keeps its own current row."""
+        base = datetime(2024, 1, 1)
+        db = test_db()
+        for i in range(3):
+            add_snapshot(db, "GPT-4", "OpenAI", 30.0, 60.0, base + timedelta(minutes=30 * i))
+            add_snapshot(db, "GPT-4", "Azure", 30.0, 60.0, base + timedelta(minutes=30 * i))
+        db.commit()
+
+        compact_price_history(db)
+
+        rows = db.query(PriceData).all()
+        assert sorted(row.provider for row in rows) == ["Azure", "OpenAI"]
+        assert all(row.valid_to is None for row in rows)
+        db.close()
+
+    def test_idempotent(self, test_db):
+        """Test that compacting twice changes nothing the second time."""
+        db = test_db()
+        for i in range(4):
+            add_snapshot(db, "GPT-4", "OpenAI", 30.0, 60.0, datetime(2024, 1, 1) + timedelta(minutes=30 * i))
+        db.commit()
+
+        compact_price_history(db)
+        result = compact_price_history(db)
+
+        assert result == {"scanned": 1, "kept": 1, "deleted": 0}
+        db.close()
+
+
+class TestBackfillDailyRollup:
+    """Test cases for backfill_daily_rollup function."""
+
+    def test_snapshots_aggregate_per_day(self, test_db):
+        """Test that snapshots of one day become one rollup row with min/max/first/last."""
+        base = datetime(2024, 1, 1, 6)
+        db = test_db()
+        for i, price in enumerate([30.0, 10.0, 20.0]):
+            add_snapshot(db, "GPT-4", "OpenAI", price, price * 2, base + timedelta(hours=i))
+        add_snapshot(db, "GPT-4", "OpenAI", 20.0, 40.0, base + timedelta(days=1))
+        db.commit()
+
+        result = backfill_daily_rollup(db)
+
+        assert result == {"scanned": 4, "rollup_rows": 2}
+        row = db.query(PriceDailyRollup).order_by(PriceDailyRollup.day).first()
+        assert (row.input_first, row.input_min, row.input_max, row.input_last) == (30.0, 10.0, 30.0, 20.0)
+        assert row.first_seen == base
+        assert row.last_seen == base + timedelta(hours=2)
+
+    def test_intervals_cover_every_day(self, test_db):
+        """Test that an interval row contributes to each day it spans, and re-runs replace rows."""
+        db = test_db()
+        row = PriceData("GPT-4", "OpenAI", 30.0, 60.0)
+        row.valid_from, row.timestamp = datetime(2024, 1, 1, 12), datetime(2024, 1, 4, 6)
+        db.add(row)
+        db.commit()
+
+        backfill_daily_rollup(db)
+        result = backfill_daily_rollup(db)
+
+        assert result["rollup_rows"] == 4
+        days = db.query(PriceDailyRollup).order_by(PriceDailyRollup.day).all()
+        assert days[0].first_seen == datetime(2024, 1, 1, 12)
+        assert days[1].first_seen == datetime(2024, 1, 2)
+        assert days[-1].last_seen == datetime(2024, 1, 4, 6)
+
+
+class TestMigratePriceDataColumns:
+    """Test cases for migrate_price_data_columns function."""
+
+    def test_adds_and_backfills_columns(self):
+        """Test upgrading a price_data table created before validity intervals."""
+        engine = create_engine("sqlite://", poolclass=StaticPool)
+        with engine.begin() as conn:
+            conn.execute(text(
+                "CREATE TABLE price_data (id VARCHAR PRIMARY KEY, normalized_id VARCHAR NOT NULL, "
+                "display_name VARCHAR NOT NULL, provider VARCHAR NOT NULL, input_price_per_1m FLOAT NOT NULL, "
+                "output_price_per_1m FLOAT NOT NULL, timestamp DATETIME)"
+            ))
+            conn.execute(text(
+                "INSERT INTO price_data VALUES ('a', 'gpt-4', 'GPT-4', 'OpenAI', 30.0, 60.0, '2024-01-01 00:00:00')"
+            ))
+
+        migrate_price_data_columns(engine)
+
+        columns = {column["name"] for column in inspect(engine).get_columns("price_data")}
+        assert {"valid_from", "valid_to"} <= columns
+        with engine.connect() as conn:
+            row = conn.execute(text("SELECT timestamp, valid_from, valid_to FROM price_data")).one()
+        assert row[0] == row[1] == row[2]
+        engine.dispose()
+
+
+class TestMigrateModelCatalogColumns:
+    """Test cases for migrate_model_catalog_columns function."""
+
+    def test_adds_generation_column(self):
+        """Test upgrading a model_catalog table created before generations."""
+        engine = create_engine("sqlite://", poolclass=StaticPool)
+        with engine.begin() as conn:
+            conn.execute(text(
+                "CREATE TABLE model_catalog (normalized_id VARCHAR, provider VARCHAR, display_name VARCHAR NOT NULL, "
+                "input_price_per_1m FLOAT NOT NULL, output_price_per_1m FLOAT NOT NULL, first_seen DATETIME NOT NULL, "
+                "last_updated DATETIME NOT NULL, PRIMARY KEY (normalized_id, provider))"
+            ))
+            conn.execute(text(
+                "INSERT INTO model_catalog VALUES ('gpt-4', 'OpenAI', 'GPT-4', 30.0, 60.0, "
+                "'2024-01-01 00:00:00', '2024-01-01 00:00:00')"
+            ))
+
+        migrate_model_catalog_columns(engine)
+        migrate_model_catalog_columns(engine)
+
+        with engine.connect() as conn:
+            assert conn.execute(text("SELECT generation FROM model_catalog")).scalar() == 0
+        engine.dispose()
+
+
+class TestCreateMissingIndexes:
+    """Test cases for create_missing_indexes function."""
+
+    def test_creates_composite_history_index(self):
+        """Test that the history index is added to a table created without it."""
+        engine = create_engine("sqlite://", poolclass=StaticPool)
+        with engine.begin() as conn:
+            conn.execute(text(
+                "CREATE TABLE price_data (id VARCHAR PRIMARY KEY, normalized_id VARCHAR NOT NULL, "
+                "display_name VARCHAR NOT NULL, provider VARCHAR NOT NULL, input_price_per_1m FLOAT NOT NULL, "
+                "output_price_per_1m FLOAT NOT NULL, timestamp DATETIME, valid_from DATETIME, valid_to DATETIME)"
+            ))
+
+        create_missing_indexes(engine)
+        create_missing_indexes(engine)
+
+        indexes = {index["name"]: index["column_names"] for index in inspect(engine).get_indexes("price_data")}
+        assert indexes["ix_price_data_model_provider_timestamp"] == ["normalized_id", "provider", "timestamp"]
+        engine.dispose()
+
+
+class TestPopulateModelCatalog:
+    """Test cases for populate_model_catalog function."""
+
+    def test_seeds_latest_row_per_pair(self, test_db):
+        """Test that an empty catalog is seeded with the latest price of each (model, provider)."""
+        base = datetime(2024, 1, 1)
+        db = test_db()
+        add_snapshot(db, "GPT-4", "OpenAI", 30.0, 60.0, base)
+        add_snapshot(db, "GPT-4", "OpenAI", 25.0, 50.0, base + timedelta(hours=1))
+        add_snapshot(db, "GPT-4", "Azure", 32.0, 64.0, base)
+        db.commit()
+
+        populate_model_catalog(test_db.kw["bind"])
+
+        rows = {row.provider: row for row in db.query(ModelCatalog)}
+        assert len(rows) == 2
+        assert rows["OpenAI"].input_price_per_1m == 25.0
+        assert rows["OpenAI"].first_seen == base
+        assert rows["OpenAI"].last_updated == base + timedelta(hours=1)
+        db.close()
+
+    def test_leaves_existing_catalog_alone(self, test_db):
+        """Test that a catalog that already has rows is not reseeded."""
+        db = test_db()
+        add_snapshot(db, "GPT-4", "OpenAI", 30.0, 60.0, datetime(2024, 1, 1))
+        db.add(ModelCatalog(
+            normalized_id="claude-2", provider="Anthropic", display_name="Claude 2",
+            input_price_per_1m=8.0, output_price_per_1m=24.0,
+            first_seen=datetime(2024, 1, 1), last_updated=datetime(2024, 1, 1),
+        ))
+        db.commit()
+
+        populate_model_catalog(test_db.kw["bind"])
+
+        assert [row.normalized_id for row in db.query(ModelCatalog)] == ["claude-2"]
+        db.close()
@@ -0,0 +1,129 @@
+"""Tests for model identity resolution and search."""
+
+import time
+
+import pytest
+
+from services.model_index import ModelIndex, canonical_model_id, parse_model_aliases
+
+
+def entry(model: str, provider: str, input_price: float = 1.0, output_price: float = 2.0) -> dict:
+    return {"model": model, "provider": provider, "input_price_per_1m": input_price, "output_price_per_1m": output_price}
+
+
+@pytest.fixture
+def index():
+    return ModelIndex({
+        "claude_3_opus": [entry("Claude 3 Opus", "Anthropic")],
+        "claude-3-opus-20240229": [entry("claude-3-opus-20240229", "AWS Bedrock")],
+        "claude_3.5_sonnet": [entry("Claude 3.5 Sonnet", "Anthropic")],
+        "gpt-4": [entry("GPT-4", "OpenAI"), entry("GPT-4", "Azure")],
+        "gpt-4o": [entry("GPT-4o", "OpenAI")],
+        "gpt-4o-mini": [entry("GPT-4o mini", "OpenAI")],
+    }, aliases={"gpt4": "gpt-4", "claude-3-5-sonnet-latest": "claude-3.5-sonnet"})
+
+
+class TestCanonicalModelId:
+    """Test cases for canonical_model_id and alias parsing."""
+
+    @pytest.mark.parametrize("name", [
+        "claude-3-opus-20240229", "Claude 3 Opus", "claude_3_opus", "anthropic/claude-3-opus@20240229",
+        "claude-3-opus-2024-02-29",
+    ])
+    def test_spellings_share_identity(self, name):
+        """Test that common spellings of one model reduce to the same key."""
+        assert canonical_model_id(name) == "claude-3-opus"
+
+    def test_plus_is_a_different_model(self):
+        """Test that "+" is kept, so Command R and Command R+ stay distinct."""
+        assert canonical_model_id("Command R") == "command-r"
+        assert canonical_model_id("Command R+") == canonical_model_id("command-r-plus") == "command-r-plus"
+
+    def test_parse_aliases(self):
+        """Test that alias overrides are canonicalized on both sides."""
+        assert parse_model_aliases("GPT 4=gpt-4, bad") == {"gpt-4": "gpt-4"}
+
+
+class TestModelIndex:
+    """Test cases for ModelIndex."""
+
+    @pytest.mark.parametrize("name", ["claude-3-opus", "Claude-3-Opus", "claude 3 opus 2024-02-29", "anthropic/claude-3-opus"])
+    def test_resolve_spellings(self, index, name):
+        """Test that any spelling resolves to every stored variant of the model."""
+        assert sorted(index.resolve(name)) == ["claude-3-opus-20240229", "claude_3_opus"]
+
+    def test_resolve_exact_normalized_id_first(self, index):
+        """Test that a name matching a stored normalized_id resolves only to it."""
+        assert index.resolve("claude-3-opus-20240229") == ["claude-3-opus-20240229"]
+        assert index.resolve("Claude 3 Opus") == ["claude_3_opus"]
+
+    def test_resolve_aliases_and_unknown(self, index):
+        """Test alias resolution and that unknown names resolve to nothing."""
+        assert index.resolve("gpt4") == ["gpt-4"]
+        assert index.resolve("claude-3-5-sonnet-latest") == ["claude_3.5_sonnet"]
+        assert index.resolve("llama-3") == []
+
+    def test_resolve_keeps_plus_models_apart(self):
+        """Test that Command R and Command R+ resolve to their own models."""
+        index = ModelIndex({
+            "command_r": [entry("Command R", "Cohere", 0.15, 0.6)],
+            "command_r_": [entry("Command R+", "Cohere", 2.5, 10.0)],
+            "cohere/command-r-plus": [entry("cohere/command-r-plus", "AWS Bedrock", 2.5, 10.0)],
+        }, aliases={})
+
+        assert index.resolve("command-r") == ["command_r"]
+        assert index.resolve("Command-R-Plus") == ["cohere/command-r-plus", "command_r_"]
+
+    def test_resolve_ignores_price_changes(self):
+        """Test that resolution depends on names only, so a price change never changes what a name resolves to."""
+        models = {
+            "gpt-4-0613": [entry("gpt-4-0613", "OpenAI", 30.0, 60.0)],
+            "gpt_4_0613": [entry("GPT 4 0613", "OpenAI", 30.0, 60.0)],
+            "gpt-4_0613": [entry("GPT-4 0613", "Azure", 30.0, 60.0)],
+        }
+        before = ModelIndex(models, aliases={}).resolve("GPT 4-0613")
+        models["gpt_4_0613"] = [entry("GPT 4 0613", "OpenAI", 10.0, 30.0)]
+        index = ModelIndex(models, aliases={})
+
+        assert index.resolve("GPT 4-0613") == before == ["gpt-4-0613", "gpt-4_0613", "gpt_4_0613"]
+        assert index.resolve("gpt-4-0613") == ["gpt-4-0613"]
+
+    def test_index_without_prices(self):
+        """Test that entries need only a model and provider to be indexed."""
+        index = ModelIndex({"claude_3_opus": [{"model": "Claude 3 Opus", "provider": "Anthropic"}]}, aliases={})
+
+        assert index.resolve("claude-3-opus") == ["claude_3_opus"]
+
+    def test_search_ranking(self, index):
+        """Test that exact identities, then name prefixes, rank first."""
+        results = index.search("gpt-4")
+
+        assert [r["normalized_id"] for r in results] == ["gpt-4", "gpt-4o", "gpt-4o-mini"]
+        assert results[0]["providers"] == ["Azure", "OpenAI"]
+
+    def test_search_word_prefix_and_limit(self, index):
+        """Test that a later word of a name matches and limit is honoured."""
+        assert [r["display_name"] for r in index.search("sonn")] == ["Claude 3.5 Sonnet"]
+        assert len(index.search("claude", limit=2)) == 2
+
+    def test_search_fuzzy(self, index):
+        """Test that a misspelt query still finds the model."""
+        assert index.search("claude 3 opsu")[0]["display_name"] in ("Claude 3 Opus", "claude-3-opus-20240229")
+        assert index.search("zzzz") == []
+
+    def test_lookups_at_scale(self):
+        """Test that resolving and searching 10k models stays fast."""
+        models = {f"model_{i}_v{i % 7}": [entry(f"Model {i} v{i % 7}", f"Provider {i % 13}")] for i in range(10000)}
+        index = ModelIndex(models, aliases={})
+
+        start = time.perf_counter()
+        for i in range(1000):
+            assert index.resolve(f"model-{i}-v{i % 7}") == [f"model_{i}_v{i % 7}"]
+        resolve_ms = (time.perf_counter() - start)
+        start = time.perf_counter()
+        for i in range(100):
+            assert index.search(f"model {i}")
+        search_ms = (time.perf_counter() - start) * 10
+
+        assert resolve_ms < 1.0  # 1000 lookups in under a second: well below 1 ms each
+        assert search_ms < 10.0
@@ -1,5 +1,7 @@
 """Tests for data models."""
 
+from datetime import datetime, timezone
+
 from models.price_data import PriceData
 
 
@@ -72,3 +74,19 @@ class TestPriceData:
         """Test that timestamp is set by default."""
         price = PriceData("GPT-4", "OpenAI", 30.0, 60.0)
         assert hasattr(price, 'timestamp')
+    
+    def test_explicit_timestamp(self):
+        """Test that an explicit timestamp is used for the row and its id."""
+        observed_at = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        price = PriceData("GPT-4", "OpenAI", 30.0, 60.0, timestamp=observed_at)
+
+        assert price.timestamp == observed_at
+        assert price.id == f"GPT-4_OpenAI_{observed_at.isoformat()}"
+
+    def test_id_unique_across_providers(self):
+        """Test that the same model from two providers at one timestamp gets distinct ids."""
+        observed_at = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        openai = PriceData("GPT-4", "OpenAI", 30.0, 60.0, timestamp=observed_at)
+        azure = PriceData("GPT-4", "Azure", 30.0, 60.0, timestamp=observed_at)
+
+        assert openai.id != azure.id
@@ -0,0 +1,122 @@
+"""Tests for PageFetcher."""
+
+from unittest.mock import Mock
+
+import pytest
+import requests
+
+from services.page_fetcher import PageFetcher, parse_host_timeouts
+
+URL = "https://www.anthropic.com/pricing"
+
+
+def make_response(status_code=200, text="<html>prices</html>", headers=None):
+    response = Mock()
+    response.status_code = status_code
+    response.text = text
+    response.headers = headers or {}
+    if status_code >= 400:
+        response.raise_for_status.side_effect = requests.HTTPError(response=response)
+    return response
+
+
+class TestPageFetcher:
+    """Test cases for PageFetcher."""
+
+    @pytest.fixture
+    def fetcher(self):
+        """Create a PageFetcher with a mocked session."""
+        fetcher = PageFetcher(timeout=20, host_timeouts={"cohere.com": 5})
+        fetcher.session = Mock()
+        return fetcher
+
+    def test_first_fetch_is_unconditional(self, fetcher):
+        """Test that the first fetch of a URL sends no validators."""
+        fetcher.session.get.return_value = make_response(headers={"ETag": '"v1"'})
+
+        result = fetcher.fetch(URL)
+
+        assert result.changed is True
+        assert result.html == "<html>prices</html>"
+        assert fetcher.session.get.call_args.kwargs["headers"] == {}
+
+    def test_conditional_headers_sent_on_refetch(self, fetcher):
+        """Test that stored validators are sent on the next fetch."""
+        fetcher.session.get.return_value = make_response(headers={
+            "ETag": '"v1"',
+            "Last-Modified": "Wed, 21 Oct 2015 07:28:00 GMT",
+        })
+        fetcher.fetch(URL)
+        fetcher.fetch(URL)
+
+        headers = fetcher.session.get.call_args.kwargs["headers"]
+        assert headers["If-None-Match"] == '"v1"'
+        assert headers["If-Modified-Since"] == "Wed, 21 Oct 2015 07:28:00 GMT"
+
+    def test_not_modified_returns_stored_body(self, fetcher):
+        """Test that a 304 is reported as unchanged with the previous body."""
+        fetcher.session.get.return_value = make_response(headers={"ETag": '"v1"'})
+        first = fetcher.fetch(URL)
+
+        fetcher.session.get.return_value = make_response(status_code=304, text="")
+        second = fetcher.fetch(URL)
+
+        assert second.changed is False
+        assert second.status_code == 304
+        assert second.html == first.html
+        assert second.content_hash == first.content_hash
+
+    def test_identical_body_is_unchanged(self, fetcher):
+        """Test that a server without validators is deduplicated by content hash."""
+        fetcher.session.get.return_value = make_response()
+        fetcher.fetch(URL)
+        result = fetcher.fetch(URL)
+
+        assert result.changed is False
+
+    def test_different_body_is_changed(self, fetcher):
+        """Test that a new body is reported as changed."""
+        fetcher.session.get.return_value = make_response(text="<html>old</html>")
+        fetcher.fetch(URL)
+        fetcher.session.get.return_value = make_response(text="<html>new</html>")
+        result = fetcher.fetch(URL)
+
+        assert result.changed is True
+        assert result.html == "<html>new</html>"
+
+    def test_http_error_raises(self, fetcher):
+        """Test that error status codes raise."""
+        fetcher.session.get.return_value = make_response(status_code=403)
+
+        with pytest.raises(requests.HTTPError):
+            fetcher.fetch(URL)
+
+    def test_per_host_timeouts(self, fetcher):
+        """Test that per-host timeouts override the default."""
+        assert fetcher.timeout_for("https://cohere.com/pricing") == 5
+        assert fetcher.timeout_for(URL) == 20
+
+        fetcher.session.get.return_value = make_response()
+        fetcher.fetch("https://cohere.com/pricing")
+        assert fetcher.session.get.call_args.kwargs["timeout"] == 5
+
+    def test_session_is_reused(self):
+        """Test that fetches share one keep-alive session."""
+        fetcher = PageFetcher()
+        assert isinstance(fetcher.session, requests.Session)
+        assert fetcher.session.get_adapter(URL) is fetcher.session.get_adapter("https://cohere.com/pricing")
+
+
+class TestParseHostTimeouts:
+    """Test cases for parse_host_timeouts function."""
+
+    def test_parse(self):
+        """Test parsing host=seconds pairs."""
+        assert parse_host_timeouts("cohere.com=5, WWW.Anthropic.com=10") == {
+            "cohere.com": 5.0,
+            "www.anthropic.com": 10.0,
+        }
+
+    def test_empty(self):
+        """Test that an empty value yields no overrides."""
+        assert parse_host_timeouts("") == {}
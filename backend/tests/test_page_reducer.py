@@ -0,0 +1,120 @@
+"""Tests for pricing page reduction."""
+
+from services.page_reducer import (
+    chunk_blocks,
+    estimate_tokens,
+    is_price_relevant,
+    reduce_markdown,
+    split_blocks,
+)
+
+PAGE = """# Acme AI
+
+[Home](/) | [Docs](/docs) | [Blog](/blog)
+
+Build the future with the most trusted AI platform. Our customers love us.
+
+## Claude 3 Opus
+
+Our most intelligent model.
+
+Input: $15 / MTok
+
+Output: $75 / MTok
+
+## Enterprise
+
+Talk to our sales team about custom plans and volume discounts.
+
+## Legacy models
+
+| Model | Input | Output |
+| --- | --- | --- |
+| Claude 2.1 | $8 | $24 |
+
+Copyright 2024 Acme AI. All rights reserved. Privacy policy. Terms of service.
+"""
+
+
+class TestPriceRelevance:
+    """Test cases for price relevance detection."""
+
+    def test_currency_amounts(self):
+        """Test that currency amounts are price-relevant."""
+        assert is_price_relevant("Input: $15 / MTok")
+        assert is_price_relevant("€0.50 per request")
+
+    def test_per_token_phrases(self):
+        """Test that per-1M/1K token phrases are price-relevant."""
+        assert is_price_relevant("0.5 USD per 1M tokens")
+        assert is_price_relevant("billed per 1K tokens")
+        assert is_price_relevant("per million tokens")
+
+    def test_tables(self):
+        """Test that markdown tables are price-relevant."""
+        assert is_price_relevant("| Model | Context |\n| --- | --- |")
+
+    def test_marketing_copy(self):
+        """Test that ordinary prose is not price-relevant."""
+        assert not is_price_relevant("Build the future with the most trusted AI platform.")
+
+
+class TestReduceMarkdown:
+    """Test cases for reduce_markdown function."""
+
+    def test_keeps_price_sections_with_headings(self):
+        """Test that price sections are kept together with their headings."""
+        reduced = "\n\n".join(reduce_markdown(PAGE, token_budget=1000))
+
+        assert "## Claude 3 Opus" in reduced
+        assert "Input: $15 / MTok" in reduced
+        assert "Output: $75 / MTok" in reduced
+        assert "| Claude 2.1 | $8 | $24 |" in reduced
+        assert "## Legacy models" in reduced
+
+    def test_drops_navigation_and_marketing(self):
+        """Test that nav, marketing copy and footers are dropped."""
+        reduced = "\n\n".join(reduce_markdown(PAGE, token_budget=1000))
+
+        assert "[Docs](/docs)" not in reduced
+        assert "most trusted AI platform" not in reduced
+        assert "## Enterprise" not in reduced
+        assert "Copyright" not in reduced
+        assert estimate_tokens(reduced) < estimate_tokens(PAGE)
+
+    def test_chunks_respect_budget(self):
+        """Test that every chunk fits in the token budget."""
+        page = "\n\n".join(f"Model {i}: ${i}.00 / MTok input, ${i * 2}.00 / MTok output" for i in range(200))
+
+        chunks = reduce_markdown(page, token_budget=100)
+
+        assert len(chunks) > 1
+        assert all(estimate_tokens(chunk) <= 100 for chunk in chunks)
+
+    def test_oversized_block_is_split(self):
+        """Test that a single block larger than the budget is split by line."""
+        table = "\n".join(f"| Model {i} | ${i} | ${i * 2} |" for i in range(100))
+
+        chunks = reduce_markdown(table, token_budget=50)
+
+        assert len(chunks) > 1
+        assert all(estimate_tokens(chunk) <= 50 for chunk in chunks)
+        assert "| Model 99 | $99 | $198 |" in chunks[-1]
+
+    def test_no_relevant_content_falls_back_to_page_start(self):
+        """Test that a page without price signals still yields its first chunk."""
+        chunks = reduce_markdown("Welcome\n\nContact us for pricing", token_budget=1000)
+
+        assert chunks == ["Welcome\n\nContact us for pricing"]
+
+
+class TestHelpers:
+    """Test cases for block splitting and chunking helpers."""
+
+    def test_split_blocks_separates_headings(self):
+        """Test that headings become their own blocks."""
+        assert split_blocks("# Title\nBody text\n\nMore") == ["# Title", "Body text", "More"]
+
+    def test_chunk_blocks_empty(self):
+        """Test that no blocks produce no chunks."""
+        assert chunk_blocks([], token_budget=100) == []
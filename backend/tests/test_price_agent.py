@@ -0,0 +1,309 @@
+"""Tests for PriceAgent."""
+
+import hashlib
+import time
+from unittest.mock import patch, Mock
+
+import pytest
+import requests
+
+from services.extraction_cache import ExtractionCache
+from services.page_fetcher import FetchResult, PageFetcher
+from services.price_agent import PriceAgent
+from models.price_data import PriceData
+
+HAIKU_RESPONSE = '{"prices": [{"model": "Claude 3 Haiku", "input_price_per_1m": 0.25, "output_price_per_1m": 1.25}]}'
+
+
+class TestPriceAgent:
+    """Test cases for PriceAgent."""
+
+    @pytest.fixture
+    def providers(self):
+        """A set of fake providers to fan out over."""
+        return {
+            "Alpha": "https://alpha.example.com/pricing",
+            "Beta": "https://beta.example.com/pricing",
+            "Gamma": "https://gamma.example.com/pricing",
+        }
+
+    def test_parse_prices_from_json_string(self):
+        """Test parsing a JSON response into PriceData objects."""
+        agent = PriceAgent()
+        response = '{"prices": [{"model": "Command R", "input_price_per_1m": 0.5, "output_price_per_1m": 1.5}]}'
+
+        prices = agent._parse_prices(response, default_provider="Cohere")
+
+        assert len(prices) == 1
+        assert prices[0].display_name == "Command R"
+        assert prices[0].provider == "Cohere"
+        assert prices[0].output_price_per_1m == 1.5
+
+    def test_parse_prices_invalid_json(self):
+        """Test that an unparseable response yields no prices."""
+        agent = PriceAgent()
+        assert agent._parse_prices("not json") == []
+
+    def test_fetch_prices_dispatches_on_mode(self):
+        """Test that agent mode runs the single monolithic agent."""
+        agent = PriceAgent(mode="agent")
+        with patch.object(agent, '_fetch_prices_with_agent', return_value=[]) as mock_agent_run, \
+             patch.object(agent, '_fetch_prices_fan_out') as mock_fan_out:
+            agent.fetch_prices()
+
+        mock_agent_run.assert_called_once()
+        mock_fan_out.assert_not_called()
+
+    def test_fan_out_merges_providers(self, providers):
+        """Test that per-provider results are merged into one list."""
+        agent = PriceAgent(mode="fan_out")
+
+        def fetch_provider_prices(provider_name, provider_pricing_url):
+            return [PriceData(f"{provider_name} Model", provider_name, 1.0, 2.0)]
+
+        with patch.dict('services.price_agent.PROVIDER_PRICING_PAGES', providers, clear=True), \
+             patch.object(agent, 'fetch_provider_prices', side_effect=fetch_provider_prices):
+            prices = agent.fetch_prices()
+
+        assert sorted(price.provider for price in prices) == ["Alpha", "Beta", "Gamma"]
+
+    def test_fan_out_drops_only_failed_provider(self, providers):
+        """Test that a failing provider does not affect the others."""
+        agent = PriceAgent(mode="fan_out")
+
+        def fetch_provider_prices(provider_name, provider_pricing_url):
+            if provider_name == "Beta":
+                raise RuntimeError("Error: HTTP 503 when fetching Beta pricing page")
+            return [PriceData(f"{provider_name} Model", provider_name, 1.0, 2.0)]
+
+        with patch.dict('services.price_agent.PROVIDER_PRICING_PAGES', providers, clear=True), \
+             patch.object(agent, 'fetch_provider_prices', side_effect=fetch_provider_prices):
+            prices = agent.fetch_prices()
+
+        assert sorted(price.provider for price in prices) == ["Alpha", "Gamma"]
+
+    def test_fan_out_wall_clock_tracks_slowest_provider(self, providers):
+        """Test that providers are extracted concurrently rather than one after another."""
+        agent = PriceAgent(mode="fan_out", max_concurrency=len(providers))
+
+        def fetch_provider_prices(provider_name, provider_pricing_url):
+            time.sleep(0.3)
+            return []
+
+        with patch.dict('services.price_agent.PROVIDER_PRICING_PAGES', providers, clear=True), \
+             patch.object(agent, 'fetch_provider_prices', side_effect=fetch_provider_prices):
+            start = time.perf_counter()
+            agent.fetch_prices()
+            elapsed = time.perf_counter() - start
+
+        assert elapsed < 0.3 * len(providers) * 0.75
+
+    @pytest.fixture
+    def fetch_result(self):
+        """Build a FetchResult for the Anthropic pricing page."""
+        def build(html, changed=True):
+            return FetchResult(
+                url="https://www.anthropic.com/pricing",
+                status_code=200 if changed else 304,
+                html=html,
+                content_hash=hashlib.sha256(html.encode()).hexdigest(),
+                changed=changed,
+            )
+        return build
+
+    def test_fetch_provider_prices_uses_page_content(self, fetch_result):
+        """Test that a single provider is extracted from its own page."""
+        agent = PriceAgent(fetcher=Mock())
+        agent.fetcher.fetch.return_value = fetch_result("<table><tr><td>Haiku</td><td>$0.25 / MTok</td></tr></table>")
+        agent.model = Mock(return_value=Mock(content=HAIKU_RESPONSE))
+
+        prices = agent.fetch_provider_prices("Anthropic", "https://www.anthropic.com/pricing")
+
+        assert len(prices) == 1
+        assert prices[0].provider == "Anthropic"
+        prompt = agent.model.call_args[0][0][0]["content"]
+        assert "$0.25 / MTok" in prompt
+
+    def test_fetch_provider_prices_raises_on_fetch_error(self):
+        """Test that a failed page fetch is reported as a provider failure."""
+        agent = PriceAgent(fetcher=Mock())
+        agent.fetcher.fetch.side_effect = requests.ConnectionError("connection refused")
+        agent.model = Mock()
+
+        with pytest.raises(requests.RequestException):
+            agent.fetch_provider_prices("Anthropic", "https://www.anthropic.com/pricing")
+
+        agent.model.assert_not_called()
+
+    def test_unchanged_page_skips_conversion_and_llm(self, fetch_result):
+        """Test that an unchanged page reuses the previous prices."""
+        agent = PriceAgent(fetcher=Mock())
+        agent.model = Mock(return_value=Mock(content=HAIKU_RESPONSE))
+        agent.fetcher.fetch.return_value = fetch_result("<p>Haiku $0.25</p>")
+        agent.fetch_provider_prices("Anthropic", "https://www.anthropic.com/pricing")
+
+        agent.fetcher.fetch.return_value = fetch_result("<p>Haiku $0.25</p>", changed=False)
+        with patch('services.price_agent.html_to_markdown') as mock_markdown:
+            prices = agent.fetch_provider_prices("Anthropic", "https://www.anthropic.com/pricing")
+
+        mock_markdown.assert_not_called()
+        assert agent.model.call_count == 1
+        assert len(prices) == 1
+        assert prices[0].display_name == "Claude 3 Haiku"
+        assert prices[0].input_price_per_1m == 0.25
+
+    def test_failed_extraction_is_retried_on_unchanged_page(self):
+        """Test that prices from an older page are not reused after extracting a newer one failed."""
+        fetcher = PageFetcher()
+        agent = PriceAgent(fetcher=fetcher, extraction_cache=ExtractionCache(":memory:"))
+        agent.model = Mock(return_value=Mock(content=HAIKU_RESPONSE))
+        pages = iter(["<p>Haiku $0.25</p>", "<p>Haiku $5</p>", "<p>Haiku $5</p>"])
+
+        def get(url, headers, timeout):
+            return Mock(status_code=200, text=next(pages), headers={"ETag": '"v"'}, raise_for_status=Mock())
+
+        with patch.object(fetcher.session, 'get', side_effect=get) as mock_get:
+            agent.fetch_provider_prices("Anthropic", "https://www.anthropic.com/pricing")
+
+            agent.model.side_effect = TimeoutError("LLM timed out")
+            with pytest.raises(TimeoutError):
+                agent.fetch_provider_prices("Anthropic", "https://www.anthropic.com/pricing")
+
+            agent.model.side_effect = None
+            agent.model.return_value = Mock(content=HAIKU_RESPONSE.replace("0.25", "5.0"))
+            prices = agent.fetch_provider_prices("Anthropic", "https://www.anthropic.com/pricing")
+
+        # The page was fetched without validators after the failure, and extracted again
+        assert "If-None-Match" not in mock_get.call_args.kwargs["headers"]
+        assert agent.get_metrics()["providers"]["Anthropic"]["path"] == "llm"
+        assert prices[0].input_price_per_1m == 5.0
+
+    def test_unchanged_page_without_previous_prices_is_extracted(self, fetch_result):
+        """Test that an unchanged page is still extracted if nothing was extracted before."""
+        agent = PriceAgent(fetcher=Mock())
+        agent.model = Mock(return_value=Mock(content=HAIKU_RESPONSE))
+        agent.fetcher.fetch.return_value = fetch_result("<p>Haiku $0.25</p>", changed=False)
+
+        prices = agent.fetch_provider_prices("Anthropic", "https://www.anthropic.com/pricing")
+
+        assert agent.model.call_count == 1
+        assert len(prices) == 1
+
+    def test_registered_extractor_skips_llm(self, fetch_result):
+        """Test that a validating extractor handles the provider without the LLM."""
+        agent = PriceAgent(fetcher=Mock())
+        agent.model = Mock()
+        agent.fetcher.fetch.return_value = fetch_result(
+            "<table><tr><th>Model</th><th>Input</th><th>Output</th></tr>"
+            "<tr><td>Claude 3 Haiku</td><td>$0.25 / MTok</td><td>$1.25 / MTok</td></tr></table>"
+        )
+
+        prices = agent.fetch_provider_prices("Anthropic", "https://www.anthropic.com/pricing")
+
+        agent.model.assert_not_called()
+        assert len(prices) == 1
+        assert prices[0].output_price_per_1m == 1.25
+        metrics = agent.get_metrics()
+        assert metrics["providers"]["Anthropic"]["path"] == "extractor"
+        assert metrics["extraction_paths"]["extractor"] == 1
+
+    def test_invalid_extractor_output_falls_back_to_llm(self, fetch_result):
+        """Test that the LLM is used when the extractor output does not validate."""
+        agent = PriceAgent(fetcher=Mock())
+        agent.model = Mock(return_value=Mock(content=HAIKU_RESPONSE))
+        agent.fetcher.fetch.return_value = fetch_result("<p>Claude 3 Haiku costs $0.25 / MTok</p>")
+
+        prices = agent.fetch_provider_prices("Anthropic", "https://www.anthropic.com/pricing")
+
+        assert agent.model.call_count == 1
+        assert len(prices) == 1
+        assert agent.get_metrics()["providers"]["Anthropic"]["path"] == "llm"
+
+    def test_provider_without_extractor_uses_llm(self, fetch_result):
+        """Test that providers without a registered extractor go to the LLM."""
+        agent = PriceAgent(fetcher=Mock())
+        agent.model = Mock(return_value=Mock(content=HAIKU_RESPONSE))
+        agent.fetcher.fetch.return_value = fetch_result(
+            "<table><tr><th>Model</th><th>Input</th><th>Output</th></tr>"
+            "<tr><td>Some Model</td><td>$1 / MTok</td><td>$2 / MTok</td></tr></table>"
+        )
+
+        agent.fetch_provider_prices("Example", "https://example.com/pricing")
+
+        assert agent.model.call_count == 1
+        assert agent.get_metrics()["extraction_paths"] == {"extractor": 0, "cache": 0, "llm": 1, "unchanged": 0}
+
+    def test_llm_receives_reduced_page_and_records_tokens(self, fetch_result):
+        """Test that only price-relevant sections reach the LLM and token counts are recorded."""
+        agent = PriceAgent(fetcher=Mock())
+        agent.model = Mock(return_value=Mock(content=HAIKU_RESPONSE))
+        html = (
+            "<nav>" + "<a href='/'>Home</a> " * 200 + "</nav>"
+            "<h2>Claude 3 Haiku</h2><p>Input: $0.25 / MTok</p>"
+            "<footer>" + "Copyright notice. " * 200 + "</footer>"
+        )
+        agent.fetcher.fetch.return_value = fetch_result(html)
+
+        agent.fetch_provider_prices("Example", "https://example.com/pricing")
+
+        prompt = agent.model.call_args[0][0][0]["content"]
+        assert "Input: $0.25 / MTok" in prompt
+        assert "Copyright notice" not in prompt
+        metrics = agent.get_metrics()
+        provider_metrics = metrics["providers"]["Example"]
+        assert provider_metrics["chunks"] == 1
+        assert provider_metrics["tokens_after_reduction"] < provider_metrics["tokens_before_reduction"]
+        assert metrics["llm_tokens"]["before_reduction"] == provider_metrics["tokens_before_reduction"]
+
+    def test_llm_called_per_chunk_and_results_merged(self, fetch_result):
+        """Test that each chunk is extracted and duplicate models are merged."""
+        agent = PriceAgent(fetcher=Mock(), token_budget=40)
+        agent.model = Mock(side_effect=[
+            Mock(content=HAIKU_RESPONSE),
+            Mock(content='{"prices": [{"model": "Claude 3 Haiku", "input_price_per_1m": 9, "output_price_per_1m": 9},'
+                         ' {"model": "Claude 3 Opus", "input_price_per_1m": 15, "output_price_per_1m": 75}]}'),
+        ])
+        html = "".join(f"<p>Model number {i} costs ${i}.00 per 1M tokens of input</p>" for i in range(6))
+        agent.fetcher.fetch.return_value = fetch_result(html)
+
+        prices = agent.fetch_provider_prices("Example", "https://example.com/pricing")
+
+        assert agent.model.call_count == 2
+        assert [p.display_name for p in prices] == ["Claude 3 Haiku", "Claude 3 Opus"]
+        assert prices[0].input_price_per_1m == 0.25
+
+    def test_cached_extraction_skips_llm(self, fetch_result):
+        """Test that a page extracted before is served from the extraction cache."""
+        cache = ExtractionCache(":memory:")
+        html = "<h2>Claude 3 Haiku</h2><p>Input: $0.25 / MTok</p>"
+
+        first = PriceAgent(fetcher=Mock(), extraction_cache=cache)
+        first.model = Mock(return_value=Mock(content=HAIKU_RESPONSE))
+        first.fetcher.fetch.return_value = fetch_result(html)
+        first.fetch_provider_prices("Example", "https://example.com/pricing")
+
+        # A fresh agent (e.g. after a restart) has no in-memory state, only the cache
+        second = PriceAgent(fetcher=Mock(), extraction_cache=cache)
+        second.model = Mock()
+        second.fetcher.fetch.return_value = fetch_result(html)
+        prices = second.fetch_provider_prices("Example", "https://example.com/pricing")
+
+        second.model.assert_not_called()
+        assert len(prices) == 1
+        assert prices[0].display_name == "Claude 3 Haiku"
+        metrics = second.get_metrics()
+        assert metrics["providers"]["Example"]["path"] == "cache"
+        assert metrics["extraction_cache"]["hits"] == 1
+        assert metrics["llm_tokens"] == {"before_reduction": 0, "after_reduction": 0}
+
+    def test_changed_page_misses_cache(self, fetch_result):
+        """Test that new page content goes to the LLM."""
+        agent = PriceAgent(fetcher=Mock(), extraction_cache=ExtractionCache(":memory:"))
+        agent.model = Mock(return_value=Mock(content=HAIKU_RESPONSE))
+        agent.fetcher.fetch.return_value = fetch_result("<p>Input: $0.25 / MTok</p>")
+        agent.fetch_provider_prices("Example", "https://example.com/pricing")
+        agent.fetcher.fetch.return_value = fetch_result("<p>Input: $0.30 / MTok</p>")
+        agent.fetch_provider_prices("Example", "https://example.com/pricing")
+
+        assert agent.model.call_count == 2
+        assert agent.get_metrics()["extraction_cache"]["misses"] == 2
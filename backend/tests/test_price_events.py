@@ -0,0 +1,108 @@
+"""Tests for price update propagation between processes."""
+
+import asyncio
+from contextlib import suppress
+from unittest.mock import AsyncMock, Mock
+
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from services.price_events import PriceEventSubscriber, notify_statement, write_lock_statement
+
+
+def make_engine(dialect_name: str) -> Mock:
+    engine = Mock()
+    engine.dialect.name = dialect_name
+    return engine
+
+
+async def run_for(subscriber: PriceEventSubscriber, seconds: float):
+    task = asyncio.create_task(subscriber.run())
+    await asyncio.sleep(seconds)
+    task.cancel()
+    with suppress(asyncio.CancelledError):
+        await task
+
+
+class TestPriceEventSubscriber:
+    """Test cases for PriceEventSubscriber."""
+
+    @pytest.mark.asyncio
+    async def test_polls_without_listen(self):
+        """Test that SQLite deployments reload on every poll interval."""
+        on_update = AsyncMock()
+        subscriber = PriceEventSubscriber(make_engine("sqlite"), on_update, poll_interval=0.01)
+
+        await run_for(subscriber, 0.1)
+
+        assert on_update.await_count >= 2
+
+    @pytest.mark.asyncio
+    async def test_notification_wakes_subscriber(self):
+        """Test that a notification triggers a reload without waiting for the poll interval."""
+        on_update = AsyncMock()
+        subscriber = PriceEventSubscriber(make_engine("sqlite"), on_update, poll_interval=60)
+        task = asyncio.create_task(subscriber.run())
+        await asyncio.sleep(0.01)
+
+        subscriber._on_notify(None, 1234, subscriber.channel, "7")
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with suppress(asyncio.CancelledError):
+            await task
+
+        on_update.assert_awaited_once()
+        assert subscriber.notifications == 1
+
+    @pytest.mark.asyncio
+    async def test_listens_on_postgresql(self):
+        """Test that PostgreSQL subscribers LISTEN on a dedicated connection and release it when stopped."""
+        driver_conn = Mock(add_listener=AsyncMock(), remove_listener=AsyncMock(), is_closed=Mock(return_value=False))
+        conn = Mock(get_raw_connection=AsyncMock(return_value=Mock(driver_connection=driver_conn)), close=AsyncMock())
+        engine = make_engine("postgresql")
+        engine.connect = AsyncMock(return_value=conn)
+        on_update = AsyncMock()
+        subscriber = PriceEventSubscriber(engine, on_update, channel="prices", poll_interval=0.01)
+
+        await run_for(subscriber, 0.05)
+
+        driver_conn.add_listener.assert_awaited_once_with("prices", subscriber._on_notify)
+        # Listening stretches the fallback poll interval
+        on_update.assert_not_awaited()
+        driver_conn.remove_listener.assert_awaited_once()
+        conn.close.assert_awaited_once()
+
+    @pytest.mark.asyncio
+    async def test_falls_back_to_polling_when_listen_fails(self):
+        """Test that a failed LISTEN leaves the subscriber polling without retrying every interval."""
+        engine = make_engine("postgresql")
+        engine.connect = AsyncMock(side_effect=OSError("connection refused"))
+        on_update = AsyncMock()
+        subscriber = PriceEventSubscriber(engine, on_update, poll_interval=0.01)
+
+        await run_for(subscriber, 0.1)
+
+        assert on_update.await_count >= 2
+        engine.connect.assert_awaited_once()
+
+    @pytest.mark.asyncio
+    async def test_update_errors_keep_subscribing(self):
+        """Test that a failed reload does not stop the subscriber."""
+        on_update = AsyncMock(side_effect=[RuntimeError("database is locked"), None, None, None, None, None])
+        subscriber = PriceEventSubscriber(make_engine("sqlite"), on_update, poll_interval=0.01)
+
+        await run_for(subscriber, 0.05)
+
+        assert on_update.await_count >= 2
+
+
+def test_notify_statement():
+    """Test that the notification carries the generation on the configured channel."""
+    sql = str(notify_statement(42, "prices").compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}))
+    assert sql == "SELECT pg_notify('prices', '42') AS pg_notify_1"
+
+
+def test_write_lock_statement():
+    """Test that price writes take a transaction-scoped advisory lock."""
+    sql = str(write_lock_statement(7).compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}))
+    assert sql == "SELECT pg_advisory_xact_lock(7) AS pg_advisory_xact_lock_1"
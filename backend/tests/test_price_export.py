@@ -0,0 +1,81 @@
+"""Tests for the price history export encoders."""
+
+import csv
+import io
+import json
+from datetime import datetime
+
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from services.price_export import EXPORT_COLUMNS, ParquetEncoder, encode_csv, encode_export, encode_ndjson, export_statement
+
+ROWS = [
+    ("gpt-4", "GPT-4", "OpenAI", 30.0, 60.0, datetime(2024, 1, 1), datetime(2024, 1, 2), datetime(2024, 1, 2)),
+    ("gpt-4", "GPT-4", "Azure", 30.0, 60.0, datetime(2024, 1, 1), None, datetime(2024, 1, 3)),
+]
+
+
+async def batches(*items):
+    for item in items:
+        yield item
+
+
+class TestEncoders:
+    """Test cases for the export encoders."""
+
+    def test_ndjson(self):
+        """Test that each row becomes one JSON object with UTC timestamps."""
+        lines = encode_ndjson(ROWS).decode().splitlines()
+
+        assert len(lines) == 2
+        record = json.loads(lines[1])
+        assert list(record) == list(EXPORT_COLUMNS)
+        assert record["valid_from"] == "2024-01-01T00:00:00Z"
+        assert record["valid_to"] is None
+
+    async def test_csv_has_one_header(self):
+        """Test that a CSV export across several batches has a single header row."""
+        body = b"".join([chunk async for chunk in encode_export(batches(ROWS[:1], ROWS[1:]), "csv")])
+
+        records = list(csv.DictReader(io.StringIO(body.decode())))
+        assert [record["provider"] for record in records] == ["OpenAI", "Azure"]
+        assert records[1]["valid_to"] == ""
+
+    async def test_empty_csv_is_header_only(self):
+        """Test that an export without rows still names its columns."""
+        body = b"".join([chunk async for chunk in encode_export(batches(), "csv")])
+        assert body == encode_csv([], header=True)
+
+    async def test_parquet_round_trip(self):
+        """Test that batches become row groups of one Parquet file."""
+        pq = pytest.importorskip("pyarrow.parquet")
+        body = b"".join([chunk async for chunk in encode_export(batches(ROWS[:1], ROWS[1:]), "parquet")])
+
+        parquet = pq.ParquetFile(io.BytesIO(body))
+        assert parquet.metadata.num_row_groups == 2
+        table = parquet.read()
+        assert table.column("provider").to_pylist() == ["OpenAI", "Azure"]
+        assert table.column("valid_to").to_pylist()[1] is None
+
+    def test_parquet_encoder_requires_pyarrow(self):
+        """Test that the Parquet encoder fails clearly without pyarrow."""
+        try:
+            import pyarrow  # noqa: F401
+            pytest.skip("pyarrow is installed")
+        except ImportError:
+            pass
+        with pytest.raises(ImportError):
+            ParquetEncoder()
+
+
+def test_export_statement_filters():
+    """Test that filters apply to the normalized model, provider case-insensitively and the time range."""
+    sql = str(export_statement("GPT-4", "openai", datetime(2024, 1, 1), datetime(2024, 2, 1))
+              .compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}))
+
+    assert "price_data.normalized_id = 'gpt-4'" in sql
+    assert "lower(price_data.provider) = 'openai'" in sql
+    assert "price_data.timestamp >= '2024-01-01 00:00:00'" in sql
+    assert "coalesce(price_data.valid_from, price_data.timestamp) <= '2024-02-01 00:00:00'" in sql
+    assert sql.endswith("ORDER BY price_data.normalized_id, price_data.provider, price_data.timestamp")
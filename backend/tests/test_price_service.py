@@ -1,26 +1,31 @@
 """Tests for PriceService."""
 
+import asyncio
+import time
+
 import pytest
-from unittest.mock import patch, AsyncMock
-from datetime import datetime, timezone
+from unittest.mock import patch, AsyncMock, Mock
+from sqlalchemy import event
+from sqlalchemy.dialects import postgresql
+from datetime import datetime, timedelta, timezone
 
+from services.leader import FileLockLeader
 from services.price_service import PriceService
-from models.price_data import PriceData
+from models.price_data import ModelCatalog, PriceDailyRollup, PriceData
 
 
 class TestPriceService:
     """Test cases for PriceService."""
     
     @pytest.fixture
-    def mock_price_service(self, mock_price_agent):
+    def mock_price_service(self, mock_price_agent, tmp_path):
         """Create a PriceService with mocked dependencies."""
-        with patch('services.price_service.init_db'), \
-             patch('services.price_service.asyncio.create_task'):
-            service = PriceService()
-            service.agent = mock_price_agent
-            return service
+        service = PriceService()
+        service.agent = mock_price_agent
+        service.leader = FileLockLeader(str(tmp_path / "leader.lock"))
+        return service
     
-    def test_update_cache(self, mock_price_service, sample_price_data):
+    def test_update_store(self, mock_price_service, sample_price_data):
         """Test cache update functionality."""
         price = PriceData(
             model=sample_price_data["model"],
@@ -29,10 +34,10 @@ class TestPriceService:
             output_price_per_1m=sample_price_data["output_price_per_1m"]
         )
         
-        mock_price_service._update_cache([price])
+        mock_price_service._update_store([price])
         
-        assert len(mock_price_service.cache) == 1
-        cached_price = mock_price_service.cache[price.normalized_id]
+        assert len(mock_price_service.store) == 1
+        cached_price = mock_price_service.store.get("GPT-4", "OpenAI")
         assert cached_price["model"] == "GPT-4"
         assert cached_price["provider"] == "OpenAI"
         assert cached_price["input_price_per_1m"] == 30.0
@@ -40,13 +45,7 @@ class TestPriceService:
     
     def test_get_all_prices(self, mock_price_service):
         """Test getting all prices from cache."""
-        mock_price_service.cache["gpt-4"] = {
-            "model": "GPT-4",
-            "provider": "OpenAI",
-            "input_price_per_1m": 30.0,
-            "output_price_per_1m": 60.0,
-            "last_updated": datetime.now(timezone.utc)
-        }
+        mock_price_service._update_store([PriceData("GPT-4", "OpenAI", 30.0, 60.0)])
         
         prices = mock_price_service.get_all_prices()
         assert len(prices) == 1
@@ -54,20 +53,8 @@ class TestPriceService:
     
     def test_get_prices_by_provider(self, mock_price_service):
         """Test filtering prices by provider."""
-        mock_price_service.cache["gpt-4"] = {
-            "model": "GPT-4",
-            "provider": "OpenAI",
-            "input_price_per_1m": 30.0,
-            "output_price_per_1m": 60.0,
-            "last_updated": datetime.now(timezone.utc)
-        }
-        mock_price_service.cache["claude-2"] = {
-            "model": "Claude 2",
-            "provider": "Anthropic",
-            "input_price_per_1m": 25.0,
-            "output_price_per_1m": 50.0,
-            "last_updated": datetime.now(timezone.utc)
-        }
+        mock_price_service._update_store([PriceData("GPT-4", "OpenAI", 30.0, 60.0)])
+        mock_price_service._update_store([PriceData("Claude 2", "Anthropic", 25.0, 50.0)])
         
         openai_prices = mock_price_service.get_prices_by_provider("OpenAI")
         assert len(openai_prices) == 1
@@ -79,13 +66,7 @@ class TestPriceService:
     
     def test_get_prices_by_provider_case_insensitive(self, mock_price_service):
         """Test that provider filtering is case insensitive."""
-        mock_price_service.cache["gpt-4"] = {
-            "model": "GPT-4",
-            "provider": "OpenAI",
-            "input_price_per_1m": 30.0,
-            "output_price_per_1m": 60.0,
-            "last_updated": datetime.now(timezone.utc)
-        }
+        mock_price_service._update_store([PriceData("GPT-4", "OpenAI", 30.0, 60.0)])
         
         prices = mock_price_service.get_prices_by_provider("openai")
         assert len(prices) == 1
@@ -93,13 +74,7 @@ class TestPriceService:
     
     def test_get_price_by_model(self, mock_price_service):
         """Test getting prices for a specific model."""
-        mock_price_service.cache["gpt-4"] = {
-            "model": "GPT-4",
-            "provider": "OpenAI",
-            "input_price_per_1m": 30.0,
-            "output_price_per_1m": 60.0,
-            "last_updated": datetime.now(timezone.utc)
-        }
+        mock_price_service._update_store([PriceData("GPT-4", "OpenAI", 30.0, 60.0)])
         
         prices = mock_price_service.get_price_by_model("GPT-4")
         assert len(prices) == 1
@@ -110,13 +85,7 @@ class TestPriceService:
     
     def test_get_price_by_model_with_special_characters(self, mock_price_service):
         """Test model lookup with special characters."""
-        mock_price_service.cache["gpt-4_turbo_"] = {
-            "model": "GPT-4 Turbo+",
-            "provider": "OpenAI",
-            "input_price_per_1m": 35.0,
-            "output_price_per_1m": 70.0,
-            "last_updated": datetime.now(timezone.utc)
-        }
+        mock_price_service._update_store([PriceData("GPT-4 Turbo+", "OpenAI", 35.0, 70.0)])
         
         prices = mock_price_service.get_price_by_model("GPT-4 Turbo+")
         assert len(prices) == 1
@@ -136,5 +105,828 @@ class TestPriceService:
         with patch.object(mock_price_service, '_store_historical_prices', new_callable=AsyncMock):
             await mock_price_service.refresh_prices()
         
-        assert len(mock_price_service.cache) == 1
+        assert len(mock_price_service.store) == 1
         assert mock_price_service.agent.fetch_prices.called
+    
+    @pytest.mark.asyncio
+    async def test_refresh_prices_bumps_generation(self, mock_price_service):
+        """Test that a refresh that stores prices starts a new data generation."""
+        mock_price_service.agent.fetch_prices.return_value = [PriceData("GPT-4", "OpenAI", 30.0, 60.0)]
+        generation = mock_price_service.generation
+
+        with patch.object(mock_price_service, '_store_historical_prices', new_callable=AsyncMock):
+            await mock_price_service.refresh_prices()
+        await mock_price_service.shutdown()
+
+        assert mock_price_service.generation == generation + 1
+
+    @pytest.mark.asyncio
+    async def test_refresh_prices_runs_off_event_loop(self, mock_price_service):
+        """Test that the agent runs on the refresh executor, not the event loop thread."""
+        import threading
+        calling_threads = []
+
+        def fetch_prices():
+            calling_threads.append(threading.current_thread().name)
+            return []
+
+        mock_price_service.agent.fetch_prices.side_effect = fetch_prices
+
+        with patch.object(mock_price_service, '_store_historical_prices', new_callable=AsyncMock):
+            await mock_price_service.refresh_prices()
+        await mock_price_service.shutdown()
+
+        assert calling_threads[0].startswith("price-refresh")
+    
+    @pytest.mark.asyncio
+    async def test_refresh_prices_timeout(self, mock_price_service):
+        """Test that a refresh exceeding the timeout is abandoned."""
+        mock_price_service.refresh_timeout = 0.05
+        mock_price_service.agent.fetch_prices.side_effect = lambda: time.sleep(0.5) or []
+
+        with patch.object(mock_price_service, '_store_historical_prices', new_callable=AsyncMock) as mock_store:
+            with pytest.raises(asyncio.TimeoutError):
+                await mock_price_service.refresh_prices()
+        await mock_price_service.shutdown()
+
+        mock_store.assert_not_called()
+        assert len(mock_price_service.store) == 0
+
+    @pytest.mark.asyncio
+    async def test_interval_mode_stores_only_changes(self, mock_price_service, test_db):
+        """Test that unchanged prices extend the current row instead of adding rows."""
+        mock_price_service.history_mode = "interval"
+
+        await mock_price_service._store_historical_prices([PriceData("GPT-4", "OpenAI", 30.0, 60.0)])
+        await mock_price_service._store_historical_prices([PriceData("GPT-4", "OpenAI", 30.0, 60.0)])
+
+        db = test_db()
+        rows = db.query(PriceData).all()
+        assert len(rows) == 1
+        assert rows[0].valid_to is None
+        assert rows[0].timestamp > rows[0].valid_from
+        db.close()
+
+        await mock_price_service._store_historical_prices([PriceData("GPT-4", "OpenAI", 25.0, 50.0)])
+
+        db = test_db()
+        rows = db.query(PriceData).order_by(PriceData.valid_from).all()
+        assert [(r.input_price_per_1m, r.valid_to is None) for r in rows] == [(30.0, False), (25.0, True)]
+        assert rows[0].valid_to == rows[1].valid_from
+        db.close()
+
+    @pytest.mark.asyncio
+    async def test_interval_mode_tracks_providers_separately(self, mock_price_service, test_db):
+        """Test that the same model from two providers keeps two current rows."""
+        mock_price_service.history_mode = "interval"
+        prices = [PriceData("GPT-4", "OpenAI", 30.0, 60.0), PriceData("GPT-4", "Azure", 32.0, 64.0)]
+
+        await mock_price_service._store_historical_prices(prices)
+        await mock_price_service._store_historical_prices(prices)
+
+        db = test_db()
+        assert db.query(PriceData).filter(PriceData.valid_to.is_(None)).count() == 2
+        db.close()
+
+    @pytest.mark.asyncio
+    async def test_snapshot_mode_stores_every_observation(self, mock_price_service, test_db):
+        """Test that snapshot mode keeps one row per refresh."""
+        mock_price_service.history_mode = "snapshot"
+
+        await mock_price_service._store_historical_prices([PriceData("GPT-4", "OpenAI", 30.0, 60.0)])
+        await mock_price_service._store_historical_prices([PriceData("GPT-4", "OpenAI", 30.0, 60.0)])
+
+        db = test_db()
+        rows = db.query(PriceData).all()
+        assert len(rows) == 2
+        assert all(row.valid_from == row.timestamp == row.valid_to for row in rows)
+        db.close()
+
+    async def test_price_history_expands_intervals(self, mock_price_service, test_db):
+        """Test that interval rows are expanded to points and clipped to the range."""
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        db = test_db()
+        old = PriceData("GPT-4", "OpenAI", 30.0, 60.0)
+        old.valid_from, old.timestamp, old.valid_to = now - timedelta(days=40), now - timedelta(days=10), now - timedelta(days=9)
+        current = PriceData("GPT-4", "OpenAI", 25.0, 50.0)
+        current.valid_from, current.timestamp, current.valid_to = now - timedelta(days=9), now - timedelta(minutes=5), None
+        db.add_all([old, current])
+        mock_price_service._update_store([current])
+        db.commit()
+        db.close()
+
+        history = await mock_price_service.get_price_history("GPT-4", days=30)
+
+        points = history[0]["prices"]
+        assert [p["input_price_per_1m"] for p in points] == [30.0, 30.0, 25.0, 25.0]
+        start = datetime.fromisoformat(history[0]["time_range"]["start"])
+        assert datetime.fromisoformat(points[0]["timestamp"]) == start
+        assert datetime.fromisoformat(points[1]["timestamp"]) == (now - timedelta(days=10)).replace(tzinfo=timezone.utc)
+
+    async def test_price_history_excludes_intervals_outside_range(self, mock_price_service, test_db):
+        """Test that intervals that ended before the range are not returned."""
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        db = test_db()
+        old = PriceData("GPT-4", "OpenAI", 30.0, 60.0)
+        old.valid_from, old.timestamp, old.valid_to = now - timedelta(days=60), now - timedelta(days=40), now - timedelta(days=39)
+        db.add(old)
+        mock_price_service._update_store([old])
+        db.commit()
+        db.close()
+
+        history = await mock_price_service.get_price_history("GPT-4", days=30)
+
+        assert history[0]["prices"] == []
+
+    @pytest.mark.asyncio
+    async def test_snapshot_refresh_is_one_bulk_statement(self, mock_price_service, test_db):
+        """Test that a whole refresh is inserted in one statement with one timestamp."""
+        mock_price_service.history_mode = "snapshot"
+        prices = [PriceData(f"Model {i}", "OpenAI", float(i), float(i * 2)) for i in range(50)]
+        inserts = []
+
+        def count_inserts(conn, cursor, statement, parameters, context, executemany):
+            if statement.startswith("INSERT INTO price_data "):
+                inserts.append(executemany)
+
+        engine = test_db.kw["bind"]
+        event.listen(engine, "before_cursor_execute", count_inserts)
+        try:
+            await mock_price_service._store_historical_prices(prices)
+        finally:
+            event.remove(engine, "before_cursor_execute", count_inserts)
+
+        assert inserts == [True]
+        db = test_db()
+        assert db.query(PriceData).count() == 50
+        assert len({row.timestamp for row in db.query(PriceData)}) == 1
+        db.close()
+
+    @pytest.mark.asyncio
+    async def test_interval_refresh_with_shared_model_names(self, mock_price_service, test_db):
+        """Test that one timestamp per refresh still gives unique ids across providers."""
+        mock_price_service.history_mode = "interval"
+        prices = [PriceData("GPT-4", provider, 30.0, 60.0) for provider in ("OpenAI", "Azure", "AWS Bedrock")]
+
+        await mock_price_service._store_historical_prices(prices)
+
+        db = test_db()
+        assert db.query(PriceData).count() == 3
+        db.close()
+
+    async def test_postgresql_writes_hold_write_lock(self, mock_price_service):
+        """Test that a PostgreSQL history write locks before its first read and notifies last."""
+        db = Mock()
+        db.get_bind.return_value.dialect.name = "postgresql"
+
+        def get_db():
+            yield db
+
+        def store_intervals(*args):
+            # Only the lock has run before the open intervals are read
+            assert db.execute.call_count == 1
+            return 1
+
+        with patch('services.price_service.get_db', get_db), \
+             patch.object(mock_price_service, '_store_intervals', side_effect=store_intervals), \
+             patch.object(mock_price_service, '_update_daily_rollup'), \
+             patch.object(mock_price_service, '_update_model_catalog', return_value=5):
+            await mock_price_service._store_historical_prices([PriceData("GPT-4", "OpenAI", 30.0, 60.0)])
+
+        statements = [str(call[0][0].compile(dialect=postgresql.dialect())) for call in db.execute.call_args_list]
+        assert "pg_advisory_xact_lock" in statements[0]
+        assert "pg_notify" in statements[-1]
+        db.commit.assert_called_once()
+        assert mock_price_service.catalog_generation == 5
+
+    async def test_contended_write_lock_leaves_loop_responsive(self, mock_price_service):
+        """Test that waiting for the PostgreSQL write lock held by another process does not block the event loop."""
+        mock_price_service.agent.fetch_prices.return_value = [PriceData("GPT-4", "OpenAI", 30.0, 60.0)]
+        db = Mock()
+        db.get_bind.return_value.dialect.name = "postgresql"
+
+        def execute(statement, *args):
+            if "pg_advisory_xact_lock" in str(statement.compile(dialect=postgresql.dialect())):
+                # Another writer holds the lock until it commits
+                time.sleep(0.5)
+            return Mock()
+
+        db.execute.side_effect = execute
+
+        def get_db():
+            yield db
+
+        with patch('services.price_service.get_db', get_db), \
+             patch.object(mock_price_service, '_store_intervals', return_value=1), \
+             patch.object(mock_price_service, '_update_daily_rollup'), \
+             patch.object(mock_price_service, '_update_model_catalog', return_value=5):
+            refresh = asyncio.create_task(mock_price_service.refresh_prices())
+            gaps = []
+            while not refresh.done():
+                start = time.perf_counter()
+                await asyncio.sleep(0.01)
+                gaps.append(time.perf_counter() - start)
+            assert await refresh == 1
+        await mock_price_service.shutdown()
+
+        assert sum(gaps) >= 0.5
+        assert max(gaps) < 0.1
+        assert mock_price_service.catalog_generation == 5
+
+    def test_bulk_insert_postgresql_uses_multi_row_on_conflict(self, mock_price_service):
+        """Test that PostgreSQL gets a multi-row INSERT ... ON CONFLICT DO NOTHING."""
+        observed_at = datetime.now(timezone.utc)
+        rows = [
+            mock_price_service._price_row(PriceData(f"Model {i}", "OpenAI", 1.0, 2.0), observed_at, valid_to=None)
+            for i in range(3)
+        ]
+        db = Mock()
+        db.get_bind.return_value.dialect.name = "postgresql"
+
+        mock_price_service._bulk_insert(db, rows)
+
+        assert db.execute.call_count == 1
+        sql = str(db.execute.call_args[0][0].compile(dialect=postgresql.dialect()))
+        assert "ON CONFLICT (id) DO NOTHING" in sql
+        assert sql.count("input_price_per_1m_m") == 3
+
+    @pytest.fixture
+    def multi_provider_history(self, test_db):
+        """Store a day of snapshots for one model from three providers."""
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        db = test_db()
+        for provider in ("OpenAI", "Azure", "AWS Bedrock"):
+            for hours in (1, 2, 3):
+                row = PriceData("GPT-4", provider, 30.0, 60.0, timestamp=now - timedelta(hours=hours))
+                row.valid_from = row.valid_to = row.timestamp
+                db.add(row)
+        db.commit()
+        db.close()
+        return test_db
+
+    async def test_price_history_single_query(self, mock_price_service, multi_provider_history):
+        """Test that every provider's history is fetched with one query."""
+        selects = []
+
+        def count_selects(conn, cursor, statement, parameters, context, executemany):
+            if statement.lstrip().upper().startswith("SELECT"):
+                selects.append(statement)
+
+        engine = multi_provider_history.async_engine.sync_engine
+        event.listen(engine, "before_cursor_execute", count_selects)
+        try:
+            history = await mock_price_service.get_price_history("GPT-4", days=1)
+        finally:
+            event.remove(engine, "before_cursor_execute", count_selects)
+
+        assert len(selects) == 1
+        assert sorted(series["provider"] for series in history) == ["AWS Bedrock", "Azure", "OpenAI"]
+        assert all(len(series["prices"]) == 3 for series in history)
+        timestamps = [p["timestamp"] for p in history[0]["prices"]]
+        assert timestamps == sorted(timestamps)
+
+    @pytest.mark.parametrize("days, resolution", [(1, None), (1, "hour"), (120, None)])
+    async def test_price_history_batch_single_query(self, mock_price_service, multi_provider_history, days, resolution):
+        """Test that a batch of models and providers is answered by one query on every history path."""
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        db = multi_provider_history()
+        for model in ("Claude 3", "Gemini Pro"):
+            row = PriceData(model, "Anthropic" if model == "Claude 3" else "Google", 15.0, 75.0,
+                            timestamp=now - timedelta(hours=1))
+            row.valid_from = row.valid_to = row.timestamp
+            db.add(row)
+            db.add(PriceDailyRollup(
+                normalized_id=row.normalized_id, provider=row.provider, day=row.timestamp.date(), display_name=model,
+                input_min=15.0, input_max=15.0, input_first=15.0, input_last=15.0,
+                output_min=75.0, output_max=75.0, output_first=75.0, output_last=75.0,
+                first_seen=row.timestamp, last_seen=row.timestamp,
+            ))
+        for provider in ("OpenAI", "Azure", "AWS Bedrock"):
+            db.add(PriceDailyRollup(
+                normalized_id="gpt-4", provider=provider, day=now.date(), display_name="GPT-4",
+                input_min=30.0, input_max=30.0, input_first=30.0, input_last=30.0,
+                output_min=60.0, output_max=60.0, output_first=60.0, output_last=60.0,
+                first_seen=now - timedelta(hours=3), last_seen=now - timedelta(hours=1),
+            ))
+        db.commit()
+        db.close()
+        selects = []
+
+        def count_selects(conn, cursor, statement, parameters, context, executemany):
+            if statement.lstrip().upper().startswith("SELECT"):
+                selects.append(statement)
+
+        engine = multi_provider_history.async_engine.sync_engine
+        event.listen(engine, "before_cursor_execute", count_selects)
+        try:
+            histories = await mock_price_service.get_price_history_batch(
+                [("GPT-4", "azure"), ("GPT-4", "OpenAI"), ("Claude 3", None), ("Unknown", None)],
+                days=days, resolution=resolution,
+            )
+        finally:
+            event.remove(engine, "before_cursor_execute", count_selects)
+
+        assert len(selects) == 1
+        assert sorted(series["provider"] for series in histories["GPT-4"]) == ["Azure", "OpenAI"]
+        assert [series["provider"] for series in histories["Claude 3"]] == ["Anthropic"]
+        assert histories["Claude 3"][0]["prices"][-1]["input_price_per_1m"] == 15.0
+        assert histories["Unknown"] == []
+
+    @pytest.mark.parametrize("days, resolution, max_points", [(1, None, None), (1, "hour", None), (120, None, 10)])
+    async def test_estimate_history_points_bounds_batch(self, mock_price_service, multi_provider_history,
+                                                        days, resolution, max_points):
+        """Test that the point estimate is never below what the batch returns, raw, bucketed or from the rollup."""
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        db = multi_provider_history()
+        interval = PriceData("GPT-4", "OpenAI", 25.0, 50.0, timestamp=now - timedelta(minutes=5))
+        interval.valid_from, interval.valid_to = now - timedelta(minutes=50), interval.timestamp
+        db.add(interval)
+        for provider in ("OpenAI", "Azure"):
+            db.add(PriceDailyRollup(
+                normalized_id="gpt-4", provider=provider, day=now.date(), display_name="GPT-4",
+                input_min=25.0, input_max=30.0, input_first=30.0, input_last=25.0,
+                output_min=50.0, output_max=60.0, output_first=60.0, output_last=50.0,
+                first_seen=now - timedelta(hours=3), last_seen=interval.timestamp,
+            ))
+        db.commit()
+        db.close()
+        series = [("GPT-4", None), ("Unknown", None)]
+
+        estimate = await mock_price_service.estimate_history_points(series, days, resolution, max_points)
+        histories = await mock_price_service.get_price_history_batch(series, days, resolution, max_points)
+
+        points = sum(len(history["prices"]) for history in histories["GPT-4"])
+        assert points <= estimate
+        if resolution is None and max_points is None:
+            # Three snapshots per provider, plus both ends of the OpenAI interval
+            assert estimate == points == 11
+
+    async def test_price_history_without_cached_model(self, mock_price_service, multi_provider_history):
+        """Test that history is returned even when the model is not in the cache."""
+        assert len(mock_price_service.store) == 0
+
+        history = await mock_price_service.get_price_history("gpt-4", days=1)
+
+        assert len(history) == 3
+
+    async def test_price_history_provider_filter_case_insensitive(self, mock_price_service, multi_provider_history):
+        """Test filtering history by provider regardless of case."""
+        history = await mock_price_service.get_price_history("GPT-4", provider="azure", days=1)
+
+        assert [series["provider"] for series in history] == ["Azure"]
+        assert len(history[0]["prices"]) == 3
+
+    async def test_price_history_downsampled_snapshots(self, mock_price_service, test_db):
+        """Test that snapshots in one bucket collapse to min, max and last prices."""
+        bucket = (datetime.now(timezone.utc) - timedelta(days=2)).replace(hour=0, minute=0, second=0, microsecond=0, tzinfo=None)
+        db = test_db()
+        for hours, price in ((1, 30.0), (2, 10.0), (3, 20.0)):
+            row = PriceData("GPT-4", "OpenAI", price, price * 2, timestamp=bucket + timedelta(hours=hours))
+            row.valid_from = row.valid_to = row.timestamp
+            db.add(row)
+        db.commit()
+        db.close()
+
+        history = await mock_price_service.get_price_history("GPT-4", days=7, resolution="day")
+
+        assert history[0]["time_range"]["resolution"] == "day"
+        point = history[0]["prices"][0]
+        assert datetime.fromisoformat(point["timestamp"]) == bucket.replace(tzinfo=timezone.utc)
+        assert (point["input_price_min"], point["input_price_max"], point["input_price_per_1m"]) == (10.0, 30.0, 20.0)
+        assert (point["output_price_min"], point["output_price_max"], point["output_price_per_1m"]) == (20.0, 60.0, 40.0)
+        assert len(history[0]["prices"]) == 1
+
+    async def test_price_history_downsampled_intervals_fill_buckets(self, mock_price_service, test_db):
+        """Test that intervals yield one point per bucket, carrying the price across a change."""
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        db = test_db()
+        old = PriceData("GPT-4", "OpenAI", 30.0, 60.0)
+        old.valid_from, old.timestamp, old.valid_to = now - timedelta(days=40), now - timedelta(days=10), now - timedelta(days=9, hours=12)
+        current = PriceData("GPT-4", "OpenAI", 25.0, 50.0)
+        current.valid_from, current.timestamp, current.valid_to = now - timedelta(days=9, hours=12), now - timedelta(minutes=5), None
+        db.add_all([old, current])
+        db.commit()
+        db.close()
+
+        history = await mock_price_service.get_price_history("GPT-4", days=30, resolution="day")
+        points = history[0]["prices"]
+
+        timestamps = [datetime.fromisoformat(p["timestamp"]) for p in points]
+        assert len(points) in (30, 31)
+        assert all(b - a == timedelta(days=1) for a, b in zip(timestamps, timestamps[1:]))
+        assert points[0]["input_price_per_1m"] == 30.0
+        assert points[-1]["input_price_per_1m"] == 25.0
+        changed = next(p for p in points if p["input_price_per_1m"] == 25.0)
+        assert (changed["input_price_min"], changed["input_price_max"]) == (25.0, 30.0)
+
+    async def test_price_history_max_points_bounds_payload(self, mock_price_service, test_db):
+        """Test that max_points coarsens the resolution so each series fits."""
+        mock_price_service.rollup_min_days = 400
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        db = test_db()
+        current = PriceData("GPT-4", "OpenAI", 25.0, 50.0)
+        current.valid_from, current.timestamp = now - timedelta(days=400), now
+        db.add(current)
+        db.commit()
+        db.close()
+
+        history = await mock_price_service.get_price_history("GPT-4", days=365, max_points=100)
+
+        assert history[0]["time_range"]["resolution"] == "week"
+        assert len(history[0]["prices"]) <= 100
+
+    def test_bucket_expression_postgresql_uses_date_trunc(self, mock_price_service):
+        """Test that PostgreSQL buckets with date_trunc and SQLite with strftime."""
+        sql = str(mock_price_service._bucket_expression("postgresql", PriceData.timestamp, "week").compile(dialect=postgresql.dialect()))
+        assert sql.startswith("date_trunc(")
+
+        sql = str(mock_price_service._bucket_expression("sqlite", PriceData.timestamp, "week"))
+        assert sql.startswith("strftime(")
+
+    @pytest.mark.asyncio
+    async def test_store_upserts_model_catalog(self, mock_price_service, test_db):
+        """Test that the catalog keeps one row per (model, provider) with the latest price."""
+        await mock_price_service._store_historical_prices([PriceData("GPT-4", "OpenAI", 30.0, 60.0)])
+        await mock_price_service._store_historical_prices([
+            PriceData("GPT-4", "OpenAI", 25.0, 50.0),
+            PriceData("GPT-4", "Azure", 32.0, 64.0),
+        ])
+
+        db = test_db()
+        rows = {row.provider: row for row in db.query(ModelCatalog)}
+        assert len(rows) == 2
+        assert rows["OpenAI"].input_price_per_1m == 25.0
+        assert rows["OpenAI"].first_seen < rows["OpenAI"].last_updated
+        db.close()
+
+    def test_daily_rollup_upsert(self, mock_price_service, test_db):
+        """Test that observations within a day widen min/max and move last, keeping first."""
+        morning = datetime(2024, 3, 1, 8, tzinfo=timezone.utc)
+        db = test_db()
+        for hours, price in ((0, 30.0), (2, 10.0), (4, 20.0)):
+            mock_price_service._update_daily_rollup(
+                db, [PriceData("GPT-4", "OpenAI", price, price * 2)], morning + timedelta(hours=hours)
+            )
+        mock_price_service._update_daily_rollup(
+            db, [PriceData("GPT-4", "OpenAI", 20.0, 40.0)], morning + timedelta(days=1)
+        )
+        db.commit()
+
+        rows = db.query(PriceDailyRollup).order_by(PriceDailyRollup.day).all()
+        assert len(rows) == 2
+        first_day = rows[0]
+        assert (first_day.input_first, first_day.input_min, first_day.input_max, first_day.input_last) == (30.0, 10.0, 30.0, 20.0)
+        assert (first_day.output_min, first_day.output_max, first_day.output_last) == (20.0, 60.0, 40.0)
+        assert first_day.first_seen == morning.replace(tzinfo=None)
+        assert first_day.last_seen == (morning + timedelta(hours=4)).replace(tzinfo=None)
+        db.close()
+
+    @pytest.mark.asyncio
+    async def test_store_updates_daily_rollup(self, mock_price_service, test_db):
+        """Test that storing a refresh also writes the day's rollup rows."""
+        await mock_price_service._store_historical_prices([PriceData("GPT-4", "OpenAI", 30.0, 60.0)])
+
+        db = test_db()
+        assert db.query(PriceDailyRollup).count() == 1
+        db.close()
+
+    @pytest.mark.parametrize("days, resolution, max_points", [
+        (1, None, 24), (30, None, 30), (30, "hour", 30), (400, None, 58), (3650, None, 132), (3650, "week", 200),
+    ])
+    async def test_max_points_is_an_upper_bound(self, mock_price_service, test_db, days, resolution, max_points):
+        """Test that no series gets more than max_points points, even when its prices span the whole window."""
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        db = test_db()
+        row = PriceData("GPT-4", "OpenAI", 30.0, 60.0, timestamp=now)
+        row.valid_from = now - timedelta(days=days + 1)
+        db.add(row)
+        for days_ago in range(days + 1):
+            day = now - timedelta(days=days_ago)
+            db.add(PriceDailyRollup(
+                normalized_id="gpt-4", provider="OpenAI", day=day.date(), display_name="GPT-4",
+                input_min=30.0, input_max=30.0, input_first=30.0, input_last=30.0,
+                output_min=60.0, output_max=60.0, output_first=60.0, output_last=60.0,
+                first_seen=day, last_seen=day,
+            ))
+        db.commit()
+        db.close()
+
+        history = await mock_price_service.get_price_history("GPT-4", days=days, resolution=resolution, max_points=max_points)
+
+        assert 0 < len(history[0]["prices"]) <= max_points
+
+    async def test_max_points_too_small_for_window(self, mock_price_service, test_db):
+        """Test that a window that doesn't fit in max_points even by month is rejected rather than exceeded."""
+        with pytest.raises(ValueError):
+            await mock_price_service.get_price_history("GPT-4", days=3650, max_points=10)
+
+    async def test_price_history_long_range_reads_rollup(self, mock_price_service, test_db):
+        """Test that ranges beyond the threshold are served daily from the rollup."""
+        today = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+        db = test_db()
+        for days_ago, price in ((200, 30.0), (100, 25.0)):
+            mock_price_service._update_daily_rollup(
+                db, [PriceData("GPT-4", "OpenAI", price, price * 2)], today - timedelta(days=days_ago, hours=-12)
+            )
+        mock_price_service._update_daily_rollup(db, [PriceData("GPT-4", "OpenAI", 25.0, 50.0)], today + timedelta(hours=1))
+        db.commit()
+        db.close()
+
+        history = await mock_price_service.get_price_history("GPT-4", days=365)
+
+        assert history[0]["time_range"]["resolution"] == "day"
+        points = history[0]["prices"]
+        assert len(points) == 201
+        assert datetime.fromisoformat(points[0]["timestamp"]) == today - timedelta(days=200)
+        assert points[0]["input_price_per_1m"] == 30.0
+        assert points[-1]["input_price_per_1m"] == 25.0
+
+        weekly = await mock_price_service.get_price_history("GPT-4", days=365, max_points=60)
+        assert weekly[0]["time_range"]["resolution"] == "week"
+        assert len(weekly[0]["prices"]) <= 60
+
+    def test_warm_from_db_loads_latest_per_series(self, mock_price_service, test_db):
+        """Test that startup loads the latest price of each (model, provider) into the store."""
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        db = test_db()
+        for provider, hours, price in (("OpenAI", 3, 30.0), ("OpenAI", 1, 25.0), ("Azure", 2, 32.0)):
+            db.add(PriceData("GPT-4", provider, price, price * 2, timestamp=now - timedelta(hours=hours)))
+        db.add(PriceData("GPT-3", "OpenAI", 1.0, 2.0, timestamp=now - timedelta(days=30)))
+        db.commit()
+        db.close()
+
+        loaded = mock_price_service.warm_from_db()
+
+        assert loaded == 2
+        assert mock_price_service.ready
+        assert mock_price_service.store.get("GPT-4", "OpenAI")["input_price_per_1m"] == 25.0
+        assert mock_price_service.store.get("GPT-4", "Azure")["last_updated"] == (now - timedelta(hours=2)).replace(tzinfo=timezone.utc)
+        assert mock_price_service.store.get("GPT-3", "OpenAI") is None
+
+    def test_warm_from_db_empty_database(self, mock_price_service, test_db):
+        """Test that an empty database loads nothing."""
+        assert mock_price_service.warm_from_db() == 0
+        assert len(mock_price_service.store) == 0
+
+    def test_warm_from_db_falls_back_to_old_prices(self, mock_price_service, test_db):
+        """Test that when every stored price is older than the warm start window, the latest are loaded as stale."""
+        old = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(days=30)
+        db = test_db()
+        db.add(PriceData("GPT-4", "OpenAI", 30.0, 60.0, timestamp=old - timedelta(days=1)))
+        db.add(PriceData("GPT-4", "OpenAI", 25.0, 50.0, timestamp=old))
+        db.commit()
+        db.close()
+
+        assert mock_price_service.warm_from_db() == 1
+        assert mock_price_service.store.get("GPT-4", "OpenAI")["input_price_per_1m"] == 25.0
+        assert mock_price_service.store.stats()["stale"] == 1
+
+    @pytest.mark.asyncio
+    async def test_ready_after_failed_warm_start(self, mock_price_service):
+        """Test that the service becomes ready even when loading stored prices fails."""
+        with patch.object(mock_price_service, 'warm_from_db', side_effect=RuntimeError("database unavailable")), \
+             patch.object(mock_price_service.events, 'run', new_callable=AsyncMock), \
+             patch('services.price_service.asyncio.sleep', new_callable=AsyncMock, side_effect=asyncio.CancelledError), \
+             patch.object(mock_price_service, 'refresh_prices', new_callable=AsyncMock):
+            with pytest.raises(asyncio.CancelledError):
+                await mock_price_service._periodic_refresh()
+        await mock_price_service.shutdown()
+
+        assert mock_price_service.ready
+        assert len(mock_price_service.store) == 0
+
+    def test_latest_prices_statement_postgresql_uses_distinct_on(self, mock_price_service):
+        """Test that PostgreSQL loads the latest rows with DISTINCT ON."""
+        statement = mock_price_service._latest_prices_statement("postgresql", datetime(2024, 1, 1))
+        sql = str(statement.compile(dialect=postgresql.dialect()))
+        assert "DISTINCT ON (price_data.normalized_id, price_data.provider)" in sql
+        assert "row_number" not in sql
+
+    @pytest.mark.asyncio
+    async def test_first_refresh_skipped_when_store_is_fresh(self, mock_price_service, test_db):
+        """Test that the first refresh waits when warm-started prices are still fresh."""
+        db = test_db()
+        db.add(PriceData("GPT-4", "OpenAI", 30.0, 60.0, timestamp=datetime.now(timezone.utc).replace(tzinfo=None)))
+        db.commit()
+        db.close()
+
+        with patch.object(mock_price_service, 'refresh_prices', new_callable=AsyncMock) as mock_refresh, \
+             patch('services.price_service.asyncio.sleep', new_callable=AsyncMock, side_effect=asyncio.CancelledError) as mock_sleep:
+            with pytest.raises(asyncio.CancelledError):
+                await mock_price_service._periodic_refresh()
+        await mock_price_service.shutdown()
+
+        mock_refresh.assert_not_called()
+        assert mock_sleep.call_args[0][0] > 1700
+
+    @pytest.mark.asyncio
+    async def test_first_refresh_runs_when_store_is_empty(self, mock_price_service, test_db):
+        """Test that the first refresh runs immediately without stored prices."""
+        with patch.object(mock_price_service, 'refresh_prices', new_callable=AsyncMock) as mock_refresh, \
+             patch('services.price_service.asyncio.sleep', new_callable=AsyncMock, side_effect=asyncio.CancelledError):
+            with pytest.raises(asyncio.CancelledError):
+                await mock_price_service._periodic_refresh()
+        await mock_price_service.shutdown()
+
+        mock_refresh.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_follower_reloads_instead_of_refreshing(self, mock_price_service, test_db):
+        """Test that a process that is not the leader reloads stored prices instead of scraping."""
+        mock_price_service.leader = Mock(try_acquire=Mock(return_value=False))
+
+        with patch.object(mock_price_service, 'refresh_prices', new_callable=AsyncMock) as mock_refresh, \
+             patch.object(mock_price_service, 'reload_changed', new_callable=AsyncMock) as mock_reload, \
+             patch.object(mock_price_service.events, 'run', new_callable=AsyncMock), \
+             patch('services.price_service.asyncio.sleep', new_callable=AsyncMock, side_effect=asyncio.CancelledError):
+            with pytest.raises(asyncio.CancelledError):
+                await mock_price_service._periodic_refresh()
+            await mock_price_service.shutdown()
+
+        mock_refresh.assert_not_called()
+        mock_reload.assert_awaited_once()
+        mock_price_service.leader.release.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_worker_mode_never_refreshes_in_process(self, mock_price_service, test_db):
+        """Test that in worker mode the periodic loop only reloads what refresh workers stored."""
+        mock_price_service.refresh_mode = "worker"
+        mock_price_service.leader = Mock()
+
+        with patch.object(mock_price_service, 'refresh_prices', new_callable=AsyncMock) as mock_refresh, \
+             patch.object(mock_price_service, 'reload_changed', new_callable=AsyncMock) as mock_reload, \
+             patch.object(mock_price_service.events, 'run', new_callable=AsyncMock), \
+             patch('services.price_service.asyncio.sleep', new_callable=AsyncMock, side_effect=asyncio.CancelledError):
+            with pytest.raises(asyncio.CancelledError):
+                await mock_price_service._periodic_refresh()
+            await mock_price_service.shutdown()
+
+        mock_refresh.assert_not_called()
+        mock_reload.assert_awaited_once()
+        mock_price_service.leader.try_acquire.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_reload_changed_picks_up_other_process_writes(self, mock_price_service, test_db):
+        """Test that a follower reloads only the catalog rows written since its last reload."""
+        follower = PriceService()
+
+        mock_price_service.agent.fetch_prices.return_value = [
+            PriceData("GPT-4", "OpenAI", 30.0, 60.0),
+            PriceData("Claude 3", "Anthropic", 15.0, 75.0),
+        ]
+        await mock_price_service.refresh_prices()
+        assert await mock_price_service.reload_changed() == 0
+
+        assert await follower.reload_changed() == 2
+        assert follower.ready
+        assert follower.store.get("Claude 3", "Anthropic")["output_price_per_1m"] == 75.0
+        assert await follower.reload_changed() == 0
+
+        mock_price_service.agent.fetch_prices.return_value = [PriceData("GPT-4", "OpenAI", 10.0, 30.0)]
+        await mock_price_service.refresh_prices()
+        generation = follower.generation
+        assert await follower.reload_changed() == 1
+        assert follower.store.get("GPT-4", "OpenAI")["input_price_per_1m"] == 10.0
+        assert follower.generation == generation + 1
+
+        await mock_price_service.shutdown()
+        await follower.shutdown()
+
+    def test_warm_from_db_marks_catalog_seen(self, mock_price_service, test_db):
+        """Test that prices loaded at startup are not reloaded again by the subscriber."""
+        db = test_db()
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        db.add(ModelCatalog(normalized_id="gpt-4", provider="OpenAI", display_name="GPT-4", input_price_per_1m=30.0,
+                            output_price_per_1m=60.0, first_seen=now, last_updated=now, generation=3))
+        db.commit()
+        db.close()
+
+        mock_price_service.warm_from_db()
+
+        assert mock_price_service.catalog_generation == 3
+
+    @pytest.mark.asyncio
+    async def test_refresh_publishes_changed_prices(self, mock_price_service):
+        """Test that a refresh streams only the prices that are new or changed."""
+        mock_price_service.agent.fetch_prices.return_value = [
+            PriceData("GPT-4", "OpenAI", 30.0, 60.0),
+            PriceData("Claude 3", "Anthropic", 15.0, 75.0),
+        ]
+        with patch.object(mock_price_service, '_store_historical_prices', new_callable=AsyncMock):
+            await mock_price_service.refresh_prices()
+            await mock_price_service.refresh_prices()
+            mock_price_service.agent.fetch_prices.return_value = [
+                PriceData("GPT-4", "OpenAI", 10.0, 30.0),
+                PriceData("Claude 3", "Anthropic", 15.0, 75.0),
+            ]
+            await mock_price_service.refresh_prices()
+        await mock_price_service.shutdown()
+
+        updates = mock_price_service.updates
+        assert updates.last_id == 2
+        (_, message), = updates.events_after(1)
+        assert b'"input_price_per_1m":10.0' in message
+        assert b"Claude 3" not in message
+
+    async def test_iter_price_data_streams_batches(self, mock_price_service, test_db):
+        """Test that exported rows arrive in bounded batches and honour the filters."""
+        start = datetime(2024, 1, 1)
+        db = test_db()
+        for i in range(25):
+            for provider in ("OpenAI", "Azure"):
+                row = PriceData("GPT-4", provider, 30.0 + i, 60.0, timestamp=start + timedelta(hours=i))
+                row.valid_from = row.valid_to = row.timestamp
+                db.add(row)
+        db.commit()
+        db.close()
+
+        batches = [rows async for rows in mock_price_service.iter_price_data(batch_size=10)]
+        assert [len(rows) for rows in batches] == [10, 10, 10, 10, 10]
+
+        filtered = [
+            row
+            async for rows in mock_price_service.iter_price_data(
+                "gpt-4", "openai",
+                start=datetime(2024, 1, 1, 5, tzinfo=timezone(timedelta(hours=2))),
+                end=datetime(2024, 1, 1, 9),
+            )
+            for row in rows
+        ]
+        assert [row.timestamp.hour for row in filtered] == [3, 4, 5, 6, 7, 8, 9]
+        assert {row.provider for row in filtered} == {"OpenAI"}
+
+    def test_price_matrix_rebuilt_per_generation(self, mock_price_service):
+        """Test that the cost estimate price matrix is reused until the data generation changes."""
+        mock_price_service._update_store([PriceData("GPT-4", "OpenAI", 30.0, 60.0)])
+        matrix = mock_price_service.get_price_matrix()
+        assert mock_price_service.get_price_matrix() is matrix
+
+        mock_price_service._update_store([PriceData("Claude 3", "Anthropic", 3.0, 15.0)])
+        mock_price_service.generation += 1
+
+        rebuilt = mock_price_service.get_price_matrix()
+        assert rebuilt is not matrix
+        assert rebuilt.prices.shape == (2, 2)
+        estimates = mock_price_service.get_cost_estimates([{"input_tokens": 1000, "output_tokens": 1000}], top_k=1)
+        assert estimates[0]["estimates"][0]["model"] == "Claude 3"
+
+    def test_get_price_by_model_resolves_spellings(self, mock_price_service):
+        """Test that a model is found under any spelling once the index is rebuilt."""
+        mock_price_service._update_store([PriceData("Claude 3 Opus", "Anthropic", 15.0, 75.0)])
+        mock_price_service._update_store([PriceData("claude-3-opus-20240229", "AWS Bedrock", 15.0, 75.0)])
+        mock_price_service.generation += 1
+
+        prices = mock_price_service.get_price_by_model("claude-3-opus")
+        assert sorted(p["provider"] for p in prices) == ["AWS Bedrock", "Anthropic"]
+        assert [p["provider"] for p in mock_price_service.get_price_by_model("claude-3-opus-20240229")] == ["AWS Bedrock"]
+        assert mock_price_service.search_models("opus")[0]["normalized_id"] in ("claude_3_opus", "claude-3-opus-20240229")
+
+    async def test_command_r_and_r_plus_stay_apart(self, mock_price_service, test_db):
+        """Test that Command R and Command R+ are separate models in lookups and history."""
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        db = test_db()
+        for model, input_price, output_price in (("Command R", 0.15, 0.6), ("Command R+", 2.5, 10.0)):
+            row = PriceData(model, "Cohere", input_price, output_price, timestamp=now - timedelta(hours=1))
+            row.valid_from = row.valid_to = row.timestamp
+            db.add(row)
+            mock_price_service._update_store([PriceData(model, "Cohere", input_price, output_price)])
+        db.commit()
+        db.close()
+        mock_price_service.generation += 1
+
+        assert [p["input_price_per_1m"] for p in mock_price_service.get_price_by_model("command-r")] == [0.15]
+        assert [p["input_price_per_1m"] for p in mock_price_service.get_price_by_model("command-r-plus")] == [2.5]
+        history = await mock_price_service.get_price_history("command-r", days=1)
+        assert [p["input_price_per_1m"] for p in history[0]["prices"]] == [0.15]
+
+    @pytest.mark.parametrize("resolution", [None, "hour"])
+    async def test_price_history_merges_spellings(self, mock_price_service, test_db, resolution):
+        """Test that history stored under two spellings of a model forms one series per provider."""
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        db = test_db()
+        for model, hours in (("Claude 3 Opus", 3), ("claude-3-opus-20240229", 1)):
+            row = PriceData(model, "Anthropic", 15.0 if hours == 3 else 12.0, 75.0, timestamp=now - timedelta(hours=hours))
+            row.valid_from = row.valid_to = row.timestamp
+            db.add(row)
+            mock_price_service._update_store([PriceData(model, "Anthropic", 15.0, 75.0)])
+        db.commit()
+        db.close()
+        mock_price_service.generation += 1
+
+        history = await mock_price_service.get_price_history("claude-3-opus", days=1, resolution=resolution)
+
+        assert [series["provider"] for series in history] == ["Anthropic"]
+        prices = history[0]["prices"]
+        assert [p["timestamp"] for p in prices] == sorted(p["timestamp"] for p in prices)
+        assert prices[0]["input_price_per_1m"] == 15.0
+        assert prices[-1]["input_price_per_1m"] == 12.0
+
+    async def test_start_initializes_database_then_refreshes(self, mock_price_service):
+        """Test that start creates the tables and launches the periodic refresh."""
+        with patch('services.price_service.init_db') as mock_init_db, \
+             patch.object(mock_price_service, '_periodic_refresh', AsyncMock()) as mock_periodic:
+            await mock_price_service.start()
+            await mock_price_service._refresh_task
+
+        mock_init_db.assert_called_once_with()
+        mock_periodic.assert_awaited_once()
@@ -0,0 +1,64 @@
+"""Tests for PriceStore."""
+
+from datetime import datetime, timedelta, timezone
+
+from models.price_data import PriceData
+from services.price_store import PriceStore
+
+
+class TestPriceStore:
+    """Test cases for PriceStore."""
+
+    def test_same_model_at_several_providers(self):
+        """Test that providers serving the same model are stored side by side."""
+        store = PriceStore()
+        store.upsert([
+            PriceData("GPT-4", "OpenAI", 30.0, 60.0),
+            PriceData("GPT-4", "Azure", 32.0, 64.0),
+        ])
+
+        assert len(store) == 2
+        assert sorted(entry["provider"] for entry in store.by_model("gpt-4")) == ["Azure", "OpenAI"]
+        assert store.get("GPT-4", "Azure")["input_price_per_1m"] == 32.0
+
+    def test_provider_lookup_is_case_insensitive(self):
+        """Test that provider lookups ignore case."""
+        store = PriceStore()
+        store.upsert([PriceData("GPT-4", "OpenAI", 30.0, 60.0), PriceData("Claude 2", "Anthropic", 8.0, 24.0)])
+
+        assert [entry["model"] for entry in store.by_provider("openai")] == ["GPT-4"]
+        assert store.by_provider("Mistral") == []
+        assert store.by_model("unknown") == []
+
+    def test_upsert_returns_new_and_changed_entries(self):
+        """Test that only new entries and price changes are reported."""
+        store = PriceStore()
+        assert len(store.upsert([PriceData("GPT-4", "OpenAI", 30.0, 60.0)])) == 1
+
+        assert store.upsert([PriceData("GPT-4", "OpenAI", 30.0, 60.0)]) == []
+        changed = store.upsert([PriceData("GPT-4", "OpenAI", 25.0, 60.0)])
+
+        assert [entry["input_price_per_1m"] for entry in changed] == [25.0]
+        assert len(store) == 1
+        assert store.by_model("GPT-4") == changed
+        assert store.by_provider("OpenAI") == changed
+
+    def test_no_size_cap(self):
+        """Test that entries are never evicted, however many models are stored."""
+        store = PriceStore()
+        store.upsert([PriceData(f"Model {i}", "OpenAI", 1.0, 2.0) for i in range(500)])
+
+        assert len(store) == 500
+        assert len(store.by_provider("OpenAI")) == 500
+
+    def test_staleness_instead_of_eviction(self):
+        """Test that entries not confirmed recently are reported stale but still served."""
+        store = PriceStore(stale_after_seconds=60)
+        now = datetime.now(timezone.utc)
+        store.upsert([PriceData("GPT-4", "OpenAI", 30.0, 60.0)], observed_at=now - timedelta(minutes=5))
+        store.upsert([PriceData("Claude 2", "Anthropic", 8.0, 24.0)], observed_at=now)
+
+        assert [entry["model"] for entry in store.stale_entries(now)] == ["GPT-4"]
+        assert store.get("GPT-4", "OpenAI") is not None
+        assert store.stats()["stale"] == 1
+        assert store.stats()["entries"] == 2
@@ -0,0 +1,107 @@
+"""Tests for the price update stream."""
+
+import asyncio
+import json
+
+import pytest
+
+from services.price_stream import KEEPALIVE, PriceStreamBroker
+
+
+def parse(message: bytes, epoch: str = "e1") -> dict:
+    fields = dict(line.split(": ", 1) for line in message.decode().strip().split("\n"))
+    message_epoch, number = fields["id"].rsplit("-", 1)
+    assert message_epoch == epoch
+    return {"id": int(number), "event": fields["event"], "data": json.loads(fields["data"])}
+
+
+class TestPriceStreamBroker:
+    """Test cases for PriceStreamBroker."""
+
+    @pytest.mark.asyncio
+    async def test_snapshot_then_updates(self):
+        """Test that a subscriber gets a snapshot on connect and then each published update."""
+        broker = PriceStreamBroker(epoch="e1")
+        broker.publish([{"model": "GPT-4"}])
+        stream = broker.subscribe(lambda: b'[{"model": "GPT-4"}, {"model": "Claude 3"}]')
+
+        snapshot = parse(await anext(stream))
+        assert snapshot == {"id": 1, "event": "snapshot", "data": [{"model": "GPT-4"}, {"model": "Claude 3"}]}
+
+        next_message = asyncio.create_task(anext(stream))
+        await asyncio.sleep(0.01)
+        assert not next_message.done()
+        broker.publish([{"model": "Claude 3", "input_price_per_1m": 3.0}])
+        update = parse(await next_message)
+        assert update == {"id": 2, "event": "update", "data": [{"model": "Claude 3", "input_price_per_1m": 3.0}]}
+        await stream.aclose()
+
+    @pytest.mark.asyncio
+    async def test_resume_replays_missed_events(self):
+        """Test that Last-Event-ID within the buffer replays only the events after it."""
+        broker = PriceStreamBroker(epoch="e1")
+        for model in ("a", "b", "c"):
+            broker.publish([{"model": model}])
+        stream = broker.subscribe(lambda: pytest.fail("snapshot not expected"), last_event_id="e1-1")
+
+        assert [parse(await anext(stream))["id"] for _ in range(2)] == [2, 3]
+        await stream.aclose()
+        assert broker.snapshots_sent == 0
+
+    @pytest.mark.parametrize("last_event_id", ["e1-1", "e1-99", "e0-3", "3", "e1-not-a-number"])
+    @pytest.mark.asyncio
+    async def test_resume_falls_back_to_snapshot(self, last_event_id):
+        """Test that ids dropped from the buffer, unknown, from another process, or malformed get a snapshot."""
+        broker = PriceStreamBroker(buffer_size=2, epoch="e1")
+        for model in ("a", "b", "c", "d"):
+            broker.publish([{"model": model}])
+        stream = broker.subscribe(lambda: b"[]", last_event_id=last_event_id)
+
+        assert parse(await anext(stream)) == {"id": 4, "event": "snapshot", "data": []}
+        await stream.aclose()
+
+    @pytest.mark.asyncio
+    async def test_keepalive_on_idle_stream(self):
+        """Test that an idle stream sends a comment every heartbeat."""
+        broker = PriceStreamBroker(heartbeat_seconds=0.01, epoch="e1")
+        stream = broker.subscribe(lambda: b"[]")
+        await anext(stream)
+
+        assert await anext(stream) == KEEPALIVE
+        await stream.aclose()
+
+    @pytest.mark.asyncio
+    async def test_many_idle_subscribers_share_one_waiter(self):
+        """Test that thousands of idle subscribers wait on one future and all receive an update."""
+        broker = PriceStreamBroker(epoch="e1")
+        streams = [broker.subscribe(lambda: b"[]") for _ in range(2000)]
+        for stream in streams:
+            await anext(stream)
+        pending = [asyncio.create_task(anext(stream)) for stream in streams]
+        await asyncio.sleep(0.01)
+        assert broker.stats()["subscribers"] == 2000
+        waiter = broker._published
+
+        broker.publish([{"model": "GPT-4"}])
+        messages = await asyncio.gather(*pending)
+
+        assert waiter.done()
+        assert {parse(message)["id"] for message in messages} == {1}
+        for stream in streams:
+            await stream.aclose()
+        assert broker.stats()["subscribers"] == 0
+
+    @pytest.mark.asyncio
+    async def test_resume_on_another_process(self):
+        """Test that an id from another process gets a snapshot even where the numbering overlaps."""
+        broker, restarted = PriceStreamBroker(), PriceStreamBroker()
+        assert broker.epoch != restarted.epoch
+        for model in ("a", "b", "c"):
+            broker.publish([{"model": model}])
+            restarted.publish([{"model": model}])
+        restarted.publish([{"model": "d"}])
+
+        stream = restarted.subscribe(lambda: b"[]", last_event_id=broker.event_id(3))
+        snapshot = parse(await anext(stream), restarted.epoch)
+        assert (snapshot["id"], snapshot["event"]) == (4, "snapshot")
+        await stream.aclose()
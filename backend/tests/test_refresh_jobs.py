@@ -0,0 +1,180 @@
+"""Tests for the refresh job queue and refresh worker."""
+
+import asyncio
+from unittest.mock import AsyncMock, Mock
+
+import pytest
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from services.refresh_jobs import (
+    DONE, FAILED, QUEUED, RUNNING, RefreshWorker, claim_job, enqueue_refresh, finish_job, get_job, schedule_refresh,
+)
+
+
+@pytest.fixture
+def sessions(test_db):
+    """Async session factory on the test database."""
+    return async_sessionmaker(test_db.async_engine, expire_on_commit=False)
+
+
+class TestRefreshJobQueue:
+    """Test cases for the refresh_jobs queue."""
+
+    async def test_enqueue_reuses_queued_job(self, sessions):
+        """Test that refresh requests coalesce while a job is still waiting."""
+        async with sessions() as db:
+            first = await enqueue_refresh(db)
+            assert await enqueue_refresh(db) == first
+            assert (await get_job(db, first))["status"] == QUEUED
+
+            assert await claim_job(db, "worker-a") == first
+            assert await enqueue_refresh(db) != first
+
+    async def test_claim_oldest_once(self, sessions):
+        """Test that jobs are claimed oldest first and by one worker only."""
+        async with sessions() as db:
+            first = await enqueue_refresh(db, requested_by="schedule")
+            assert await claim_job(db, "worker-a") == first
+            assert await claim_job(db, "worker-b") is None
+
+            job = await get_job(db, first)
+        assert job["status"] == RUNNING
+        assert job["worker"] == "worker-a"
+        assert job["requested_by"] == "schedule"
+
+    async def test_one_job_runs_at_a_time(self, sessions):
+        """Test that a queued job waits while another job is running."""
+        async with sessions() as db:
+            first = await enqueue_refresh(db, requested_by="schedule")
+            await claim_job(db, "worker-a")
+            second = await enqueue_refresh(db)
+
+            assert await claim_job(db, "worker-b") is None
+            assert (await get_job(db, second))["status"] == QUEUED
+
+            await finish_job(db, first, "worker-a", price_count=1)
+            assert await claim_job(db, "worker-b") == second
+
+    async def test_concurrent_claims(self, sessions):
+        """Test that workers claiming at the same moment never share a job."""
+        async with sessions() as db:
+            job_id = await enqueue_refresh(db)
+
+        async def claim(worker):
+            async with sessions() as db:
+                return await claim_job(db, worker)
+
+        claims = await asyncio.gather(*(claim(f"worker-{i}") for i in range(4)))
+        assert sorted(claims, key=lambda claimed: claimed is None) == [job_id, None, None, None]
+
+    async def test_abandoned_job_reclaimed_after_lease(self, sessions):
+        """Test that a job whose worker died is taken over, and the old worker cannot finish it."""
+        async with sessions() as db:
+            job_id = await enqueue_refresh(db)
+            await claim_job(db, "worker-a")
+            assert await claim_job(db, "worker-b", lease_seconds=3600) is None
+            await asyncio.sleep(0.01)
+
+            assert await claim_job(db, "worker-b", lease_seconds=0) == job_id
+            assert not await finish_job(db, job_id, "worker-a", price_count=1)
+            assert await finish_job(db, job_id, "worker-b", price_count=2)
+
+            job = await get_job(db, job_id)
+        assert job["status"] == DONE
+        assert job["price_count"] == 2
+        assert job["finished_at"] is not None
+
+    async def test_schedule_refresh_once_per_interval(self, sessions):
+        """Test that the schedule queues a refresh only when none was requested within the interval."""
+        async with sessions() as db:
+            job_id = await schedule_refresh(db, interval_seconds=3600)
+            assert job_id is not None
+            await claim_job(db, "worker-a")
+            await finish_job(db, job_id, "worker-a", price_count=0)
+
+            assert await schedule_refresh(db, interval_seconds=3600) is None
+            assert await schedule_refresh(db, interval_seconds=0) is not None
+
+    async def test_claim_postgresql_skips_locked_rows(self):
+        """Test that PostgreSQL claims lock the selected job with FOR UPDATE SKIP LOCKED."""
+        db = Mock()
+        db.get_bind.return_value.dialect.name = "postgresql"
+        db.execute = AsyncMock(side_effect=[Mock(), Mock(scalar=Mock(return_value=7)), Mock(rowcount=1)])
+        db.commit = AsyncMock()
+
+        assert await claim_job(db, "worker-a") == 7
+
+        lock_sql, select_sql = (
+            str(call[0][0].compile(dialect=postgresql.dialect())) for call in db.execute.call_args_list[:2]
+        )
+        assert "pg_advisory_xact_lock" in lock_sql
+        assert "FOR UPDATE SKIP LOCKED" in select_sql
+
+    async def test_get_missing_job(self, sessions):
+        """Test that an unknown job id returns None."""
+        async with sessions() as db:
+            assert await get_job(db, 404) is None
+
+
+class TestRefreshWorker:
+    """Test cases for RefreshWorker."""
+
+    @pytest.fixture
+    def service(self):
+        service = Mock()
+        service.leader.try_acquire.return_value = True
+        service.refresh_prices = AsyncMock(return_value=3)
+        return service
+
+    async def test_leader_schedules_and_runs_job(self, service, sessions):
+        """Test that a leading worker queues the periodic refresh and runs it."""
+        worker = RefreshWorker(service, sessions, refresh_interval=3600, name="worker-a")
+
+        job_id = await worker.run_once()
+        assert await worker.run_once() is None
+
+        service.refresh_prices.assert_awaited_once()
+        async with sessions() as db:
+            job = await get_job(db, job_id)
+        assert (job["status"], job["price_count"], job["requested_by"]) == (DONE, 3, "schedule")
+
+    async def test_follower_runs_queued_jobs_only(self, service, sessions):
+        """Test that a non-leading worker does not schedule but still runs queued jobs."""
+        service.leader.try_acquire.return_value = False
+        worker = RefreshWorker(service, sessions, refresh_interval=3600, name="worker-b")
+        assert await worker.run_once() is None
+
+        async with sessions() as db:
+            job_id = await enqueue_refresh(db)
+        assert await worker.run_once() == job_id
+        service.refresh_prices.assert_awaited_once()
+
+    async def test_failed_refresh_recorded(self, service, sessions):
+        """Test that a refresh error fails the job instead of stopping the worker."""
+        service.refresh_prices.side_effect = RuntimeError("provider unreachable")
+        worker = RefreshWorker(service, sessions, refresh_interval=3600, name="worker-a")
+
+        job_id = await worker.run_once()
+
+        async with sessions() as db:
+            job = await get_job(db, job_id)
+        assert job["status"] == FAILED
+        assert job["error"] == "provider unreachable"
+
+    async def test_run_keeps_polling(self, service, sessions):
+        """Test that the worker loop runs jobs as they are queued until cancelled."""
+        service.leader.try_acquire.return_value = False
+        worker = RefreshWorker(service, sessions, refresh_interval=3600, poll_interval=0.01, name="worker-a")
+        task = asyncio.create_task(worker.run())
+        await asyncio.sleep(0.05)
+        async with sessions() as db:
+            job_id = await enqueue_refresh(db)
+        await asyncio.sleep(0.1)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+        async with sessions() as db:
+            assert (await get_job(db, job_id))["status"] == DONE
+            assert await enqueue_refresh(db) != job_id
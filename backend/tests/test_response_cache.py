@@ -0,0 +1,77 @@
+"""Tests for ResponseCache."""
+
+import gzip
+from datetime import datetime, timezone
+from typing import List
+
+from pydantic import TypeAdapter
+from starlette.requests import Request
+
+from main import PriceResponse
+from services.response_cache import ResponseCache
+
+ADAPTER = TypeAdapter(List[PriceResponse])
+
+
+def make_request(**headers) -> Request:
+    raw_headers = [(name.replace("_", "-").encode(), value.encode()) for name, value in headers.items()]
+    return Request({"type": "http", "method": "GET", "path": "/prices", "headers": raw_headers})
+
+
+def make_prices(count: int) -> List[dict]:
+    return [{
+        "model": f"Model {i}",
+        "provider": "OpenAI",
+        "input_price_per_1m": 1.0,
+        "output_price_per_1m": 2.0,
+        "last_updated": datetime(2024, 1, 1, tzinfo=timezone.utc),
+    } for i in range(count)]
+
+
+class TestResponseCache:
+    """Test cases for ResponseCache."""
+
+    def test_entry_valid_for_its_generation_only(self):
+        """Test that an entry is served for its generation and missed after a bump."""
+        cache = ResponseCache()
+        cache.put("/prices", 1, ADAPTER, make_prices(1))
+
+        assert cache.get("/prices", 1) is not None
+        assert cache.get("/prices", 2) is None
+        assert cache.stats()["hits"] == 1
+        assert cache.stats()["misses"] == 1
+
+    def test_body_matches_response_model_serialization(self):
+        """Test that cached bytes are the validated response model JSON."""
+        cache = ResponseCache()
+        entry = cache.put("/prices", 0, ADAPTER, make_prices(1))
+
+        assert entry.body == ADAPTER.dump_json(ADAPTER.validate_python(make_prices(1)))
+        assert entry.etag.startswith('"') and entry.etag.endswith('"')
+
+    def test_if_none_match_returns_304(self):
+        """Test that a matching If-None-Match gets an empty 304."""
+        cache = ResponseCache()
+        entry = cache.put("/prices", 0, ADAPTER, make_prices(1))
+
+        response = cache.respond(make_request(if_none_match=entry.etag), entry)
+
+        assert response.status_code == 304
+        assert response.body == b""
+        assert response.headers["etag"] == entry.etag
+
+    def test_gzip_only_for_large_bodies_and_accepting_clients(self):
+        """Test that large bodies are served pre-gzipped to clients that accept gzip."""
+        cache = ResponseCache(gzip_min_bytes=1024)
+        small = cache.put("/small", 0, ADAPTER, make_prices(1))
+        large = cache.put("/large", 0, ADAPTER, make_prices(100))
+
+        assert small.gzipped is None
+        response = cache.respond(make_request(accept_encoding="gzip, deflate"), large)
+        assert response.headers["content-encoding"] == "gzip"
+        assert response.headers["etag"] == large.gzip_etag
+        assert gzip.decompress(response.body) == large.body
+
+        plain = cache.respond(make_request(), large)
+        assert "content-encoding" not in plain.headers
+        assert plain.body == large.body
@@ -0,0 +1,71 @@
+"""Tests for API process startup."""
+
+import os
+import subprocess
+import sys
+from pathlib import Path
+from unittest.mock import AsyncMock, patch
+
+from fastapi.testclient import TestClient
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+# Cumulative import time of main; about 0.6 s here, 1.9 s while the scraping stack was imported eagerly
+IMPORT_TIME_BUDGET_SECONDS = 1.5
+# Only needed once a refresh runs
+REFRESH_ONLY_MODULES = ("smolagents", "openai", "markdownify", "bs4", "services.price_agent")
+
+
+def import_times(module: str) -> dict:
+    """Import a module in a fresh interpreter and return the cumulative import time of every module, in seconds"""
+    env = {**os.environ, "SQLALCHEMY_DATABASE_URL": "sqlite:///:memory:", "OPENAI_API_KEY": "test-api-key-for-testing"}
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        times[name.strip()] = int(cumulative) / 1e6
+    return times
+
+
+class TestStartup:
+    """Test cases for API process startup."""
+
+    def test_import_skips_refresh_stack(self):
+        """Test that importing the API imports nothing only a refresh needs."""
+        times = import_times("main")
+
+        assert "main" in times
+        assert [module for module in REFRESH_ONLY_MODULES if module in times] == []
+
+    def test_import_time_budget(self):
+        """Test that importing the API stays within its cold start budget."""
+        assert import_times("main")["main"] < IMPORT_TIME_BUDGET_SECONDS
+
+    def test_lifespan_starts_and_stops_price_service(self):
+        """Test that the service starts with the server rather than at import."""
+        from main import app, price_service
+
+        with patch.object(price_service, 'start', AsyncMock()) as start, \
+             patch.object(price_service, 'shutdown', AsyncMock()) as shutdown:
+            with TestClient(app):
+                start.assert_awaited_once()
+                shutdown.assert_not_awaited()
+            shutdown.assert_awaited_once()
+
+    async def test_agent_built_on_first_use(self):
+        """Test that the price agent is only constructed when first needed."""
+        from services.price_service import PriceService
+
+        service = PriceService()
+        assert service._agent is None
+        assert "price_store" in service.get_metrics()
+        assert service._agent is None
+
+        with patch('services.price_agent.PriceAgent') as agent_class:
+            assert service.agent is agent_class.return_value
+            assert service.agent is agent_class.return_value
+        agent_class.assert_called_once_with()
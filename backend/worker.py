@@ -0,0 +1,58 @@
+"""Refresh worker: runs the price agent for jobs queued in refresh_jobs.
+
+Run alongside API processes started with REFRESH_MODE=worker, which only
+enqueue refreshes and serve what the workers store. Any number of workers can
+run, but jobs run one at a time across all of them, so extra workers stand by
+to take over.
+
+Usage (from the backend directory):
+    python -m worker
+    python -m worker --once
+"""
+
+import argparse
+import asyncio
+import logging
+import signal
+from typing import List, Optional
+
+from database import AsyncSessionLocal, init_db
+from services.price_service import REFRESH_INTERVAL_SECONDS, PriceService
+from services.refresh_jobs import WORKER_POLL_SECONDS, RefreshWorker
+
+logger = logging.getLogger(__name__)
+
+
+async def run(once: bool, poll_interval: float):
+    await asyncio.to_thread(init_db)
+    service = PriceService()
+    worker = RefreshWorker(service, AsyncSessionLocal, REFRESH_INTERVAL_SECONDS, poll_interval=poll_interval)
+    try:
+        if once:
+            job_id = await worker.run_once()
+            logger.info(f"Ran refresh job {job_id}" if job_id is not None else "No refresh job to run")
+            return
+
+        task = asyncio.create_task(worker.run())
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(signum, task.cancel)
+        try:
+            await task
+        except asyncio.CancelledError:
+            logger.info(f"Refresh worker {worker.name} stopped")
+    finally:
+        await service.shutdown()
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--once", action="store_true", help="Run at most one job, then exit")
+    parser.add_argument("--poll-seconds", type=float, default=WORKER_POLL_SECONDS)
+    args = parser.parse_args(argv)
+
+    asyncio.run(run(args.once, args.poll_seconds))
+
+
+if __name__ == "__main__":
+    main()